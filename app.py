@@ -13,23 +13,6 @@ logging.basicConfig(
 # Initialize extensions
 db = SQLAlchemy()
 
-def _run_light_migrations(app):
-    from sqlalchemy import text
-    with app.app_context():
-        # Ensure tables exist
-        db.create_all()
-        try:
-            # Add run_id column to crawl_result if missing
-            result = db.session.execute(text("PRAGMA table_info(crawl_result);"))
-            cols = [row[1] for row in result]
-            if 'run_id' not in cols:
-                app.logger.info('Migrating: adding run_id to crawl_result')
-                db.session.execute(text("ALTER TABLE crawl_result ADD COLUMN run_id INTEGER"))
-                db.session.commit()
-        except Exception as e:
-            app.logger.error(f"Migration error: {e}")
-
-
 def create_app():
     app = Flask(__name__, 
                 template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web', 'templates'),
@@ -41,12 +24,12 @@ def create_app():
     # Initialize extensions
     db.init_app(app)
     
-    # Auto create tables & run light migrations on startup
+    # Bring the schema up to date on startup (a single version check once current)
     with app.app_context():
         try:
             from models import job  # ensure models are imported
-            db.create_all()
-            _run_light_migrations(app)
+            from models.migrations import run_migrations
+            run_migrations(db, app.logger)
         except Exception as e:
             app.logger.error(f"Auto DB init failed: {e}")
     
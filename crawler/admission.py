@@ -0,0 +1,137 @@
+import logging
+import os
+import time
+
+import psutil
+
+
+class AdmissionController:
+    """Sizes the number of concurrently running crawl jobs from live telemetry.
+
+    The job limit starts at the CPU count and moves one step at a time with
+    hysteresis: it drops below the running count when CPU, memory or load per
+    core is above its high watermark, and grows while the pool is saturated
+    and everything is below its low watermark. Changes are at least
+    `cooldown` seconds apart. Free memory caps the limit too, using the
+    measured RSS of running jobs (or `job_rss_mb` before there is one), so a
+    small VM queues jobs instead of swapping. Running jobs are never stopped.
+    """
+
+    def __init__(self, min_jobs=1, max_jobs=0, cpu_high=85.0, cpu_low=60.0, memory_high=85.0, memory_low=70.0,
+                 load_high=1.5, load_low=0.8, cooldown=10.0, job_rss_mb=300, base_requests=16, min_requests=2,
+                 sample_interval=1.0):
+        self.cpus = psutil.cpu_count() or 1
+        self.min_jobs = max(1, min_jobs)
+        self.max_jobs = max_jobs or 2 * self.cpus
+        self.cpu_high = cpu_high
+        self.cpu_low = cpu_low
+        self.memory_high = memory_high
+        self.memory_low = memory_low
+        self.load_high = load_high
+        self.load_low = load_low
+        self.cooldown = cooldown
+        self.job_rss = job_rss_mb * 1024 * 1024
+        self.base_requests = base_requests
+        self.min_requests = min_requests
+        self.sample_interval = sample_interval
+        self.limit = max(self.min_jobs, min(self.max_jobs, self.cpus))
+        self.changed_at = 0.0
+        self.sample = None
+        self.sampled_at = 0.0
+        self.logger = logging.getLogger(__name__)
+        psutil.cpu_percent(interval=None)  # prime the non-blocking CPU counter
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            min_jobs=settings.getint('ADMISSION_MIN_JOBS', 1),
+            max_jobs=settings.getint('ADMISSION_MAX_JOBS', 0),
+            cpu_high=settings.getfloat('ADMISSION_CPU_HIGH', 85.0),
+            cpu_low=settings.getfloat('ADMISSION_CPU_LOW', 60.0),
+            memory_high=settings.getfloat('ADMISSION_MEMORY_HIGH', 85.0),
+            memory_low=settings.getfloat('ADMISSION_MEMORY_LOW', 70.0),
+            load_high=settings.getfloat('ADMISSION_LOAD_HIGH', 1.5),
+            load_low=settings.getfloat('ADMISSION_LOAD_LOW', 0.8),
+            cooldown=settings.getfloat('ADMISSION_COOLDOWN', 10.0),
+            job_rss_mb=settings.getint('ADMISSION_JOB_RSS_MB', 300),
+            base_requests=settings.getint('CONCURRENT_REQUESTS', 16),
+            min_requests=settings.getint('ADMISSION_MIN_REQUESTS', 2),
+        )
+
+    def measure(self, pids=()):
+        """CPU, memory, load and per-job RSS, re-sampled at most every sample_interval seconds"""
+        now = time.monotonic()
+        if self.sample is not None and now - self.sampled_at < self.sample_interval:
+            return self.sample
+        memory = psutil.virtual_memory()
+        try:
+            load = os.getloadavg()[0] / self.cpus
+        except (AttributeError, OSError):
+            load = 0.0  # not available on Windows
+        rss = []
+        for pid in pids:
+            try:
+                rss.append(psutil.Process(pid).memory_info().rss)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, ValueError):
+                continue
+        self.sample = {
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'memory_percent': memory.percent,
+            'memory_available': memory.available,
+            'memory_total': memory.total,
+            'load_per_cpu': round(load, 2),
+            'job_rss': sum(rss) / len(rss) if rss else None,
+        }
+        self.sampled_at = now
+        return self.sample
+
+    def _pressure(self, sample):
+        return (sample['cpu_percent'] >= self.cpu_high or sample['memory_percent'] >= self.memory_high
+                or sample['load_per_cpu'] >= self.load_high)
+
+    def _relaxed(self, sample):
+        return (sample['cpu_percent'] < self.cpu_low and sample['memory_percent'] < self.memory_low
+                and sample['load_per_cpu'] < self.load_low)
+
+    def _memory_slots(self, sample, running):
+        """Running jobs plus how many more fit above the high-memory watermark"""
+        reserve = sample['memory_total'] * (100.0 - self.memory_high) / 100.0
+        per_job = max(sample['job_rss'] or 0, self.job_rss)
+        return running + max(0, int((sample['memory_available'] - reserve) // per_job))
+
+    def update(self, running, pids=()):
+        """Re-evaluate the job limit from a fresh sample; returns the effective limit"""
+        sample = self.measure(pids)
+        now = time.monotonic()
+        if now - self.changed_at >= self.cooldown:
+            previous = self.limit
+            if self._pressure(sample):
+                self.limit = max(self.min_jobs, min(self.limit, running) - 1)
+            elif self._relaxed(sample) and running >= self.limit:
+                self.limit = min(self.max_jobs, self.limit + 1)
+            if self.limit != previous:
+                self.changed_at = now
+                self.logger.info(f"[Admission] Job limit {previous} -> {self.limit} "
+                                 f"(cpu {sample['cpu_percent']:.0f}%, memory {sample['memory_percent']:.0f}%, "
+                                 f"load/cpu {sample['load_per_cpu']:.2f})")
+        return max(self.min_jobs, min(self.limit, self._memory_slots(sample, running)))
+
+    def admit(self, running, pids=()):
+        """True if another job may start next to `running` ones"""
+        return running < self.update(running, pids)
+
+    def job_concurrency(self):
+        """CONCURRENT_REQUESTS for a new job: full while CPU is idle, scaled down towards cpu_high"""
+        sample = self.sample or self.measure(())
+        span = max(self.cpu_high - self.cpu_low, 1.0)
+        factor = min(1.0, max(0.25, (self.cpu_high - sample['cpu_percent']) / span))
+        return max(self.min_requests, int(self.base_requests * factor))
+
+    def stats(self):
+        sample = self.sample or {}
+        return {
+            'job_limit': self.limit,
+            'max_jobs': self.max_jobs,
+            'load_per_cpu': sample.get('load_per_cpu'),
+            'job_rss_mb': int(sample['job_rss'] / 1024 / 1024) if sample.get('job_rss') else None,
+        }
@@ -0,0 +1,276 @@
+import itertools
+import logging
+import random
+from collections import deque
+
+from scrapy import signals
+from scrapy.downloadermiddlewares.retry import get_retry_request
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet import reactor
+
+from crawler.utils import retry_exceptions
+
+CLOSED, OPEN, HALF_OPEN, GIVEN_UP = 'closed', 'open', 'half_open', 'given_up'
+
+
+class DomainCircuit:
+    """Circuit-breaker state for one domain"""
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0          # consecutive failed responses/errors
+        self.opens = 0             # times opened since the last success
+        self.probe = None          # id of the outstanding probe request
+        self.deadline = None       # call that fails the probe if it never gets an outcome
+        self.held = deque()        # requests parked while the circuit is open
+
+
+class DomainRetryMiddleware:
+    """Retry with per-domain exponential backoff and a circuit breaker.
+
+    Replaces Scrapy's RetryMiddleware. Retries of RETRY_HTTP_CODES and
+    network errors are re-scheduled after base * 2^attempt seconds (with
+    +/-50% jitter) instead of going straight back into the queue.
+
+    Every domain also has a circuit. CIRCUIT_FAILURE_THRESHOLD failures in a
+    row (CIRCUIT_FAILURE_CODES or network errors) open it: that domain's
+    requests are parked without being fetched (and without a placeholder
+    item) while the rest of the crawl continues. After the open period one
+    parked request is sent as a probe; success closes the circuit and
+    releases the parked requests, failure re-opens it for twice as long.
+    After CIRCUIT_MAX_OPENS failed probes the domain is given up for the run.
+    A probe that gets no response or error within CIRCUIT_PROBE_TIMEOUT
+    seconds counts as failed, and one dropped with IgnoreRequest before it
+    reached the site is replaced by the next parked request, so a lost probe
+    cannot keep the domain (and the spider) waiting forever.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.max_retry_times = settings.getint('RETRY_TIMES')
+        self.retry_http_codes = {int(code) for code in settings.getlist('RETRY_HTTP_CODES')}
+        self.priority_adjust = settings.getint('RETRY_PRIORITY_ADJUST')
+        self.exceptions_to_retry = retry_exceptions(settings)
+        self.backoff_base = settings.getfloat('RETRY_BACKOFF_BASE', 1.0)
+        self.backoff_max = settings.getfloat('RETRY_BACKOFF_MAX', 60.0)
+        self.failure_threshold = settings.getint('CIRCUIT_FAILURE_THRESHOLD', 5)
+        self.failure_codes = {int(code) for code in settings.getlist('CIRCUIT_FAILURE_CODES')}
+        self.open_secs = settings.getfloat('CIRCUIT_OPEN_SECS', 30.0)
+        self.open_max_secs = settings.getfloat('CIRCUIT_OPEN_MAX_SECS', 600.0)
+        self.max_opens = settings.getint('CIRCUIT_MAX_OPENS', 6)
+        self.probe_timeout = settings.getfloat('CIRCUIT_PROBE_TIMEOUT', 300.0)
+        self.probe_ids = itertools.count(1)
+        self.circuits = {}
+        self.pending_retries = 0
+        self.calls = set()
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = cls(crawler)
+        crawler.signals.connect(middleware.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def _circuit(self, request):
+        domain = urlparse_cached(request).hostname or ''
+        circuit = self.circuits.get(domain)
+        if circuit is None:
+            circuit = self.circuits[domain] = DomainCircuit()
+        return domain, circuit
+
+    # Downloader middleware hooks
+
+    def process_request(self, request, spider):
+        domain, circuit = self._circuit(request)
+        if circuit.state == CLOSED:
+            return None
+        if circuit.state == GIVEN_UP:
+            self.stats.inc_value('circuit/dropped')
+            raise IgnoreRequest(f'Circuit given up for {domain}')
+        if self._is_probe(circuit, request):
+            return None
+        if circuit.state == HALF_OPEN and circuit.probe is None:
+            self._start_probe(domain, circuit, request)
+            return None
+        circuit.held.append(request)
+        self.stats.inc_value('circuit/held')
+        raise IgnoreRequest(f'Circuit open for {domain}')
+
+    def process_response(self, request, response, spider):
+        domain, circuit = self._circuit(request)
+        if response.status in self.failure_codes:
+            self._record_failure(domain, circuit, request)
+        else:
+            self._record_success(domain, circuit)
+        if request.meta.get('dont_retry') or response.status not in self.retry_http_codes:
+            return response
+        if self._retry_later(request, f'{response.status}', spider):
+            raise IgnoreRequest(f'Retry scheduled for {request.url}')
+        return response
+
+    def process_exception(self, request, exception, spider):
+        domain, circuit = self._circuit(request)
+        if not isinstance(exception, self.exceptions_to_retry):
+            if self._is_probe(circuit, request):
+                if isinstance(exception, IgnoreRequest):
+                    # Dropped by another middleware before reaching the site: probe with the next request
+                    self._end_probe(circuit)
+                    self._send_probe(domain, circuit)
+                else:
+                    self._record_failure(domain, circuit, request)
+            return None
+        self._record_failure(domain, circuit, request)
+        if request.meta.get('dont_retry'):
+            return None
+        if self._retry_later(request, exception, spider):
+            raise IgnoreRequest(f'Retry scheduled for {request.url}')
+        return None
+
+    # Retries
+
+    def _retry_later(self, request, reason, spider):
+        retry_request = get_retry_request(
+            request,
+            spider=spider,
+            reason=reason,
+            max_retry_times=request.meta.get('max_retry_times', self.max_retry_times),
+            priority_adjust=request.meta.get('priority_adjust', self.priority_adjust),
+        )
+        if retry_request is None:
+            return False
+        attempt = retry_request.meta.get('retry_times', 1)
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+        retry_request.meta.pop('circuit_probe', None)
+        self.pending_retries += 1
+        self._call_later(delay, self._send_retry, retry_request)
+        return True
+
+    def _send_retry(self, request):
+        self.pending_retries -= 1
+        self._crawl(request)
+
+    # Circuit
+
+    def _record_success(self, domain, circuit):
+        circuit.failures = 0
+        if circuit.state in (OPEN, HALF_OPEN):
+            self.logger.info(f"[Circuit] {domain}: probe succeeded, closing circuit and releasing "
+                             f"{len(circuit.held)} held requests")
+            self.stats.inc_value('circuit/closed')
+            circuit.state = CLOSED
+            circuit.opens = 0
+            self._end_probe(circuit)
+            held, circuit.held = circuit.held, deque()
+            for request in held:
+                self._crawl(request)
+        self._set_state_stat(domain, circuit)
+
+    def _record_failure(self, domain, circuit, request):
+        circuit.failures += 1
+        if circuit.state == CLOSED and circuit.failures < self.failure_threshold:
+            return
+        if circuit.state != CLOSED and not self._is_probe(circuit, request):
+            # Stragglers that were in flight when the circuit opened
+            return
+        self._open(domain, circuit)
+
+    def _open(self, domain, circuit):
+        self._end_probe(circuit)
+        if circuit.state != CLOSED and circuit.opens >= self.max_opens:
+            self._give_up(domain, circuit)
+            return
+        duration = min(self.open_max_secs, self.open_secs * 2 ** circuit.opens)
+        circuit.opens += 1
+        circuit.state = OPEN
+        self.stats.inc_value('circuit/opened')
+        self.logger.warning(f"[Circuit] {domain}: {circuit.failures} failures in a row, pausing for {duration:.0f}s")
+        self._call_later(duration, self._probe, domain, circuit)
+        self._set_state_stat(domain, circuit)
+
+    def _probe(self, domain, circuit):
+        if circuit.state != OPEN:
+            return
+        circuit.state = HALF_OPEN
+        self._send_probe(domain, circuit)
+        self._set_state_stat(domain, circuit)
+
+    def _send_probe(self, domain, circuit):
+        if circuit.state != HALF_OPEN or not circuit.held:
+            return
+        # Send one parked request as the probe; the rest wait for its outcome
+        request = circuit.held.popleft()
+        self._start_probe(domain, circuit, request)
+        self._crawl(request)
+
+    def _start_probe(self, domain, circuit, request):
+        circuit.probe = next(self.probe_ids)
+        request.meta['circuit_probe'] = circuit.probe
+        circuit.deadline = self._call_later(self.probe_timeout, self._probe_expired, domain, circuit, circuit.probe)
+        self.stats.inc_value('circuit/probes')
+
+    def _probe_expired(self, domain, circuit, probe):
+        if circuit.probe != probe:
+            return
+        circuit.deadline = None
+        self.stats.inc_value('circuit/probe_timeouts')
+        self.logger.warning(f"[Circuit] {domain}: no outcome for the probe after {self.probe_timeout:.0f}s, "
+                            f"counting it as failed")
+        circuit.failures += 1
+        self._open(domain, circuit)
+
+    def _end_probe(self, circuit):
+        circuit.probe = None
+        if circuit.deadline is not None and circuit.deadline.active():
+            circuit.deadline.cancel()
+        circuit.deadline = None
+
+    @staticmethod
+    def _is_probe(circuit, request):
+        return circuit.probe is not None and request.meta.get('circuit_probe') == circuit.probe
+
+    def _give_up(self, domain, circuit):
+        circuit.state = GIVEN_UP
+        self._end_probe(circuit)
+        dropped = len(circuit.held)
+        circuit.held.clear()
+        self.stats.inc_value('circuit/dropped', dropped)
+        self.logger.error(f"[Circuit] {domain}: still failing after {circuit.opens} pauses, "
+                          f"giving up on the domain for this run ({dropped} requests dropped)")
+        self._set_state_stat(domain, circuit)
+
+    def _set_state_stat(self, domain, circuit):
+        self.stats.set_value(f'circuit/{domain}/state', circuit.state)
+
+    # Scheduling helpers
+
+    def _crawl(self, request):
+        engine = self.crawler.engine
+        if engine is None or not engine.running:
+            return
+        # The dupefilter has already seen these URLs
+        engine.crawl(request.replace(dont_filter=True))
+
+    def _call_later(self, delay, func, *args):
+        call = reactor.callLater(delay, self._run_call, func, *args)
+        self.calls.add(call)
+        return call
+
+    def _run_call(self, func, *args):
+        self.calls = {call for call in self.calls if call.active()}
+        func(*args)
+
+    def spider_idle(self, spider):
+        # Keep the spider open while retries are waiting or a paused domain has parked requests
+        if self.pending_retries or any(c.held or c.probe is not None for c in self.circuits.values()):
+            raise DontCloseSpider
+
+    def spider_closed(self, spider):
+        for call in self.calls:
+            if call.active():
+                call.cancel()
+        self.calls.clear()
+
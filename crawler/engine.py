@@ -1,3 +1,4 @@
+import atexit
 import scrapy
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
@@ -6,7 +7,9 @@ import sys
 from multiprocessing import Process, Queue
 import time
 from crawler.spiders.custom_spider import CustomSpider
+from crawler.progress import ProgressHub
 import logging
+import threading
 
 # Configure logging for the engine
 logging.basicConfig(
@@ -19,27 +22,136 @@ class CrawlerEngine:
     def __init__(self):
         self.processes = {}
         self.results = {}
+        self.ingest_service = None
+        self.worker_pool = None
+        self.flask_app = None
+        self.progress = ProgressHub()
+        self.progress_queue = None
+        self.shutdown_registered = False
         
         # Set up logging
         self.logger = logging.getLogger(__name__)
         
-    def start_crawl(self, job_id, target_url, max_depth, custom_rules=None, settings=None):
-        """Start a crawl job in a separate process"""
+    def _get_ingest_service(self):
+        """Start (or restart) the shared ingestion service if it is enabled"""
+        project_settings = get_project_settings()
+        if not project_settings.getbool('INGEST_SERVICE_ENABLED', True):
+            return None
+        if self.ingest_service is None or not self.ingest_service.is_alive():
+            from crawler.ingest import IngestionService
+            service = IngestionService(
+                batch_size=project_settings.getint('INGEST_BATCH_SIZE', 500),
+                flush_interval=project_settings.getfloat('INGEST_FLUSH_INTERVAL', 1.0),
+                queue_size=project_settings.getint('INGEST_QUEUE_SIZE', 20000),
+            )
+            try:
+                service.start()
+            except Exception as e:
+                self.logger.error(f"[Engine] Failed to start ingestion service, spiders will write directly: {e}")
+                return None
+            self.ingest_service = service
+            self._register_shutdown()
+        return self.ingest_service
+        
+    def _register_shutdown(self):
+        """Run shutdown() when the web process exits, once"""
+        if not self.shutdown_registered:
+            atexit.register(self.shutdown)
+            self.shutdown_registered = True
+        
+    def shutdown(self):
+        """Stop the background services so rows they still hold are committed"""
+        # Workers first: their spiders flush remaining items to the ingestion service
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
+            self.worker_pool = None
+        if self.ingest_service is not None:
+            self.ingest_service.stop()
+            self.ingest_service = None
+        
+    def _get_flask_app(self):
+        """Flask app used by the parent for run bookkeeping, created once"""
+        if self.flask_app is None:
+            from app import create_app
+            self.flask_app = create_app()
+        return self.flask_app
+        
+    def _get_worker_pool(self):
+        """Start the pre-forked worker pool if it is enabled"""
+        project_settings = get_project_settings()
+        if not project_settings.getbool('WORKER_POOL_ENABLED', True):
+            return None
+        if self.worker_pool is not None and self.worker_pool.broken:
+            # Workers kept crashing on start-up; jobs fork their own process instead
+            return None
+        if self.worker_pool is None:
+            from crawler.worker_pool import WorkerPool
+            pool = WorkerPool(
+                size=project_settings.getint('WORKER_POOL_SIZE', 2),
+                max_jobs=project_settings.getint('WORKER_MAX_JOBS', 20),
+                max_rss_mb=project_settings.getint('WORKER_MAX_RSS_MB', 1024),
+                on_progress=self.progress.publish,
+                max_start_failures=project_settings.getint('WORKER_MAX_START_FAILURES', 5),
+            )
+            try:
+                pool.start()
+            except Exception as e:
+                self.logger.error(f"[Engine] Failed to start worker pool, jobs will fork their own process: {e}")
+                return None
+            self.worker_pool = pool
+            self._register_shutdown()
+        return self.worker_pool
+        
+    def acquire_worker(self):
+        """Reserve a warm pool worker for the next start_crawl(), or None without a pool"""
+        from crawler.worker_pool import WorkerPoolUnavailable
+        worker_pool = self._get_worker_pool()
+        if not worker_pool:
+            return None
+        try:
+            return worker_pool.acquire()
+        except WorkerPoolUnavailable as e:
+            self.logger.error(f"[Engine] {e}; jobs will fork their own process")
+            return None
+        
+    def release_worker(self, worker):
+        """Give back a worker from acquire_worker() that did not get a job"""
+        if worker is not None and self.worker_pool is not None:
+            self.worker_pool.release(worker)
+        
+    def _get_progress_queue(self):
+        """Queue forked spider processes put progress snapshots on, drained into the hub"""
+        if self.progress_queue is None:
+            self.progress_queue = Queue()
+            threading.Thread(target=self._drain_progress, name='progress-drain', daemon=True).start()
+        return self.progress_queue
+        
+    def _drain_progress(self):
+        while True:
+            try:
+                job_id, snapshot = self.progress_queue.get()
+            except (EOFError, OSError):
+                return
+            self.progress.publish(job_id, snapshot)
+        
+    def warm_up(self):
+        """Start the ingestion service and worker pool ahead of the first job"""
+        self._get_ingest_service()
+        self._get_worker_pool()
+        
+    def start_crawl(self, job_id, target_url, max_depth, custom_rules=None, settings=None, worker=None):
+        """Start a crawl job in a separate process (on `worker` if one was reserved)"""
         self.logger.info(f"[Engine] Starting crawl job {job_id} for URL: {target_url}")
         
         if job_id in self.processes:
             raise ValueError(f"Job {job_id} is already running")
             
-        # Create a queue for communication
-        result_queue = Queue()
-        
-        # Initialize Flask app context to create a run record
+        # Create a run record
         run_id = None
         try:
-            from app import create_app, db
+            from app import db
             from models.job import CrawlRun
-            flask_app = create_app()
-            with flask_app.app_context():
+            with self._get_flask_app().app_context():
                 run = CrawlRun(job_id=job_id, status='running', max_depth=int(max_depth))
                 db.session.add(run)
                 db.session.commit()
@@ -48,9 +160,34 @@ class CrawlerEngine:
         except Exception as e:
             self.logger.error(f"[Engine] Failed to create run for job {job_id}: {e}")
         
-        # Start the crawl in a separate process
-        process = Process(target=self._run_spider, args=(job_id, run_id, target_url, max_depth, custom_rules, settings, result_queue))
-        process.start()
+        # Route result writes through the shared single-writer service
+        settings = dict(settings or {})
+        ingest_service = self._get_ingest_service()
+        if ingest_service:
+            settings.update(ingest_service.client_settings())
+        
+        # Replaces the previous run's last snapshot for listeners that connect now
+        self.progress.publish(job_id, {'run_id': run_id, 'state': 'starting', 'time': time.time()})
+        
+        try:
+            if worker is None:
+                worker = self.acquire_worker()
+            if worker is not None:
+                # Hand the job to a warm worker; the handle behaves like the Process below
+                process = self.worker_pool.submit(job_id, run_id, target_url, max_depth, custom_rules, settings, worker)
+                result_queue = process.result_queue
+            else:
+                # Start the crawl in a separate process
+                result_queue = Queue()
+                progress_queue = self._get_progress_queue()
+                process = Process(target=self._run_spider, args=(job_id, run_id, target_url, max_depth, custom_rules, settings, result_queue, progress_queue))
+                process.start()
+        except Exception as e:
+            # Nothing will ever finish this run, so close it here
+            self.logger.error(f"[Engine] Failed to start job {job_id}: {e}")
+            self._set_run_status(run_id, 'failed')
+            self.progress.publish(job_id, {'run_id': run_id, 'state': 'failed', 'error': str(e), 'time': time.time()})
+            raise
         
         self.logger.info(f"[Engine] Started process for job {job_id} with PID: {process.pid}")
         
@@ -64,8 +201,11 @@ class CrawlerEngine:
         
         return job_id
     
-    def _run_spider(self, job_id, run_id, target_url, max_depth, custom_rules, settings, result_queue):
+    def _run_spider(self, job_id, run_id, target_url, max_depth, custom_rules, settings, result_queue, progress_queue=None):
         """Run the spider in a separate process"""
+        if progress_queue is not None:
+            from crawler.progress import set_progress_sink
+            set_progress_sink(lambda job, snapshot: progress_queue.put((job, snapshot)))
         try:
             # Configure logging for the spider process
             logging.basicConfig(
@@ -140,6 +280,8 @@ class CrawlerEngine:
             except Exception:
                 pass
             # Send error message
+            if progress_queue is not None:
+                progress_queue.put((job_id, {'run_id': run_id, 'state': 'failed', 'error': str(e), 'time': time.time()}))
             result_queue.put(('error', str(e)))
         finally:
             # Pop Flask app context if it was pushed
@@ -150,35 +292,50 @@ class CrawlerEngine:
                 pass
     
     def stop_crawl(self, job_id):
-        """Stop a running crawl job"""
+        """Stop a running crawl job; returns once the job is signalled, not when it has exited"""
         self.logger.info(f"[Engine] Stopping crawl job {job_id}")
         
         if job_id not in self.processes:
             raise ValueError(f"Job {job_id} is not running")
             
-        process = self.processes[job_id]['process']
+        info = self.processes[job_id]
+        if info['process'].is_alive():
+            info['process'].terminate()
+        threading.Thread(target=self._reap_stopped, args=(job_id, info),
+                         name=f'stop-job-{job_id}', daemon=True).start()
+        
+    def _reap_stopped(self, job_id, info):
+        """Wait for a stopped job to exit, killing it after JOB_STOP_TIMEOUT, then mark its run stopped"""
+        process = info['process']
+        timeout = get_project_settings().getfloat('JOB_STOP_TIMEOUT', 30.0)
+        process.join(timeout)
         if process.is_alive():
-            process.terminate()
-            process.join()
+            self.logger.warning(f"[Engine] Job {job_id} did not stop within {timeout:.0f}s, killing PID {process.pid}")
+            process.kill()
+            process.join(5)
             
-        # Update run status to stopped
-        run_id = self.processes[job_id].get('run_id')
+        self._set_run_status(info.get('run_id'), 'stopped')
+        
+        # The job may have been started again meanwhile; only drop this run's entry
+        if self.processes.get(job_id) is info:
+            del self.processes[job_id]
+        
+    def _set_run_status(self, run_id, status):
+        """Close a run record with status, from the parent process"""
+        if not run_id:
+            return
         try:
-            from app import create_app, db
+            from app import db
             from models.job import CrawlRun
-            flask_app = create_app()
-            with flask_app.app_context():
-                if run_id:
-                    run = db.session.get(CrawlRun, run_id)
-                    if run:
-                        run.status = 'stopped'
-                        run.ended_at = __import__('datetime').datetime.utcnow()
-                        db.session.commit()
-        except Exception:
-            pass
-        
-        del self.processes[job_id]
-        
+            with self._get_flask_app().app_context():
+                run = db.session.get(CrawlRun, run_id)
+                if run:
+                    run.status = status
+                    run.ended_at = __import__('datetime').datetime.utcnow()
+                    db.session.commit()
+        except Exception as e:
+            self.logger.error(f"[Engine] Failed to mark run {run_id} {status}: {e}")
+            
     def get_job_status(self, job_id):
         """Get the status of a crawl job"""
         if job_id not in self.processes:
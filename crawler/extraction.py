@@ -0,0 +1,182 @@
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+# Keys of custom_rules that control field extraction
+EXTRACTION_KEYS = ('title_selector', 'content_selector', 'custom_fields', 'content_max_chars')
+
+# Character budgets for the content field (custom_rules.content_max_chars overrides)
+DEFAULT_CONTENT_CHARS = 500
+SELECTOR_CONTENT_CHARS = 1000
+
+# Elements whose text is never visible page content
+SKIP_TEXT_TAGS = frozenset(['script', 'style', 'noscript', 'template'])
+
+_translator = HTMLTranslator()
+
+# Every anchor with an href, in document order
+LINK_ANCHORS = etree.XPath('//a[@href]')
+
+
+class CompiledSelector:
+    """A CSS selector translated to XPath and compiled once.
+
+    Supports the same syntax as response.css(), including the ::text and
+    ::attr(name) pseudo-elements, and returns the same strings as .getall().
+    """
+
+    def __init__(self, css):
+        if not isinstance(css, str) or not css.strip():
+            raise ValueError(f"Selector must be a non-empty string, got {css!r}")
+        self.css = css
+        try:
+            self.xpath = _translator.css_to_xpath(css)
+            self._compiled = etree.XPath(self.xpath)
+        except Exception as e:
+            raise ValueError(f"Invalid CSS selector {css!r}: {e}") from e
+
+    def evaluate(self, root):
+        """Raw XPath results as a list, for callers that share them between rules"""
+        result = self._compiled(root)
+        return result if isinstance(result, list) else [result]
+
+    def getall(self, root, results=None):
+        results = self.evaluate(root) if results is None else results
+        return [_serialize(value) for value in results]
+
+    def iter(self, root, results=None):
+        """Serialize results lazily so callers can stop early"""
+        results = self.evaluate(root) if results is None else results
+        for value in results:
+            yield _serialize(value)
+
+    def get(self, root, results=None):
+        results = self.evaluate(root) if results is None else results
+        return _serialize(results[0]) if results else None
+
+
+def _serialize(value):
+    """Render an XPath result the way parsel's Selector.get() does"""
+    if isinstance(value, etree._Element):
+        return etree.tostring(value, method='html', encoding='unicode', with_tail=False)
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return str(value)
+
+
+def iter_text_nodes(element):
+    """Yield the text nodes under element in document order, skipping script/style/noscript"""
+    if not _is_text_element(element):
+        return
+    if element.text:
+        yield element.text
+    # Explicit stack instead of recursion: (node, True) means "emit node's tail"
+    stack = []
+    for child in reversed(element):
+        stack.append((child, True))
+        stack.append((child, False))
+    while stack:
+        node, is_tail = stack.pop()
+        if is_tail:
+            if node.tail:
+                yield node.tail
+            continue
+        if not _is_text_element(node):
+            continue
+        if node.text:
+            yield node.text
+        for child in reversed(node):
+            stack.append((child, True))
+            stack.append((child, False))
+
+
+def _is_text_element(node):
+    tag = node.tag
+    # Comments and processing instructions have a non-string tag
+    return isinstance(tag, str) and tag.lower() not in SKIP_TEXT_TAGS
+
+
+def join_limited(chunks, max_chars):
+    """Join chunks with single spaces, collapsing whitespace, and stop once max_chars is reached"""
+    words = []
+    length = -1
+    for chunk in chunks:
+        for word in chunk.split():
+            words.append(word)
+            length += len(word) + 1
+            if length >= max_chars:
+                return ' '.join(words)[:max_chars]
+    return ' '.join(words)
+
+
+def extract_text(root, max_chars=DEFAULT_CONTENT_CHARS):
+    """Visible, whitespace-normalized text of the page body, at most max_chars long"""
+    body = root.find('body') if root.tag == 'html' else None
+    return join_limited(iter_text_nodes(body if body is not None else root), max_chars)
+
+
+class CompiledRules:
+    """Extraction rules from a job's custom_rules, validated and compiled up front.
+
+    Rules with the same selector share one compiled XPath, which runs once per
+    page. Distinct selectors are still evaluated one XPath each: libxml2 walks
+    the tree in C for every expression, which measured several times faster
+    than one Python-level walk testing each element against every rule, and a
+    single union expression is no faster and loses which rule matched.
+    """
+
+    def __init__(self, rules):
+        self.selectors = {}
+        self.title = self._compile(rules.get('title_selector') or 'title::text')
+        content_selector = rules.get('content_selector')
+        self.content = self._compile(content_selector) if content_selector else None
+        default_chars = SELECTOR_CONTENT_CHARS if self.content is not None else DEFAULT_CONTENT_CHARS
+        try:
+            self.content_max_chars = int(rules.get('content_max_chars') or default_chars)
+        except (TypeError, ValueError):
+            raise ValueError(f"content_max_chars must be an integer, got {rules.get('content_max_chars')!r}")
+        custom_fields = rules.get('custom_fields') or {}
+        if not isinstance(custom_fields, dict):
+            raise ValueError("custom_fields must be an object mapping field names to selectors")
+        self.fields = []
+        for name, selector in custom_fields.items():
+            try:
+                self.fields.append((name, self._compile(selector)))
+            except ValueError as e:
+                raise ValueError(f"custom_fields.{name}: {e}") from e
+
+    def _compile(self, css):
+        selector = self.selectors.get(css)
+        if selector is None:
+            selector = self.selectors[css] = CompiledSelector(css)
+        return selector
+
+    def extract(self, response):
+        """Evaluate every rule against the response's already-parsed tree"""
+        root = response.selector.root
+        results = {}
+
+        def evaluate(selector):
+            if selector.css not in results:
+                results[selector.css] = selector.evaluate(root)
+            return results[selector.css]
+
+        extracted_data = {'title': self.title.get(root, evaluate(self.title))}
+        if self.content is not None:
+            extracted_data['content'] = join_limited(self.content.iter(root, evaluate(self.content)),
+                                                     self.content_max_chars)
+        else:
+            extracted_data['content'] = extract_text(root, self.content_max_chars)
+        for field_name, selector in self.fields:
+            values = selector.getall(root, evaluate(selector))
+            extracted_data[field_name] = values[0] if len(values) == 1 else values
+        return extracted_data
+
+
+def compile_rules(custom_rules):
+    """Compile the extraction part of custom_rules; None when the job uses default extraction.
+
+    Raises ValueError for malformed selectors so a bad job fails before crawling.
+    """
+    if not custom_rules or not any(key in custom_rules for key in EXTRACTION_KEYS):
+        return None
+    return CompiledRules(custom_rules)
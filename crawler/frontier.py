@@ -0,0 +1,211 @@
+import hashlib
+import json
+import logging
+import math
+import os
+from urllib.parse import urlsplit, urlunsplit
+
+from w3lib.url import canonicalize_url as w3lib_canonicalize_url
+
+# Query parameters that never change the page content. Names that some sites use
+# for paging or content (from, spm, share_token, ...) belong in FRONTIER_STRIP_PARAMS.
+TRACKING_PARAMS = frozenset([
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid',
+    '_hsenc', '_hsmi', 'igshid',
+])
+TRACKING_PREFIXES = ('utm_',)
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(url, strip_params=TRACKING_PARAMS):
+    """Normalize a URL for duplicate detection.
+
+    Sorts and percent-normalizes the query, drops the fragment, tracking
+    parameters (utm_*, fbclid, ...), default ports and a trailing slash, and
+    lower-cases scheme and host. Only used as a dedup key; requests are still
+    sent to the original URL.
+    """
+    url = w3lib_canonicalize_url(url, keep_fragments=False)
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    netloc = host
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{host}:{parts.port}'
+    if parts.username:
+        netloc = f'{parts.username}@{netloc}'
+    path = parts.path or '/'
+    if len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/') or '/'
+    query = '&'.join(
+        pair for pair in parts.query.split('&')
+        if pair and not _is_tracking_param(pair.split('=', 1)[0].lower(), strip_params)
+    )
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def _is_tracking_param(name, strip_params):
+    return name in strip_params or name.startswith(TRACKING_PREFIXES)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing on blake2b.
+
+    Memory is about -capacity * ln(error_rate) / ln(2)^2 bits, e.g. ~1.8 MB
+    for one million keys at 0.1% false positives.
+    """
+
+    def __init__(self, capacity, error_rate=0.001, bits=None, count=0):
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError('capacity must be positive and error_rate in (0, 1)')
+        self.capacity = int(capacity)
+        self.error_rate = float(error_rate)
+        self.num_bits = int(math.ceil(-self.capacity * math.log(self.error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / self.capacity * math.log(2))))
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+        self.count = count
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, key):
+        """Add key; returns True if it was (probably) not present before"""
+        added = False
+        bits = self.bits
+        for pos in self._positions(key):
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def size_bytes(self):
+        return len(self.bits)
+
+    def save(self, path):
+        header = json.dumps({'capacity': self.capacity, 'error_rate': self.error_rate, 'count': self.count})
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(header.encode('utf-8') + b'\n')
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline().decode('utf-8'))
+            bits = bytearray(f.read())
+        bloom = cls(header['capacity'], header['error_rate'], bits=bits, count=header['count'])
+        if len(bloom.bits) != (bloom.num_bits + 7) // 8:
+            raise ValueError(f'Corrupt Bloom filter file: {path}')
+        return bloom
+
+
+class BloomDupeFilter:
+    """Scrapy dupefilter keyed on canonical URLs and backed by a Bloom filter.
+
+    Replaces the unbounded fingerprint set of RFPDupeFilter. With
+    FRONTIER_PERSIST the filter is saved as frontier.bloom in the run's output
+    directory on close and loaded again if that run is resumed.
+    """
+
+    def __init__(self, capacity=1000000, error_rate=0.001, persist_dir=None, strip_params=TRACKING_PARAMS,
+                 stats=None, debug=False):
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.persist_dir = persist_dir
+        self.strip_params = strip_params
+        self.stats = stats
+        self.debug = debug
+        self.crawler = None
+        self.path = None
+        self.capacity_warned = False
+        self.log_dupes = True
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        persist_dir = settings.get('JSONL_OUTPUT_DIR', 'output') if settings.getbool('FRONTIER_PERSIST', True) else None
+        strip_params = TRACKING_PARAMS | frozenset(p.lower() for p in settings.getlist('FRONTIER_STRIP_PARAMS'))
+        dupefilter = cls(
+            capacity=settings.getint('FRONTIER_CAPACITY', 1000000),
+            error_rate=settings.getfloat('FRONTIER_ERROR_RATE', 0.001),
+            persist_dir=persist_dir,
+            strip_params=strip_params,
+            stats=crawler.stats,
+            debug=settings.getbool('DUPEFILTER_DEBUG'),
+        )
+        dupefilter.crawler = crawler
+        return dupefilter
+
+    def open(self):
+        spider = getattr(self.crawler, 'spider', None)
+        if self.persist_dir and spider is not None:
+            run_id = getattr(spider, 'run_id', None)
+            if run_id is not None:
+                run_dir = os.path.join(self.persist_dir, f"job_{getattr(spider, 'job_id', None)}", f'run_{run_id}')
+                self.path = os.path.join(run_dir, 'frontier.bloom')
+                if os.path.exists(self.path):
+                    try:
+                        self.bloom = BloomFilter.load(self.path)
+                        self.logger.info(f"[Frontier] Resumed seen-set with {len(self.bloom)} URLs from {self.path}")
+                    except Exception as e:
+                        self.logger.error(f"[Frontier] Could not load {self.path}: {e}")
+        self.logger.info(f"[Frontier] Bloom seen-set: capacity={self.bloom.capacity}, "
+                         f"error_rate={self.bloom.error_rate}, size={self.bloom.size_bytes / 1024:.0f} KiB")
+
+    def close(self, reason):
+        if self.stats is not None:
+            self.stats.set_value('frontier/seen', len(self.bloom))
+        if self.path:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self.bloom.save(self.path)
+                self.logger.info(f"[Frontier] Saved seen-set ({len(self.bloom)} URLs) to {self.path}")
+            except Exception as e:
+                self.logger.error(f"[Frontier] Could not save {self.path}: {e}")
+
+    def request_key(self, request):
+        key = canonicalize_url(request.url, self.strip_params)
+        if request.method != 'GET' or request.body:
+            key = f"{request.method} {key} {hashlib.sha1(request.body).hexdigest()}"
+        return key
+
+    def request_seen(self, request):
+        key = self.request_key(request)
+        redirect_urls = request.meta.get('redirect_urls')
+        if redirect_urls and canonicalize_url(redirect_urls[-1], self.strip_params) == key:
+            # /news -> 301 -> /news/ shares the key of the request that was redirected,
+            # which was never fetched itself; let it through
+            self.bloom.add(key)
+            return False
+        added = self.bloom.add(key)
+        if added and not self.capacity_warned and len(self.bloom) > self.bloom.capacity:
+            self.capacity_warned = True
+            self.logger.warning(f"[Frontier] Seen-set exceeded FRONTIER_CAPACITY={self.bloom.capacity}; "
+                                f"false-positive rate will rise above {self.bloom.error_rate}")
+        return not added
+
+    def log(self, request, spider):
+        if self.debug:
+            self.logger.debug(f"[Frontier] Filtered duplicate request: {request.url}")
+        elif self.log_dupes:
+            self.logger.debug(f"[Frontier] Filtered duplicate request: {request.url} - no more duplicates will be shown")
+            self.log_dupes = False
+        if self.stats is not None:
+            self.stats.inc_value('dupefilter/filtered')
@@ -0,0 +1,121 @@
+import logging
+import os
+import shutil
+from collections import OrderedDict
+
+from scrapy.extensions.httpcache import FilesystemCacheStorage
+
+STORAGE_PATH = 'crawler.httpcache.LruFilesystemCacheStorage'
+DEFAULT_MAX_MB = 512
+
+
+def http_cache_settings(option):
+    """Scrapy settings for a job's custom_rules 'http_cache' value.
+
+    Accepts true or {"expiration_secs": 86400, "max_size_mb": 512, "gzip": true}.
+    Entries live under HTTPCACHE_DIR/<spider name>, and the spider is named
+    spider_<job_id>, so every job gets its own cache directory.
+    """
+    if not option:
+        return {}
+    if option is True:
+        option = {}
+    if not isinstance(option, dict):
+        raise ValueError("http_cache must be true or an object")
+    try:
+        expiration = int(option.get('expiration_secs', 0))
+        max_bytes = int(float(option.get('max_size_mb', DEFAULT_MAX_MB)) * 1024 * 1024)
+    except (TypeError, ValueError):
+        raise ValueError("http_cache.expiration_secs and http_cache.max_size_mb must be numbers")
+    return {
+        'HTTPCACHE_ENABLED': True,
+        'HTTPCACHE_STORAGE': STORAGE_PATH,
+        'HTTPCACHE_GZIP': bool(option.get('gzip', True)),
+        'HTTPCACHE_EXPIRATION_SECS': expiration,
+        'HTTPCACHE_MAX_BYTES': max_bytes,
+    }
+
+
+class LruFilesystemCacheStorage(FilesystemCacheStorage):
+    """Filesystem response cache with a size cap and least-recently-used eviction.
+
+    The spider's cache directory is indexed once when it opens (entries ordered
+    by directory mtime). Every hit touches the entry's directory so the order
+    survives re-runs, and every store evicts the oldest entries while the
+    total exceeds HTTPCACHE_MAX_BYTES.
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.max_bytes = settings.getint('HTTPCACHE_MAX_BYTES', DEFAULT_MAX_MB * 1024 * 1024)
+        self.entries = OrderedDict()  # entry path -> size in bytes, oldest first
+        self.total_bytes = 0
+        self.stats = None
+        self.logger = logging.getLogger(__name__)
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        self.stats = spider.crawler.stats
+        spider_dir = os.path.join(self.cachedir, spider.name)
+        found = []
+        if os.path.isdir(spider_dir):
+            for prefix in os.scandir(spider_dir):
+                if not prefix.is_dir():
+                    continue
+                for entry in os.scandir(prefix.path):
+                    if entry.is_dir():
+                        found.append((entry.stat().st_mtime, entry.path, _entry_size(entry.path)))
+        found.sort()
+        for _, path, size in found:
+            self.entries[path] = size
+            self.total_bytes += size
+        self.logger.info(f"[HttpCache] {spider_dir}: {len(self.entries)} entries, "
+                         f"{self.total_bytes / 1024 / 1024:.1f} MiB (limit {self.max_bytes / 1024 / 1024:.1f} MiB)")
+        self._evict()
+
+    def close_spider(self, spider):
+        if self.stats is not None:
+            self.stats.set_value('httpcache/size_bytes', self.total_bytes)
+            self.stats.set_value('httpcache/entries', len(self.entries))
+        super().close_spider(spider)
+
+    def retrieve_response(self, spider, request):
+        response = super().retrieve_response(spider, request)
+        if response is not None:
+            path = self._get_request_path(spider, request)
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            if path in self.entries:
+                self.entries.move_to_end(path)
+        return response
+
+    def store_response(self, spider, request, response):
+        super().store_response(spider, request, response)
+        path = self._get_request_path(spider, request)
+        self.total_bytes -= self.entries.pop(path, 0)
+        size = _entry_size(path)
+        self.entries[path] = size
+        self.total_bytes += size
+        self._evict(keep=path)
+
+    def _evict(self, keep=None):
+        evicted = 0
+        while self.total_bytes > self.max_bytes and self.entries:
+            path, size = next(iter(self.entries.items()))
+            if path == keep:
+                break
+            del self.entries[path]
+            self.total_bytes -= size
+            shutil.rmtree(path, ignore_errors=True)
+            evicted += 1
+        if evicted and self.stats is not None:
+            self.stats.inc_value('httpcache/evicted', evicted)
+
+
+def _entry_size(path):
+    try:
+        return sum(f.stat().st_size for f in os.scandir(path) if f.is_file())
+    except OSError:
+        return 0
@@ -0,0 +1,136 @@
+import hashlib
+import logging
+
+from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from twisted.internet import threads
+
+# Signal sent for every new or changed page with url=<response url> and
+# validator=(etag, last_modified, content_hash). DatabasePipeline attaches the
+# validator to the page's row, so it is only stored together with the page.
+page_validated = object()
+
+
+def upsert_validators(db, rows):
+    """Insert or update UrlValidator rows ({job_id, url, etag, last_modified, content_hash, updated_at})
+    in the current transaction"""
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    from models.job import UrlValidator
+    statement = sqlite_insert(UrlValidator.__table__)
+    statement = statement.on_conflict_do_update(
+        index_elements=['job_id', 'url'],
+        set_={column: statement.excluded[column]
+              for column in ('etag', 'last_modified', 'content_hash', 'updated_at')},
+    )
+    db.session.execute(statement, rows)
+
+
+class IncrementalMiddleware:
+    """Downloader middleware for incremental recrawls (custom_rules 'incremental').
+
+    Validators (ETag, Last-Modified, sha1 of the body) of every page stored by
+    earlier runs of the job are loaded when the spider opens. Known URLs are
+    requested conditionally; a 304, or a 200 whose body hash is unchanged, is
+    dropped with IgnoreRequest so the page is neither parsed nor stored.
+    Validators of new or changed pages are handed to DatabasePipeline through
+    the page_validated signal and written in the same transaction as the
+    page's CrawlResult, so a page that fails to parse or store is fetched
+    again next time instead of being taken as unchanged.
+    """
+
+    def __init__(self, app, crawler):
+        self.app = app
+        self.stats = crawler.stats
+        self.signals = crawler.signals
+        self.job_id = None
+        self.validators = {}
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('INCREMENTAL_ENABLED'):
+            raise NotConfigured
+        try:
+            from flask import current_app
+            app = current_app._get_current_object()
+        except RuntimeError:
+            raise NotConfigured('IncrementalMiddleware needs a Flask app context')
+        middleware = cls(app, crawler)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        from app import db
+        from models.job import UrlValidator
+        self.job_id = getattr(spider, 'job_id', None)
+        table = UrlValidator.__table__
+        rows = db.session.execute(
+            table.select().with_only_columns(table.c.url, table.c.etag, table.c.last_modified, table.c.content_hash)
+            .where(table.c.job_id == self.job_id)
+        )
+        self.validators = {url: (etag, last_modified, content_hash) for url, etag, last_modified, content_hash in rows}
+        db.session.rollback()
+        self.logger.info(f"[Incremental] Loaded {len(self.validators)} validators for job {self.job_id}")
+
+    def process_request(self, request, spider):
+        known = self.validators.get(request.url)
+        if not known:
+            return None
+        etag, last_modified, _ = known
+        if etag and b'If-None-Match' not in request.headers:
+            request.headers['If-None-Match'] = etag
+        if last_modified and b'If-Modified-Since' not in request.headers:
+            request.headers['If-Modified-Since'] = last_modified
+        if etag or last_modified:
+            self.stats.inc_value('incremental/conditional_requests')
+        return None
+
+    def process_response(self, request, response, spider):
+        known = self.validators.get(response.url) or self.validators.get(request.url)
+        if response.status == 304 and known:
+            self.stats.inc_value('incremental/not_modified')
+            self.stats.inc_value('incremental/unchanged')
+            raise IgnoreRequest(f'Not modified: {request.url}')
+        if response.status != 200:
+            return response
+
+        content_hash = hashlib.sha1(response.body).hexdigest()
+        if known and known[2] == content_hash:
+            self.stats.inc_value('incremental/unchanged')
+            raise IgnoreRequest(f'Unchanged: {response.url}')
+
+        self.stats.inc_value('incremental/changed' if known else 'incremental/new')
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        validator = (
+            etag.decode('latin-1') if etag else None,
+            last_modified.decode('latin-1') if last_modified else None,
+            content_hash,
+        )
+        self.signals.send_catch_log(page_validated, url=response.url, validator=validator)
+        return response
+
+    def spider_closed(self, spider):
+        counts = {
+            key.split('/', 1)[1]: value
+            for key, value in self.stats.get_stats().items() if key.startswith('incremental/')
+        }
+        self.logger.info(f"[Incremental] Job {self.job_id}: {counts}")
+        run_id = getattr(spider, 'run_id', None)
+        if run_id is None:
+            return None
+        # Hold the close until the counts are stored
+        return threads.deferToThread(self._record_counts, run_id, counts)
+
+    def _record_counts(self, run_id, counts):
+        from app import db
+        from crawler.run_stats import merge_run_stats
+        with self.app.app_context():
+            try:
+                merge_run_stats(db, run_id, {'incremental': counts})
+            except Exception as e:
+                db.session.rollback()
+                self.logger.error(f"[Incremental] Failed to record counts on run {run_id}: {e}")
+            finally:
+                db.session.remove()
@@ -0,0 +1,238 @@
+import logging
+import os
+import queue
+import threading
+import time
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Listener
+
+# Control messages exchanged between the writer thread and connection handlers
+_STOP = object()
+
+
+class _Client:
+    """Per-connection count of rows committed for that client"""
+
+    def __init__(self):
+        self.saved = 0
+
+
+class _FlushRequest:
+    def __init__(self, client):
+        self.client = client
+        self.done = threading.Event()
+
+
+class _RowQueue(queue.Queue):
+    """Queue of (client, rows) batches bounded by the number of rows, not batches.
+
+    A put blocks while maxsize rows are waiting, so the buffer holds at most
+    maxsize rows plus one batch. Control messages count as one row.
+    """
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self.rows = 0
+
+    def _qsize(self):
+        return self.rows
+
+    def _put(self, item):
+        super()._put(item)
+        self.rows += _weight(item)
+
+    def _get(self):
+        item = super()._get()
+        self.rows -= _weight(item)
+        return item
+
+
+def _weight(message):
+    return len(message[1]) if isinstance(message, tuple) else 1
+
+
+class IngestionService:
+    """Single writer process that owns the results database.
+
+    Spider processes connect with multiprocessing.connection.Client (a Unix
+    socket on POSIX, a named pipe on Windows) and stream batches of
+    CrawlResult rows. The service groups rows from every connected job into
+    shared transactions, so concurrent jobs no longer fight over the SQLite
+    write lock.
+
+    Protocol (pickled tuples over the connection):
+        ('rows', [row, ...])   queue rows for insertion
+        ('flush',)             reply ('ok', saved) once everything sent so far is
+                               committed; saved counts this connection's rows only
+        ('close',)             end of stream for this connection
+        ('shutdown',)          commit what is queued, then stop the service
+
+    At most queue_size rows wait for the writer; beyond that the connection
+    handlers stop reading, which holds back the spiders.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=1.0, queue_size=20000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.authkey = os.urandom(16)
+        self.address = None
+        self.process = None
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        """Start the writer process and wait until it is accepting connections"""
+        parent_conn, child_conn = Pipe(duplex=False)
+        self.process = Process(target=_serve,
+                               args=(child_conn, self.authkey, self.batch_size, self.flush_interval, self.queue_size),
+                               daemon=True)
+        self.process.start()
+        child_conn.close()
+        if not parent_conn.poll(30):
+            self.process.terminate()
+            raise RuntimeError("Ingestion service did not start")
+        self.address = parent_conn.recv()
+        parent_conn.close()
+        self.logger.info(f"[Ingest] Ingestion service started with PID {self.process.pid} at {self.address}")
+        return self.address
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def client_settings(self):
+        """Scrapy settings that point DatabasePipeline at this service"""
+        return {'INGEST_ADDRESS': self.address, 'INGEST_AUTHKEY': self.authkey}
+
+    def stop(self, timeout=10):
+        if not self.is_alive():
+            return
+        from multiprocessing.connection import Client
+        try:
+            conn = Client(self.address, authkey=self.authkey)
+            conn.send(('shutdown',))
+            conn.close()
+        except Exception as e:
+            self.logger.error(f"[Ingest] Failed to request shutdown: {e}")
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.logger.info("[Ingest] Ingestion service stopped")
+
+
+def _serve(ready_conn, authkey, batch_size, flush_interval, queue_size):
+    """Entry point of the ingestion process"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(asctime)s] %(levelname)s: %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    logger = logging.getLogger(__name__)
+
+    from app import create_app, db
+    from models.job import CrawlResult
+    flask_app = create_app()
+
+    # Bounded so that a slow disk pushes back on the socket readers and, through them, on the spiders
+    pending = _RowQueue(maxsize=queue_size)
+    writer = threading.Thread(target=_writer_loop,
+                              args=(flask_app, db, CrawlResult.__table__, pending, batch_size, flush_interval, logger),
+                              name='ingest-writer', daemon=True)
+    writer.start()
+
+    listener = Listener(authkey=authkey)
+    ready_conn.send(listener.address)
+    ready_conn.close()
+    logger.info(f"[Ingest] Listening on {listener.address}")
+
+    shutdown = threading.Event()
+    while not shutdown.is_set():
+        try:
+            conn = listener.accept()
+        except Exception as e:
+            if shutdown.is_set():
+                break
+            logger.warning(f"[Ingest] Rejected connection: {e}")
+            continue
+        if shutdown.is_set():
+            conn.close()
+            break
+        threading.Thread(target=_handle_connection, args=(conn, pending, shutdown, listener.address, authkey, logger),
+                         name='ingest-conn', daemon=True).start()
+
+    listener.close()
+    pending.put(_STOP)
+    writer.join()
+    logger.info("[Ingest] Ingestion service exiting")
+
+
+def _handle_connection(conn, pending, shutdown, address, authkey, logger):
+    client = _Client()
+    received = 0
+    try:
+        while True:
+            message = conn.recv()
+            kind = message[0]
+            if kind == 'rows':
+                received += len(message[1])
+                pending.put((client, message[1]))
+            elif kind == 'flush':
+                request = _FlushRequest(client)
+                pending.put(request)
+                request.done.wait()
+                conn.send(('ok', client.saved))
+            elif kind == 'close':
+                break
+            elif kind == 'shutdown':
+                shutdown.set()
+                # Wake the accept loop so it notices the shutdown flag
+                from multiprocessing.connection import Client
+                Client(address, authkey=authkey).close()
+                break
+    except (EOFError, OSError):
+        logger.warning(f"[Ingest] Client disconnected without closing after {received} rows")
+    finally:
+        conn.close()
+
+
+def _writer_loop(flask_app, db, table, pending, batch_size, flush_interval, logger):
+    """Collect rows from all connections and commit them in shared transactions"""
+    from crawler.pipelines import insert_result_rows
+
+    with flask_app.app_context():
+        stopping = False
+        while not stopping:
+            rows = []
+            owners = []
+            waiters = []
+            message = pending.get()
+            deadline = time.monotonic() + flush_interval
+            while True:
+                if message is _STOP:
+                    stopping = True
+                elif isinstance(message, _FlushRequest):
+                    waiters.append(message)
+                else:
+                    client, batch = message
+                    rows.extend(batch)
+                    owners.extend([client] * len(batch))
+                # A flush request or a full batch is written right away
+                if stopping or waiters or len(rows) >= batch_size:
+                    break
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    message = pending.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if rows:
+                try:
+                    saved = {id(row) for row in insert_result_rows(db, table, rows, logger)}
+                    for row, client in zip(rows, owners):
+                        if id(row) in saved:
+                            client.saved += 1
+                except Exception as e:
+                    logger.error(f"[Ingest] Failed to save {len(rows)} rows: {e}")
+            for waiter in waiters:
+                waiter.done.set()
+        db.session.remove()
@@ -0,0 +1,64 @@
+from collections import Counter
+from urllib.parse import urlsplit
+
+from sqlalchemy import func
+
+
+def site_of(url):
+    """Host a job crawls, used to share slots fairly between sites"""
+    host = (urlsplit(url or '').hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+def enqueue_job(db, job, priority=0):
+    """Queue a start request for job; re-queuing an already queued job only raises its priority"""
+    from models.job import QueuedJob
+    entry = QueuedJob.query.filter_by(job_id=job.id).first()
+    if entry is None:
+        entry = QueuedJob(job_id=job.id, priority=priority, site=site_of(job.target_url))
+        db.session.add(entry)
+    elif priority > entry.priority:
+        entry.priority = priority
+    db.session.flush()
+    return entry
+
+
+def remove_job(db, job_id):
+    """Drop job_id from the queue; returns True if it was queued"""
+    from models.job import QueuedJob
+    return QueuedJob.query.filter_by(job_id=job_id).delete(synchronize_session=False) > 0
+
+
+def queue_position(entry):
+    """1-based position of entry in priority/FIFO order (ignoring per-site interleaving)"""
+    from models.job import QueuedJob
+    ahead = QueuedJob.query.filter(
+        (QueuedJob.priority > entry.priority) |
+        ((QueuedJob.priority == entry.priority) & (QueuedJob.id < entry.id))
+    ).count()
+    return ahead + 1
+
+
+def list_queue():
+    from models.job import QueuedJob
+    return QueuedJob.query.order_by(QueuedJob.priority.desc(), QueuedJob.id).all()
+
+
+def next_queued(db, running_sites=None):
+    """Entry that should start next.
+
+    Highest priority first. Within that priority every site's oldest entry is
+    a candidate, and the site with the fewest running jobs wins (oldest entry
+    on a tie), so a bulk launch against one site cannot starve the others.
+    """
+    from models.job import QueuedJob
+    running_sites = running_sites or Counter()
+    top = db.session.query(func.max(QueuedJob.priority)).scalar()
+    if top is None:
+        return None
+    heads = (db.session.query(QueuedJob.site, func.min(QueuedJob.id))
+             .filter(QueuedJob.priority == top)
+             .group_by(QueuedJob.site)
+             .all())
+    site, entry_id = min(heads, key=lambda head: (running_sites[head[0]], head[1]))
+    return db.session.get(QueuedJob, entry_id)
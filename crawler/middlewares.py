@@ -1,28 +1,100 @@
+import logging
 import random
 import requests
+from scrapy import signals
 from scrapy.downloadermiddlewares.retry import RetryMiddleware
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
 from scrapy.utils.response import response_status_message
+from crawler.proxy_pool import ProxyPool
+from crawler.utils import retry_exceptions
 
 class ProxyMiddleware:
-    def __init__(self, proxy_list):
-        self.proxy_list = proxy_list
-        
+    """Routes requests through a health-scored ProxyPool built from PROXY_LIST.
+
+    A request that fails on its proxy (a network error from RETRY_EXCEPTIONS
+    such as a refused connection, timeout or tunnel failure, or a 407) marks
+    the proxy as failed and is re-sent on another proxy up to
+    PROXY_MAX_RETRIES times. Other exceptions, including IgnoreRequest from
+    later middlewares, say nothing about the proxy and are passed on.
+    Requests that already carry meta['proxy'] are left alone. Per-proxy
+    health is kept in proxy_pool/<host:port>/* stats.
+    """
+
+    def __init__(self, pool, max_retries=3, stats=None, network_errors=()):
+        self.pool = pool
+        self.max_retries = max_retries
+        self.stats = stats
+        self.network_errors = tuple(network_errors)
+        self.logger = logging.getLogger(__name__)
+
     @classmethod
     def from_crawler(cls, crawler):
-        proxy_list = crawler.settings.get('PROXY_LIST', [])
-        return cls(proxy_list)
-        
+        proxy_list = crawler.settings.getlist('PROXY_LIST')
+        if not proxy_list:
+            raise NotConfigured
+        pool = ProxyPool(
+            proxy_list,
+            quarantine_base=crawler.settings.getfloat('PROXY_QUARANTINE_BASE', 30.0),
+            quarantine_max=crawler.settings.getfloat('PROXY_QUARANTINE_MAX', 1800.0),
+        )
+        middleware = cls(pool, crawler.settings.getint('PROXY_MAX_RETRIES', 3), crawler.stats,
+                         retry_exceptions(crawler.settings))
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
     def process_request(self, request, spider):
-        if self.proxy_list:
-            proxy = random.choice(self.proxy_list)
-            request.meta['proxy'] = proxy
-            
+        if 'proxy' in request.meta and 'pool_proxy' not in request.meta:
+            return None
+        proxy = self.pool.choose(urlparse_cached(request).hostname)
+        request.meta['proxy'] = proxy
+        request.meta['pool_proxy'] = proxy
+        return None
+
+    def process_response(self, request, response, spider):
+        proxy = request.meta.get('pool_proxy')
+        if proxy is None:
+            return response
+        if response.status == 407:
+            return self._retry(request, self.pool.report_failure(proxy), '407 Proxy Authentication Required') or response
+        self._record(self.pool.report_success(proxy, request.meta.get('download_latency')))
+        return response
+
     def process_exception(self, request, exception, spider):
-        # Rotate proxy on failure
-        if self.proxy_list:
-            proxy = random.choice(self.proxy_list)
-            request.meta['proxy'] = proxy
-            return request
+        proxy = request.meta.get('pool_proxy')
+        if proxy is None or isinstance(exception, IgnoreRequest) or not isinstance(exception, self.network_errors):
+            return None
+        return self._retry(request, self.pool.report_failure(proxy), exception)
+
+    def _retry(self, request, state, reason):
+        self._record(state)
+        retries = request.meta.get('proxy_retry_times', 0) + 1
+        if retries > self.max_retries:
+            self.logger.info(f"[ProxyPool] Giving up on {request.url} after {retries - 1} proxy retries: {reason}")
+            return None
+        self.logger.debug(f"[ProxyPool] {state.label if state else '?'} failed for {request.url} ({reason}); "
+                          f"retrying on another proxy ({retries}/{self.max_retries})")
+        if self.stats is not None:
+            self.stats.inc_value('proxy_pool/retries')
+        meta = dict(request.meta, proxy_retry_times=retries)
+        meta.pop('proxy', None)
+        meta.pop('pool_proxy', None)
+        return request.replace(meta=meta, dont_filter=True)
+
+    def _record(self, state):
+        if state is None or self.stats is None:
+            return
+        prefix = f'proxy_pool/{state.label}'
+        self.stats.set_value(f'{prefix}/successes', state.successes)
+        self.stats.set_value(f'{prefix}/failures', state.failures)
+        if state.latency is not None:
+            self.stats.set_value(f'{prefix}/latency_ms', int(state.latency * 1000))
+
+    def spider_closed(self, spider):
+        for entry in self.pool.stats():
+            self.logger.info(f"[ProxyPool] {entry}")
+            if entry['quarantined_for'] and self.stats is not None:
+                self.stats.set_value(f"proxy_pool/{entry['proxy']}/quarantined_for", entry['quarantined_for'])
 
 class RandomUserAgentMiddleware:
     def __init__(self):
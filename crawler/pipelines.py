@@ -1,70 +1,460 @@
+import collections
+import contextlib
+import gzip
 import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
 from itemadapter import ItemAdapter
 import logging
 
+try:
+    import zstandard
+except ImportError:  # optional, only needed for JSONL_COMPRESSION = 'zstd'
+    zstandard = None
+
 class JsonWriterPipeline:
-    def open_spider(self, spider):
-        self.file = open('items.json', 'w')
+    """Write items as sharded, compressed JSON Lines, one directory per run.
+
+    Layout: <JSONL_OUTPUT_DIR>/job_<job_id>/run_<run_id>/part-00000.jsonl.gz
+    A shard is closed and a new one started once its compressed size reaches
+    JSONL_SHARD_MAX_BYTES. manifest.json in the run directory lists every
+    shard with its item count and size, and is rewritten on each rotation.
+    """
+
+    extensions = {'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst', 'none': '.jsonl'}
+
+    def __init__(self, output_dir='output', compression='gzip', shard_max_bytes=64 * 1024 * 1024, compress_level=6):
         self.logger = logging.getLogger(__name__)
-        self.logger.info(f"[Pipeline] Opening JSON writer for spider: {spider.name}")
+        self.output_dir = output_dir
+        self.compression = (compression or 'none').lower()
+        self.shard_max_bytes = int(shard_max_bytes)
+        self.compress_level = int(compress_level)
+        if self.compression not in self.extensions:
+            raise ValueError(f"Unsupported JSONL_COMPRESSION: {compression}")
+        if self.compression == 'zstd' and zstandard is None:
+            self.logger.warning("[Pipeline] zstandard is not installed; falling back to gzip")
+            self.compression = 'gzip'
+        self.raw = None
+        self.file = None
+        self.shards = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            output_dir=crawler.settings.get('JSONL_OUTPUT_DIR', 'output'),
+            compression=crawler.settings.get('JSONL_COMPRESSION', 'gzip'),
+            shard_max_bytes=crawler.settings.getint('JSONL_SHARD_MAX_BYTES', 64 * 1024 * 1024),
+            compress_level=crawler.settings.getint('JSONL_COMPRESS_LEVEL', 6),
+        )
+
+    def open_spider(self, spider):
+        job_id = getattr(spider, 'job_id', None)
+        run_id = getattr(spider, 'run_id', None)
+        if run_id is None:
+            run_id = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        self.run_dir = os.path.join(self.output_dir, f'job_{job_id}', f'run_{run_id}')
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.manifest = {
+            'job_id': job_id,
+            'run_id': run_id,
+            'compression': self.compression,
+            'started_at': datetime.utcnow().isoformat(),
+            'finished_at': None,
+            'total_items': 0,
+            'shards': self.shards,
+        }
+        self._open_shard()
+        self.logger.info(f"[Pipeline] Opening JSON writer for spider: {spider.name} -> {self.run_dir}")
 
     def close_spider(self, spider):
-        self.file.close()
-        self.logger.info(f"[Pipeline] Closing JSON writer for spider: {spider.name}")
+        self._close_shard()
+        self.manifest['finished_at'] = datetime.utcnow().isoformat()
+        self._write_manifest()
+        self.logger.info(f"[Pipeline] Closing JSON writer for spider: {spider.name} ({self.manifest['total_items']} items in {len(self.shards)} shards)")
 
     def process_item(self, item, spider):
         line = json.dumps(ItemAdapter(item).asdict(), ensure_ascii=False) + "\n"
-        self.file.write(line)
-        self.logger.info(f"[Pipeline] Written item to JSON: {item}")
+        self.file.write(line.encode('utf-8'))
+        shard = self.shards[-1]
+        shard['items'] += 1
+        self.manifest['total_items'] += 1
+        self.logger.debug(f"[Pipeline] Written item to JSON: {item}")
+        if self.raw.tell() >= self.shard_max_bytes:
+            self._close_shard()
+            self._write_manifest()
+            self._open_shard()
         return item
 
+    def _open_shard(self):
+        name = f"part-{len(self.shards):05d}{self.extensions[self.compression]}"
+        self.raw = open(os.path.join(self.run_dir, name), 'wb')
+        if self.compression == 'gzip':
+            self.file = gzip.GzipFile(fileobj=self.raw, mode='wb', compresslevel=self.compress_level)
+        elif self.compression == 'zstd':
+            self.file = zstandard.ZstdCompressor(level=self.compress_level).stream_writer(self.raw, closefd=False)
+        else:
+            self.file = self.raw
+        self.shards.append({'file': name, 'items': 0, 'bytes': 0})
+
+    def _close_shard(self):
+        if self.file is None:
+            return
+        if self.file is not self.raw:
+            self.file.close()
+        self.raw.close()
+        shard = self.shards[-1]
+        shard['bytes'] = os.path.getsize(os.path.join(self.run_dir, shard['file']))
+        self.file = None
+        self.raw = None
+
+    def _write_manifest(self):
+        # Write to a temp file first so readers never see a half-written manifest
+        path = os.path.join(self.run_dir, 'manifest.json')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+# Sentinel telling the writer thread to flush and exit
+_WRITER_STOP = object()
+
+
+def _insert_rows(db, table, rows):
+    """Insert rows and the validators some of them carry in one transaction"""
+    validated = [row for row in rows if row.get('validator')]
+    if validated:
+        rows = [{key: value for key, value in row.items() if key != 'validator'} for row in rows]
+    db.session.execute(table.insert(), rows)
+    if validated:
+        from crawler.incremental import upsert_validators
+        upsert_validators(db, [
+            {'job_id': row['job_id'], 'url': row['url'], 'etag': etag, 'last_modified': last_modified,
+             'content_hash': content_hash, 'updated_at': row['scraped_at']}
+            for row in validated
+            for etag, last_modified, content_hash in [row['validator']]
+        ])
+    db.session.commit()
+
+
+def insert_result_rows(db, table, rows, logger):
+    """Bulk insert rows; on failure fall back to one insert per row so a bad row only drops itself.
+
+    Returns the rows that were stored. A row may carry a 'validator' (etag, last_modified, content_hash) from
+    incremental mode, which is upserted into UrlValidator in the same
+    transaction as the row itself.
+    """
+    try:
+        _insert_rows(db, table, rows)
+        logger.info(f"[Pipeline] Saved batch of {len(rows)} items to database")
+        return rows
+    except Exception as e:
+        db.session.rollback()
+        if len(rows) == 1:
+            logger.error(f"[Pipeline] Error saving item to database (url={rows[0].get('url')}): {e}")
+            return []
+        logger.warning(f"[Pipeline] Batch insert of {len(rows)} items failed ({e}); retrying item by item")
+
+    saved = []
+    for row in rows:
+        try:
+            _insert_rows(db, table, [row])
+            saved.append(row)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"[Pipeline] Error saving item to database (job_id={row.get('job_id')}, run_id={row.get('run_id')}, url={row.get('url')}): {e}")
+    logger.info(f"[Pipeline] Saved {len(saved)}/{len(rows)} items after batch retry")
+    return saved
+
+
 class DatabasePipeline:
-    def __init__(self):
+    """Persist items as CrawlResult rows.
+
+    Items are buffered and written with a single bulk INSERT per batch. The
+    buffer is flushed when it reaches DB_PIPELINE_BATCH_SIZE items, when the
+    oldest buffered item is older than DB_PIPELINE_FLUSH_INTERVAL seconds, and
+    always on close_spider. A batch size of 1 restores commit-per-item.
+
+    With DB_PIPELINE_WRITER_THREAD enabled the batches are written by a
+    dedicated thread fed through a bounded queue, so commits never run on the
+    reactor thread. When the queue is full, process_item returns a Deferred
+    that the writer fires (through the reactor) once it has room, which holds
+    back the spider.
+
+    When INGEST_ADDRESS is set (see crawler.ingest), batches are streamed to
+    the shared ingestion service instead of being written by this process.
+    If the service cannot be reached, the pipeline writes directly instead.
+
+    In incremental mode the validators announced by IncrementalMiddleware
+    travel with their page's row and are stored in the same transaction.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=5.0, writer_thread=True, queue_size=1000,
+                 ingest_address=None, ingest_authkey=None):
         self.logger = logging.getLogger(__name__)
         self.session = None
+        self.db = None
+        self.CrawlResult = None
+        self.ingest_address = ingest_address
+        self.ingest_authkey = ingest_authkey
+        self.ingest_conn = None
+        self.ingest_sent = 0
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = float(flush_interval)
+        self.buffer = []
+        self.buffer_started = None
+        self.flush_task = None
+        self.use_writer_thread = writer_thread
+        self.queue = queue.Queue(maxsize=max(1, int(queue_size))) if writer_thread else None
+        self.waiting = collections.deque()
+        self.writer = None
+        self.stats = None
+        self.validators = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(
+            batch_size=crawler.settings.getint('DB_PIPELINE_BATCH_SIZE', 100),
+            flush_interval=crawler.settings.getfloat('DB_PIPELINE_FLUSH_INTERVAL', 5.0),
+            writer_thread=crawler.settings.getbool('DB_PIPELINE_WRITER_THREAD', True),
+            queue_size=crawler.settings.getint('DB_PIPELINE_QUEUE_SIZE', 1000),
+            ingest_address=crawler.settings.get('INGEST_ADDRESS'),
+            ingest_authkey=crawler.settings.get('INGEST_AUTHKEY'),
+        )
+        pipeline.stats = crawler.stats
+        if crawler.settings.getbool('INCREMENTAL_ENABLED'):
+            from crawler.incremental import page_validated
+            crawler.signals.connect(pipeline.page_validated, signal=page_validated)
+        return pipeline
+
+    def page_validated(self, url, validator):
+        self.validators[url] = validator
 
     def open_spider(self, spider):
+        if self.ingest_address:
+            try:
+                from multiprocessing.connection import Client
+                self.ingest_conn = Client(self.ingest_address, authkey=self.ingest_authkey)
+                self.logger.info(f"[Pipeline] Streaming items for spider {spider.name} to ingestion service (batch_size={self.batch_size})")
+            except Exception as e:
+                self.logger.error(f"[Pipeline] Failed to connect to ingestion service ({e}); writing to database directly")
+                self.ingest_conn = None
+
+        if self.ingest_conn is None:
+            if not self._open_db():
+                return
+            self.logger.info(f"[Pipeline] Opening database connection for spider: {spider.name} (batch_size={self.batch_size})")
+
+        flask_app = None
+        if self.use_writer_thread:
+            # Also taken with the ingestion service, for direct writes if the service goes away
+            try:
+                from flask import current_app
+                flask_app = current_app._get_current_object()
+            except RuntimeError:
+                if self.ingest_conn is None:
+                    self.logger.warning("[Pipeline] No Flask app context; writing from the reactor thread")
+                    self.use_writer_thread = False
+        if self.use_writer_thread:
+            self.writer = threading.Thread(target=self._writer_loop, args=(flask_app,),
+                                           name=f'db-writer-{spider.name}', daemon=True)
+            self.writer.start()
+            return
+
+        # Age-based flush so a slow crawl doesn't keep items buffered indefinitely
+        if self.batch_size > 1 and self.flush_interval > 0:
+            from twisted.internet import task
+            self.flush_task = task.LoopingCall(self._flush_if_stale)
+            self.flush_task.start(self.flush_interval, now=False)
+
+    def _open_db(self):
+        """Write to the database directly; returns False if it is not available"""
         try:
             from app import db
             from models.job import CrawlResult
-            self.db = db
-            self.CrawlResult = CrawlResult
-            self.logger.info(f"[Pipeline] Opening database connection for spider: {spider.name}")
         except Exception as e:
             self.logger.error(f"[Pipeline] Failed to initialize DB in pipeline: {e}")
             self.db = None
             self.CrawlResult = None
+            return False
+        self.db = db
+        self.CrawlResult = CrawlResult
+        return True
 
     def close_spider(self, spider):
+        if self.writer is not None:
+            from twisted.internet import threads
+            d = threads.deferToThread(self._stop_writer)
+            d.addBoth(lambda _: self.logger.info(f"[Pipeline] Closing database connection for spider: {spider.name}"))
+            return d
+        if self.flush_task is not None and self.flush_task.running:
+            self.flush_task.stop()
+        self.flush()
+        self._close_ingest()
         self.logger.info(f"[Pipeline] Closing database connection for spider: {spider.name}")
 
     def process_item(self, item, spider):
-        if not hasattr(self, 'db') or self.db is None or self.CrawlResult is None:
+        if self.ingest_conn is None and (self.db is None or self.CrawlResult is None):
             self.logger.warning("[Pipeline] DB not initialized; skipping DB save")
             return item
 
         try:
-            adapter = ItemAdapter(item)
-            scraped_data = json.dumps(adapter.asdict(), ensure_ascii=False)
-            title = adapter.get('title')
-            content = adapter.get('content')
-            url = adapter.get('url')
-            job_id = adapter.get('job_id')
-            run_id = adapter.get('run_id')
-
-            result = self.CrawlResult(
-                job_id=job_id if job_id is not None else 0,
-                run_id=run_id,
-                url=url or '',
-                title=title,
-                content=content,
-                scraped_data=scraped_data
-            )
-
-            self.db.session.add(result)
-            self.db.session.commit()
-            self.logger.info(f"[Pipeline] Saved item to database (job_id={job_id}, run_id={run_id}, url={url})")
+            row = self._build_row(item)
         except Exception as e:
-            self.db.session.rollback()
-            self.logger.error(f"[Pipeline] Error saving item to database: {e}")
-        return item
\ No newline at end of file
+            self.logger.error(f"[Pipeline] Error preparing item for database: {e}")
+            return item
+
+        if self.writer is not None:
+            if not self.waiting:
+                try:
+                    self.queue.put_nowait(row)
+                    return item
+                except queue.Full:
+                    pass
+            # Backpressure: the item is only done once the writer has room for it. The
+            # Deferred is fired from the reactor thread, so no threadpool thread (which
+            # Scrapy also needs for DNS lookups) is tied up waiting on a slow database.
+            if self.stats is not None:
+                self.stats.inc_value('db_pipeline/queue_full')
+            from twisted.internet import defer
+            d = defer.Deferred()
+            self.waiting.append((row, item, d))
+            # The writer may have drained the queue since put_nowait failed
+            self._admit_waiting()
+            return d
+
+        if not self.buffer:
+            self.buffer_started = time.monotonic()
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        return item
+
+    def _admit_waiting(self):
+        """Move held-back items into the writer queue as far as it has room (reactor thread)"""
+        while self.waiting:
+            row, item, d = self.waiting[0]
+            try:
+                self.queue.put_nowait(row)
+            except queue.Full:
+                return
+            self.waiting.popleft()
+            d.callback(item)
+
+    def _stop_writer(self):
+        self.queue.put(_WRITER_STOP)
+        self.writer.join()
+        self.writer = None
+
+    def _writer_loop(self, flask_app):
+        """Drain the queue in batches and write them inside the writer thread's own app context"""
+        with flask_app.app_context() if flask_app is not None else contextlib.nullcontext():
+            stopping = False
+            while not stopping:
+                row = self.queue.get()
+                if row is _WRITER_STOP:
+                    break
+                rows = [row]
+                deadline = time.monotonic() + self.flush_interval
+                while len(rows) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        row = self.queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if row is _WRITER_STOP:
+                        stopping = True
+                        break
+                    rows.append(row)
+                if self.waiting:
+                    # Room was just made; let held-back items in while this batch is written
+                    from twisted.internet import reactor
+                    reactor.callFromThread(self._admit_waiting)
+                try:
+                    self.write_rows(rows)
+                except Exception as e:
+                    self.logger.error(f"[Pipeline] Writer thread failed to save {len(rows)} items: {e}")
+            if self.ingest_conn is not None:
+                self._close_ingest()
+            elif self.db is not None:
+                self.db.session.remove()
+
+    def _close_ingest(self):
+        """Wait until the ingestion service has committed everything we sent, then disconnect"""
+        if self.ingest_conn is None:
+            return
+        try:
+            self.ingest_conn.send(('flush',))
+            _, saved = self.ingest_conn.recv()
+            self.ingest_conn.send(('close',))
+            if saved < self.ingest_sent:
+                self.logger.warning(f"[Pipeline] Ingestion service stored {saved} of {self.ingest_sent} items")
+            else:
+                self.logger.info(f"[Pipeline] Ingestion service stored all {saved} items")
+        except (EOFError, OSError) as e:
+            self.logger.error(f"[Pipeline] Lost connection to ingestion service before it confirmed "
+                              f"{self.ingest_sent} items: {e}")
+        finally:
+            self.ingest_conn.close()
+            self.ingest_conn = None
+
+    def _build_row(self, item):
+        """Convert an item into a CrawlResult column mapping"""
+        adapter = ItemAdapter(item)
+        job_id = adapter.get('job_id')
+        row = {
+            'job_id': job_id if job_id is not None else 0,
+            'run_id': adapter.get('run_id'),
+            'url': adapter.get('url') or '',
+            'title': adapter.get('title'),
+            'content': adapter.get('content'),
+            'scraped_data': json.dumps(adapter.asdict(), ensure_ascii=False),
+            'scraped_at': datetime.utcnow(),
+        }
+        validator = self.validators.pop(row['url'], None)
+        if validator is not None:
+            row['validator'] = validator
+        return row
+
+    def _flush_if_stale(self):
+        if self.buffer and time.monotonic() - self.buffer_started >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered rows to the database"""
+        if not self.buffer or (self.db is None and self.ingest_conn is None):
+            return
+        rows, self.buffer = self.buffer, []
+        self.buffer_started = None
+        self.write_rows(rows)
+
+    def write_rows(self, rows):
+        """Write a batch either to the ingestion service or straight to the database"""
+        if self.ingest_conn is not None:
+            try:
+                self.ingest_conn.send(('rows', rows))
+                self.ingest_sent += len(rows)
+                return len(rows)
+            except (EOFError, OSError) as e:
+                self._ingest_lost(e)
+        if self.db is None:
+            self.logger.error(f"[Pipeline] No database to write {len(rows)} items to")
+            return 0
+        return len(insert_result_rows(self.db, self.CrawlResult.__table__, rows, self.logger))
+
+    def _ingest_lost(self, error):
+        """The ingestion service went away: write this and later batches directly"""
+        self.logger.error(f"[Pipeline] Ingestion service unreachable ({error}); writing to database directly. "
+                          f"Some of the {self.ingest_sent} items sent before may not have been stored")
+        try:
+            self.ingest_conn.close()
+        except OSError:
+            pass
+        self.ingest_conn = None
+        if self.stats is not None:
+            self.stats.set_value('db_pipeline/ingest_fallback', True)
+        self._open_db()
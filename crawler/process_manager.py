@@ -1,25 +1,69 @@
 import psutil
+import threading
 import time
+from collections import Counter
 from crawler.engine import CrawlerEngine
+from crawler.admission import AdmissionController
+from crawler.job_queue import enqueue_job, next_queued, site_of
+from crawler.extraction import compile_rules
+from crawler.scope import CrawlScope
+from crawler.httpcache import http_cache_settings
+from crawler.scheduling import LinkScorer, scheduling_settings
+from scrapy.utils.project import get_project_settings
 import json
 import logging
 
 class ProcessManager:
     def __init__(self):
         self.engine = CrawlerEngine()
-        self.max_concurrent_jobs = 5  # Limit concurrent jobs
+        project_settings = get_project_settings()
+        # Fixed job limit, used only when admission control is disabled
+        self.max_concurrent_jobs = project_settings.getint('MAX_CONCURRENT_JOBS', 5)
+        self.admission = None
+        if project_settings.getbool('ADMISSION_ENABLED', True):
+            self.admission = AdmissionController.from_settings(project_settings)
+        self.tune_requests = project_settings.getbool('ADMISSION_TUNE_REQUESTS', True)
+        
+        # Serializes capacity checks between API requests and the queue scheduler
+        self.lock = threading.RLock()
+        self.scheduler = None
+        self.wakeup = threading.Event()
         
         # Set up logging
         self.logger = logging.getLogger(__name__)
         
-    def start_job(self, job_id, target_url, max_depth=1, custom_rules=None):
-        """Start a crawl job"""
+    def start_job(self, job_id, target_url, max_depth=1, custom_rules=None, worker=None):
+        """Start a crawl job.
+
+        `worker` is a pool worker reserved with engine.acquire_worker() before
+        taking self.lock; start_job owns it and gives it back if the job does
+        not start. Without one, a worker is reserved here, before the lock.
+        """
         self.logger.info(f"[ProcessManager] Starting job {job_id} for URL: {target_url}")
         
-        # Check if we can start a new job
-        if len(self.engine.processes) >= self.max_concurrent_jobs:
-            raise Exception("Maximum concurrent jobs reached")
-            
+        if worker is None:
+            worker = self.engine.acquire_worker()
+        try:
+            with self.lock:
+                # Check if we can start a new job
+                if not self.has_capacity():
+                    raise Exception("Maximum concurrent jobs reached")
+                
+                parsed_custom_rules, settings = self._prepare_job(max_depth, custom_rules, target_url)
+                if self.admission and self.tune_requests:
+                    settings['CONCURRENT_REQUESTS'] = self.admission.job_concurrency()
+                self.logger.info(f"[ProcessManager] Job {job_id} settings - Max depth: {max_depth}")
+                
+                # Start the crawl with the predefined spider class
+                result = self.engine.start_crawl(job_id, target_url, max_depth, parsed_custom_rules, settings, worker)
+                worker = None
+        finally:
+            self.engine.release_worker(worker)
+        self.logger.info(f"[ProcessManager] Job {job_id} started successfully")
+        return result
+        
+    def _prepare_job(self, max_depth, custom_rules, target_url):
+        """Parse and validate custom rules; returns (parsed_rules, spider settings)"""
         # Create spider settings
         settings = {
             'MAX_DEPTH': max_depth,
@@ -37,12 +81,155 @@ class ProcessManager:
             except:
                 parsed_custom_rules = None
         
-        self.logger.info(f"[ProcessManager] Job {job_id} settings - Max depth: {max_depth}")
+        # Reject broken selectors up front instead of failing inside the spider process
+        if parsed_custom_rules:
+            try:
+                compile_rules(parsed_custom_rules)
+                CrawlScope.from_rules(parsed_custom_rules, target_url)
+                settings.update(http_cache_settings(parsed_custom_rules.get('http_cache')))
+                settings.update(scheduling_settings(parsed_custom_rules.get('scheduling')))
+                LinkScorer.from_rules(parsed_custom_rules)
+            except ValueError as e:
+                raise Exception(f"Invalid custom rules: {e}")
         
-        # Start the crawl with the predefined spider class
-        result = self.engine.start_crawl(job_id, target_url, max_depth, parsed_custom_rules, settings)
-        self.logger.info(f"[ProcessManager] Job {job_id} started successfully")
-        return result
+        if parsed_custom_rules and parsed_custom_rules.get('incremental'):
+            settings['INCREMENTAL_ENABLED'] = True
+        
+        return parsed_custom_rules, settings
+        
+    def _running_pids(self):
+        return [info['process'].pid for info in list(self.engine.processes.values()) if info['process'].is_alive()]
+        
+    def running_count(self):
+        return len(self._running_pids())
+        
+    def job_limit(self):
+        """How many jobs may run at once right now"""
+        if self.admission is None:
+            return self.max_concurrent_jobs
+        pids = self._running_pids()
+        return self.admission.update(len(pids), pids)
+        
+    def has_capacity(self):
+        pids = self._running_pids()
+        if self.admission is None:
+            return len(pids) < self.max_concurrent_jobs
+        return self.admission.admit(len(pids), pids)
+        
+    def submit_job(self, db, job, priority=0):
+        """Start job now if a slot is free and nothing is waiting, otherwise queue it.
+
+        Returns None when the job was started, or its QueuedJob entry. Invalid
+        custom rules are rejected here rather than when the entry comes up.
+        """
+        from models.job import QueuedJob
+        self._prepare_job(job.max_depth, job.custom_rules, job.target_url)
+        with self.lock:
+            self._release_finished(job.id)
+            if job.id in self.engine.processes:
+                raise Exception(f"Job {job.id} is already running")
+            start_now = self.has_capacity() and not QueuedJob.query.first()
+        # A worker may take seconds to warm up; wait for it without holding the lock
+        worker = self.engine.acquire_worker() if start_now else None
+        try:
+            with self.lock:
+                if job.id in self.engine.processes:
+                    raise Exception(f"Job {job.id} is already running")
+                if start_now and self.has_capacity() and not QueuedJob.query.first():
+                    self.start_job(job.id, job.target_url, job.max_depth, job.custom_rules, worker)
+                    worker = None
+                    return None
+                entry = enqueue_job(db, job, priority)
+        finally:
+            self.engine.release_worker(worker)
+        self.logger.info(f"[ProcessManager] Job {job.id} queued (priority {entry.priority})")
+        self.engine.progress.publish(job.id, {'state': 'queued', 'priority': entry.priority, 'time': time.time()})
+        self.wakeup.set()
+        return entry
+        
+    def start_scheduler(self, flask_app, interval=None):
+        """Start the thread that launches queued jobs as slots free up (idempotent)"""
+        with self.lock:
+            if self.scheduler is not None:
+                return
+            if interval is None:
+                interval = get_project_settings().getfloat('JOB_QUEUE_POLL_INTERVAL', 2.0)
+            self.scheduler = threading.Thread(target=self._scheduler_loop, args=(flask_app, interval),
+                                              name='job-queue', daemon=True)
+            self.scheduler.start()
+        self.logger.info(f"[ProcessManager] Job queue scheduler started (poll every {interval}s)")
+        
+    def _scheduler_loop(self, flask_app, interval):
+        from app import db
+        while True:
+            self.wakeup.wait(interval)
+            self.wakeup.clear()
+            with flask_app.app_context():
+                try:
+                    self._reap_finished(db)
+                    self._start_queued(db)
+                except Exception as e:
+                    db.session.rollback()
+                    self.logger.error(f"[ProcessManager] Job queue scheduler error: {e}")
+                finally:
+                    db.session.remove()
+        
+    def _reap_finished(self, db):
+        """Free the slots of finished jobs even when no client is polling them"""
+        from models.job import CrawlJob
+        for job_id in list(self.engine.processes.keys()):
+            if self.engine.get_job_status(job_id) == 'completed':
+                job = db.session.get(CrawlJob, job_id)
+                if job and job.status == 'running':
+                    job.status = 'completed'
+        db.session.commit()
+        
+    def _release_finished(self, job_id):
+        """Forget a previous run of job_id whose process has exited but was never polled"""
+        info = self.engine.processes.get(job_id)
+        if info is None or info['process'].is_alive():
+            return
+        self.engine.get_job_status(job_id)
+        self.engine.processes.pop(job_id, None)
+        
+    def _start_queued(self, db):
+        from models.job import QueuedJob
+        while True:
+            with self.lock:
+                if not self.has_capacity() or not QueuedJob.query.first():
+                    return
+            # Reserve a worker before taking the lock, so API requests are not held up while it warms up
+            try:
+                worker = self.engine.acquire_worker()
+            except Exception as e:
+                self.logger.error(f"[ProcessManager] No crawl worker for queued jobs, retrying later: {e}")
+                return
+            if not self._start_next_queued(db, worker):
+                return
+        
+    def _start_next_queued(self, db, worker):
+        """Start the next eligible queued job on worker (which start_job then owns); False if none can start"""
+        from models.job import CrawlJob
+        with self.lock:
+            running_ids = [job_id for job_id, info in list(self.engine.processes.items())
+                           if info['process'].is_alive()]
+            running_sites = Counter(site_of(job.target_url)
+                                    for job in CrawlJob.query.filter(CrawlJob.id.in_(running_ids)))
+            entry = next_queued(db, running_sites) if self.has_capacity() else None
+            if entry is None:
+                self.engine.release_worker(worker)
+                return False
+            job = entry.job
+            db.session.delete(entry)
+            try:
+                self._release_finished(job.id)
+                self.start_job(job.id, job.target_url, job.max_depth, job.custom_rules, worker)
+                job.status = 'running'
+            except Exception as e:
+                self.logger.error(f"[ProcessManager] Failed to start queued job {job.id}: {e}")
+                job.status = 'failed'
+            db.session.commit()
+        return True
         
     def stop_job(self, job_id):
         """Stop a crawl job"""
@@ -63,10 +250,22 @@ class ProcessManager:
         
     def get_system_stats(self):
         """Get system statistics"""
-        stats = {
-            'cpu_percent': psutil.cpu_percent(),
-            'memory_percent': psutil.virtual_memory().percent,
-            'active_jobs': len(self.engine.processes)
-        }
+        if self.admission is not None:
+            # Share the controller's sample so the page does not reset its CPU window
+            sample = self.admission.measure(self._running_pids())
+            stats = {'cpu_percent': sample['cpu_percent'], 'memory_percent': sample['memory_percent']}
+            stats.update(self.admission.stats())
+        else:
+            stats = {'cpu_percent': psutil.cpu_percent(), 'memory_percent': psutil.virtual_memory().percent,
+                     'job_limit': self.max_concurrent_jobs}
+        stats['active_jobs'] = len(self.engine.processes)
+        stats['queued_jobs'] = self._queued_count()
         self.logger.info(f"[ProcessManager] System stats: {stats}")
-        return stats
\ No newline at end of file
+        return stats
+        
+    def _queued_count(self):
+        try:
+            from models.job import QueuedJob
+            return QueuedJob.query.count()
+        except Exception:
+            return 0
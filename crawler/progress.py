@@ -0,0 +1,145 @@
+import logging
+import queue
+import threading
+import time
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+# Set by the process that runs the crawl: callable(job_id, snapshot) that hands a
+# snapshot to the parent (a multiprocessing queue or the worker pool pipe)
+_sink = None
+
+
+def set_progress_sink(sink):
+    global _sink
+    _sink = sink
+
+
+class ProgressReporter:
+    """Scrapy extension that pushes a stats snapshot to the parent every PROGRESS_INTERVAL seconds.
+
+    The last snapshot is sent from spider_closed with state 'finished' and the
+    close reason, so listeners learn about the end of a crawl without polling.
+    """
+
+    def __init__(self, crawler, interval, sink):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.interval = interval
+        self.sink = sink
+        self.task = None
+        self.started = None
+        self.last_requests = 0
+        self.last_time = None
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('PROGRESS_ENABLED', True) or _sink is None:
+            raise NotConfigured
+        reporter = cls(crawler, crawler.settings.getfloat('PROGRESS_INTERVAL', 2.0), _sink)
+        crawler.signals.connect(reporter.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(reporter.spider_closed, signal=signals.spider_closed)
+        return reporter
+
+    def spider_opened(self, spider):
+        self.started = self.last_time = time.monotonic()
+        self.task = task.LoopingCall(self.report, spider)
+        self.task.start(self.interval, now=True)
+
+    def spider_closed(self, spider, reason):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        self.report(spider, state='finished', reason=reason)
+
+    def report(self, spider, state='running', reason=None):
+        try:
+            self.sink(getattr(spider, 'job_id', None), self.snapshot(spider, state, reason))
+        except Exception as e:
+            # Progress is best effort; never let it break the crawl
+            self.logger.debug(f"[Progress] Failed to send snapshot: {e}")
+
+    def snapshot(self, spider, state, reason=None):
+        stats = self.stats.get_stats()
+        now = time.monotonic()
+        requests = stats.get('downloader/request_count', 0)
+        elapsed = now - self.last_time if self.last_time else 0
+        rate = (requests - self.last_requests) / elapsed if elapsed > 0 else 0.0
+        self.last_requests, self.last_time = requests, now
+        return {
+            'job_id': getattr(spider, 'job_id', None),
+            'run_id': getattr(spider, 'run_id', None),
+            'state': state,
+            'finish_reason': reason,
+            'pages': stats.get('response_received_count', 0),
+            'items': stats.get('item_scraped_count', 0),
+            'bytes': stats.get('downloader/response_bytes', 0),
+            'errors': stats.get('log_count/ERROR', 0) + stats.get('downloader/exception_count', 0),
+            'requests_per_sec': round(rate, 2),
+            'queue': self._queue_depth(),
+            'in_flight': self._in_flight(),
+            'elapsed': round(now - self.started, 1) if self.started else 0,
+            'time': time.time(),
+        }
+
+    def _queue_depth(self):
+        engine = self.crawler.engine
+        # Scrapy >= 2.13 exposes engine.scheduler; older versions keep it on engine.slot
+        scheduler = getattr(engine, 'scheduler', None)
+        if scheduler is None:
+            scheduler = getattr(getattr(engine, 'slot', None), 'scheduler', None)
+        try:
+            return len(scheduler) if scheduler is not None else None
+        except TypeError:
+            return None
+
+    def _in_flight(self):
+        downloader = getattr(self.crawler.engine, 'downloader', None)
+        return len(downloader.active) if downloader is not None else None
+
+
+class ProgressHub:
+    """Latest snapshot per job in the web process, fanned out to SSE subscribers"""
+
+    def __init__(self, keep_finished=50, subscriber_queue_size=1000):
+        self.latest = {}
+        self.subscribers = set()
+        self.keep_finished = keep_finished
+        self.subscriber_queue_size = subscriber_queue_size
+        self.lock = threading.Lock()
+
+    def publish(self, job_id, snapshot):
+        snapshot = dict(snapshot, job_id=job_id)
+        with self.lock:
+            self.latest[job_id] = snapshot
+            self._prune()
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(snapshot)
+            except queue.Full:
+                # A stalled client loses intermediate snapshots, not the stream
+                pass
+
+    def subscribe(self):
+        subscriber = queue.Queue(self.subscriber_queue_size)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def snapshot(self, job_id=None):
+        with self.lock:
+            if job_id is not None:
+                return [self.latest[job_id]] if job_id in self.latest else []
+            return list(self.latest.values())
+
+    def _prune(self):
+        finished = [job_id for job_id, s in self.latest.items() if s.get('state') != 'running']
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.latest[job_id]
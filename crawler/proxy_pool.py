@@ -0,0 +1,120 @@
+import random
+import time
+from urllib.parse import urlsplit
+
+
+class ProxyState:
+    """Health of one proxy: success counts, smoothed latency and quarantine"""
+
+    def __init__(self, url):
+        self.url = url
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = None
+        self.quarantined_until = 0.0
+
+    @property
+    def label(self):
+        """host:port only, so credentials never end up in logs or stats"""
+        parts = urlsplit(self.url)
+        return f'{parts.hostname}:{parts.port}' if parts.port else (parts.hostname or self.url)
+
+    @property
+    def success_rate(self):
+        # Laplace smoothing: an unused proxy starts at 0.5 instead of 0 or 1
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+    def score(self, default_latency):
+        return self.success_rate / max(self.latency if self.latency is not None else default_latency, 0.01)
+
+    def available(self, now):
+        return now >= self.quarantined_until
+
+    def to_dict(self, now=None):
+        now = time.monotonic() if now is None else now
+        return {
+            'proxy': self.label,
+            'successes': self.successes,
+            'failures': self.failures,
+            'success_rate': round(self.success_rate, 3),
+            'latency_ms': int(self.latency * 1000) if self.latency is not None else None,
+            'quarantined_for': round(max(0.0, self.quarantined_until - now), 1),
+        }
+
+
+class ProxyPool:
+    """Health-scored proxy selection with quarantine and sticky per-domain sessions.
+
+    A domain keeps the proxy it was given while that proxy stays healthy, so
+    cookies and sessions are not split across exits. New assignments compare
+    two random available proxies and take the one with the better
+    success-rate/latency score. Every failure in a row doubles a proxy's
+    quarantine (base * 2^(n-1), capped); one success clears the streak.
+    """
+
+    def __init__(self, proxies, quarantine_base=30.0, quarantine_max=1800.0, smoothing=0.3, rng=None):
+        self.proxies = {url: ProxyState(url) for url in dict.fromkeys(proxies)}
+        self.quarantine_base = quarantine_base
+        self.quarantine_max = quarantine_max
+        self.smoothing = smoothing
+        self.sticky = {}
+        self.rng = rng or random.Random()
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def _default_latency(self):
+        latencies = [p.latency for p in self.proxies.values() if p.latency is not None]
+        return sum(latencies) / len(latencies) if latencies else 1.0
+
+    def choose(self, domain=None):
+        """Proxy URL for a request to domain, or None if the pool is empty"""
+        if not self.proxies:
+            return None
+        now = time.monotonic()
+        current = self.sticky.get(domain)
+        if current is not None and self.proxies[current].available(now):
+            return current
+        available = [p for p in self.proxies.values() if p.available(now)]
+        if not available:
+            # Everything is quarantined: use the proxy that comes back first
+            chosen = min(self.proxies.values(), key=lambda p: p.quarantined_until)
+        elif len(available) == 1:
+            chosen = available[0]
+        else:
+            default_latency = self._default_latency()
+            a, b = self.rng.sample(available, 2)
+            chosen = a if a.score(default_latency) >= b.score(default_latency) else b
+        if domain is not None:
+            self.sticky[domain] = chosen.url
+        return chosen.url
+
+    def report_success(self, url, latency=None):
+        state = self.proxies.get(url)
+        if state is None:
+            return None
+        state.successes += 1
+        state.consecutive_failures = 0
+        state.quarantined_until = 0.0
+        if latency is not None:
+            a = self.smoothing
+            state.latency = latency if state.latency is None else a * latency + (1 - a) * state.latency
+        return state
+
+    def report_failure(self, url):
+        state = self.proxies.get(url)
+        if state is None:
+            return None
+        state.failures += 1
+        state.consecutive_failures += 1
+        backoff = min(self.quarantine_max, self.quarantine_base * 2 ** (state.consecutive_failures - 1))
+        state.quarantined_until = time.monotonic() + backoff
+        # Domains pinned to this proxy move to another one on their next request
+        for domain in [d for d, proxy in self.sticky.items() if proxy == url]:
+            del self.sticky[domain]
+        return state
+
+    def stats(self):
+        now = time.monotonic()
+        return [state.to_dict(now) for state in self.proxies.values()]
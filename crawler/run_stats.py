@@ -0,0 +1,179 @@
+import json
+import logging
+import random
+import time
+from datetime import datetime
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from sqlalchemy import text
+from twisted.internet import task, threads
+
+TIMELINE_COLUMNS = ['t', 'requests', 'responses', 'items', 'bytes', 'errors']
+
+
+def merge_run_stats(db, run_id, patch):
+    """Merge patch into CrawlRun.stats_json in one UPDATE.
+
+    json_patch() (SQLite JSON1, built in since 3.38) merges objects key by key
+    inside SQLite, so extensions that record their own sections at spider
+    close cannot overwrite each other. In a JSON merge patch a null value
+    deletes the key, so None values are dropped from the patch first: an
+    unknown value is stored as a missing key and never removes another one.
+    """
+    db.session.execute(
+        text("UPDATE crawl_run SET stats_json = json_patch(COALESCE(stats_json, '{}'), :patch) WHERE id = :run_id"),
+        {'patch': json.dumps(_drop_none(patch), separators=(',', ':'), default=str), 'run_id': run_id},
+    )
+    db.session.commit()
+
+
+def _drop_none(value):
+    """Copy of a patch without None values in its objects (arrays are replaced whole, so kept as is)"""
+    if isinstance(value, dict):
+        return {key: _drop_none(item) for key, item in value.items() if item is not None}
+    return value
+
+
+class RunStatsRecorder:
+    """Scrapy extension that stores a run's stats and throughput timeline on its CrawlRun.
+
+    Every RUN_STATS_INTERVAL seconds the cumulative request/response/item/
+    byte/error counters are sampled into a timeline; past RUN_STATS_MAX_POINTS
+    rows every other row is dropped and the interval doubles, so long runs
+    stay small. At spider close the full Scrapy stats, the timeline and a
+    summary (status codes, rates, download latency percentiles) are merged
+    into stats_json under 'scrapy', 'timeline' and 'summary'.
+    """
+
+    def __init__(self, app, crawler, interval=5.0, max_points=360, latency_samples=1000):
+        self.app = app
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.interval = interval
+        self.max_points = max(2, max_points)
+        self.latency_samples = latency_samples
+        self.rows = []
+        self.latencies = []
+        self.latency_count = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.started = None
+        self.task = None
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('RUN_STATS_ENABLED', True):
+            raise NotConfigured
+        try:
+            from flask import current_app
+            app = current_app._get_current_object()
+        except RuntimeError:
+            raise NotConfigured('RunStatsRecorder needs a Flask app context')
+        recorder = cls(app, crawler, settings.getfloat('RUN_STATS_INTERVAL', 5.0),
+                       settings.getint('RUN_STATS_MAX_POINTS', 360))
+        crawler.signals.connect(recorder.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(recorder.response_received, signal=signals.response_received)
+        crawler.signals.connect(recorder.spider_closed, signal=signals.spider_closed)
+        return recorder
+
+    def spider_opened(self, spider):
+        self.started = time.monotonic()
+        self.task = task.LoopingCall(self.sample)
+        self.task.start(self.interval, now=True)
+
+    def response_received(self, response, request, spider):
+        latency = request.meta.get('download_latency')
+        if latency is None:
+            return
+        self.latency_count += 1
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        # Reservoir sampling keeps the percentiles representative in bounded memory
+        if len(self.latencies) < self.latency_samples:
+            self.latencies.append(latency)
+        else:
+            slot = random.randrange(self.latency_count)
+            if slot < self.latency_samples:
+                self.latencies[slot] = latency
+
+    def sample(self, force=False):
+        elapsed = time.monotonic() - self.started
+        if not force and self.rows and elapsed - self.rows[-1][0] < self.interval * 0.99:
+            return
+        stats = self.stats.get_stats()
+        self.rows.append([
+            round(elapsed, 1),
+            stats.get('downloader/request_count', 0),
+            stats.get('response_received_count', 0),
+            stats.get('item_scraped_count', 0),
+            stats.get('downloader/response_bytes', 0),
+            stats.get('log_count/ERROR', 0) + stats.get('downloader/exception_count', 0),
+        ])
+        if len(self.rows) > self.max_points:
+            # Halve the resolution, always keeping the latest row
+            self.rows = self.rows[-1::-2][::-1]
+            self.interval *= 2
+
+    def spider_closed(self, spider, reason):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        self.sample(force=True)
+        run_id = getattr(spider, 'run_id', None)
+        if run_id is None:
+            return None
+        patch = {
+            'scrapy': _jsonable(self.stats.get_stats()),
+            'summary': self.summary(reason),
+            'timeline': {'interval': self.interval, 'columns': TIMELINE_COLUMNS, 'rows': self.rows},
+        }
+        # Hold the close until the run record is written
+        return threads.deferToThread(self._write, run_id, patch)
+
+    def summary(self, reason):
+        stats = self.stats.get_stats()
+        duration = time.monotonic() - self.started if self.started else 0.0
+        minutes = duration / 60 if duration > 0 else None
+        responses = stats.get('response_received_count', 0)
+        items = stats.get('item_scraped_count', 0)
+        prefix = 'downloader/response_status_count/'
+        summary = {
+            'finish_reason': reason,
+            'duration_secs': round(duration, 1),
+            'requests': stats.get('downloader/request_count', 0),
+            'responses': responses,
+            'items': items,
+            'bytes': stats.get('downloader/response_bytes', 0),
+            'errors': stats.get('log_count/ERROR', 0) + stats.get('downloader/exception_count', 0),
+            'retries': stats.get('retry/count', 0),
+            'status_codes': {key[len(prefix):]: value for key, value in stats.items() if key.startswith(prefix)},
+            'pages_per_min': round(responses / minutes, 1) if minutes else None,
+            'items_per_min': round(items / minutes, 1) if minutes else None,
+        }
+        if self.latency_count:
+            ordered = sorted(self.latencies)
+            summary['latency_ms'] = {
+                'avg': int(1000 * self.latency_sum / self.latency_count),
+                'p50': int(1000 * ordered[len(ordered) // 2]),
+                'p95': int(1000 * ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]),
+                'max': int(1000 * self.latency_max),
+            }
+        return summary
+
+    def _write(self, run_id, patch):
+        from app import db
+        with self.app.app_context():
+            try:
+                merge_run_stats(db, run_id, patch)
+            except Exception as e:
+                db.session.rollback()
+                self.logger.error(f"[RunStats] Failed to store stats on run {run_id}: {e}")
+            finally:
+                db.session.remove()
+
+
+def _jsonable(stats):
+    """Scrapy stats with datetimes as ISO strings"""
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in stats.items()}
@@ -0,0 +1,117 @@
+import re
+from urllib.parse import urlsplit
+
+POLICIES = ('dfs', 'bfs', 'best_first', 'round_robin')
+
+# Scrapy settings behind each policy. dfs is Scrapy's default (LIFO queues).
+POLICY_SETTINGS = {
+    'dfs': {},
+    'bfs': {
+        'DEPTH_PRIORITY': 1,
+        'SCHEDULER_DISK_QUEUE': 'scrapy.squeues.PickleFifoDiskQueue',
+        'SCHEDULER_MEMORY_QUEUE': 'scrapy.squeues.FifoMemoryQueue',
+    },
+    # The spider sets Request.priority from LinkScorer; FIFO keeps ties in discovery order
+    'best_first': {
+        'DEPTH_PRIORITY': 0,
+        'SCHEDULER_DISK_QUEUE': 'scrapy.squeues.PickleFifoDiskQueue',
+        'SCHEDULER_MEMORY_QUEUE': 'scrapy.squeues.FifoMemoryQueue',
+    },
+    # One queue per download slot (domain); the least busy domain is served next
+    'round_robin': {
+        'SCHEDULER_PRIORITY_QUEUE': 'scrapy.pqueues.DownloaderAwarePriorityQueue',
+        'CONCURRENT_REQUESTS_PER_IP': 0,
+    },
+}
+
+
+def scheduling_policy(option):
+    """Policy name of a job's custom_rules 'scheduling' value (a name or {"policy": ...})"""
+    if not option:
+        return 'dfs'
+    policy = option.get('policy', 'best_first') if isinstance(option, dict) else option
+    if policy not in POLICIES:
+        raise ValueError(f"scheduling.policy must be one of {', '.join(POLICIES)}, got {policy!r}")
+    return policy
+
+
+def scheduling_settings(option):
+    return dict(POLICY_SETTINGS[scheduling_policy(option)])
+
+
+class LinkScorer:
+    """Scores discovered links for best-first crawling; higher is fetched sooner.
+
+    Configured through custom_rules['scheduling']:
+        weights        {"regex": weight} matched against the link's path+query
+        keywords       words looked up in the anchor text (case-insensitive)
+        keyword_weight score per matching keyword (default 1)
+        section_bonus  bonus when the link stays in the source page's first
+                       path segment, e.g. /news/a -> /news/b (default 1)
+        depth_penalty  subtracted per level of depth (default 0.5)
+    """
+
+    # Request.priority is an int; keep one decimal of the float score
+    SCALE = 10
+
+    def __init__(self, weights=None, keywords=None, keyword_weight=1.0, section_bonus=1.0, depth_penalty=0.5):
+        self.weights = []
+        for pattern, weight in (weights or {}).items():
+            try:
+                self.weights.append((re.compile(pattern), float(weight)))
+            except re.error as e:
+                raise ValueError(f"scheduling.weights: invalid regex {pattern!r}: {e}") from e
+            except (TypeError, ValueError):
+                raise ValueError(f"scheduling.weights: weight for {pattern!r} must be a number")
+        self.keywords = [k.lower() for k in (keywords or []) if k]
+        try:
+            self.keyword_weight = float(keyword_weight)
+            self.section_bonus = float(section_bonus)
+            self.depth_penalty = float(depth_penalty)
+        except (TypeError, ValueError):
+            raise ValueError("scheduling: keyword_weight, section_bonus and depth_penalty must be numbers")
+
+    @classmethod
+    def from_rules(cls, custom_rules):
+        """A scorer when the job uses best_first scheduling, otherwise None"""
+        option = (custom_rules or {}).get('scheduling')
+        if scheduling_policy(option) != 'best_first':
+            return None
+        option = option if isinstance(option, dict) else {}
+        return cls(
+            weights=option.get('weights'),
+            keywords=option.get('keywords'),
+            keyword_weight=option.get('keyword_weight', 1.0),
+            section_bonus=option.get('section_bonus', 1.0),
+            depth_penalty=option.get('depth_penalty', 0.5),
+        )
+
+    @property
+    def uses_anchor_text(self):
+        return bool(self.keywords)
+
+    def score(self, url, anchor_text='', source_url=None, depth=1):
+        parts = urlsplit(url)
+        target = parts.path + ('?' + parts.query if parts.query else '')
+        score = -self.depth_penalty * depth
+        for pattern, weight in self.weights:
+            if pattern.search(target):
+                score += weight
+        if anchor_text and self.keywords:
+            text = anchor_text.lower()
+            score += self.keyword_weight * sum(1 for keyword in self.keywords if keyword in text)
+        if self.section_bonus and source_url:
+            section = _section(parts.path)
+            if section and section == _section(urlsplit(source_url).path):
+                score += self.section_bonus
+        return score
+
+    def priority(self, *args, **kwargs):
+        return int(round(self.score(*args, **kwargs) * self.SCALE))
+
+
+def _section(path):
+    """First path segment, e.g. 'news' for /news/2024/item.html"""
+    segment = path.lstrip('/').split('/', 1)[0]
+    # A bare file name at the root is not a section
+    return segment if segment and '.' not in segment else ''
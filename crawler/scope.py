@@ -0,0 +1,158 @@
+import os
+import re
+from urllib.parse import urlsplit
+
+import tldextract
+from scrapy.linkextractors import IGNORED_EXTENSIONS
+
+FOLLOW_SCHEMES = frozenset(['http', 'https'])
+DEFAULT_MAX_ITEM_LINKS = 100
+
+_suffix_list = None
+
+
+def registrable_domain(host):
+    """example.com for a.b.example.com per the public suffix list; None for a suffix (gov.ph) or an IP"""
+    global _suffix_list
+    if _suffix_list is None:
+        # The snapshot bundled with tldextract; never fetched over the network
+        _suffix_list = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+    parts = _suffix_list(host)
+    if not parts.domain or not parts.suffix:
+        return None
+    return f'{parts.domain}.{parts.suffix}'
+
+
+def _bare_host(host):
+    """www.example.com and example.com are the same site"""
+    return host[4:] if host.startswith('www.') else host
+
+
+def _compile_patterns(patterns, name):
+    """Combine a list of regexes into one alternation so each URL is matched once"""
+    if not patterns:
+        return None
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    try:
+        return re.compile('|'.join(f'(?:{p})' for p in patterns))
+    except re.error as e:
+        raise ValueError(f"scope.{name}: invalid regex: {e}") from e
+
+
+class CrawlScope:
+    """Decides which discovered links are worth scheduling.
+
+    Configured per job through custom_rules['scope']:
+        allowed_domains   list of hosts to stay on (default: the target's host;
+                          www.example.com and example.com count as the same host)
+        allow_subdomains  also follow subdomains (default false). Listed
+                          allowed_domains cover their subdomains as given
+                          (gov.sg -> moh.gov.sg). Without allowed_domains the
+                          target widens to its registrable domain
+                          (www.news.example.com -> example.com); a target that
+                          is itself a public suffix such as gov.ph is not widened
+        follow_offsite    true to follow links on any domain
+        include_paths     regexes; if given, the path+query must match one of them
+        exclude_paths     regexes; links whose path+query matches any are dropped
+        deny_extensions   file extensions never to fetch (default: Scrapy's
+                          IGNORED_EXTENSIONS - images, media, archives, office docs...)
+        max_item_links    cap on the links list stored with each item (default 100)
+    Only http(s) links are ever followed, so mailto:, tel:, javascript: and
+    data: links are dropped before a Request is built.
+    """
+
+    def __init__(self, allowed_domains=None, allow_subdomains=False, include_paths=None, exclude_paths=None,
+                 deny_extensions=None, max_item_links=DEFAULT_MAX_ITEM_LINKS):
+        self.allowed_domains = None
+        self.subdomain_roots = frozenset()
+        if allowed_domains:
+            hosts, roots = set(), set()
+            for domain in allowed_domains:
+                domain = domain.lower().lstrip('.')
+                hosts.add(_bare_host(domain))
+                if not allow_subdomains:
+                    continue
+                # www.example.com covers *.example.com, but www.gov.ph only covers
+                # *.www.gov.ph: dropping www there would open up the whole suffix
+                for root in (_bare_host(domain), domain):
+                    if registrable_domain(root):
+                        roots.add(root)
+                        break
+                else:
+                    # Listed on purpose, e.g. gov.sg for every ministry site
+                    roots.add(domain)
+            self.allowed_domains = frozenset(hosts)
+            self.subdomain_roots = frozenset(roots)
+        self.include = _compile_patterns(include_paths, 'include_paths')
+        self.exclude = _compile_patterns(exclude_paths, 'exclude_paths')
+        if deny_extensions is None:
+            deny_extensions = IGNORED_EXTENSIONS
+        self.deny_extensions = frozenset(e.lower().lstrip('.') for e in deny_extensions)
+        try:
+            self.max_item_links = int(max_item_links)
+        except (TypeError, ValueError):
+            raise ValueError(f"scope.max_item_links must be an integer, got {max_item_links!r}")
+
+    @classmethod
+    def from_rules(cls, custom_rules, target_url=None):
+        scope = (custom_rules or {}).get('scope') or {}
+        if not isinstance(scope, dict):
+            raise ValueError("scope must be an object")
+        allowed_domains = scope.get('allowed_domains')
+        allow_subdomains = scope.get('allow_subdomains', False)
+        if scope.get('follow_offsite'):
+            allowed_domains = None
+        elif not allowed_domains and target_url:
+            host = (urlsplit(target_url).hostname or '').lower()
+            if host and allow_subdomains:
+                # Never widen a derived scope under a public suffix or an IP
+                widened = registrable_domain(host)
+                if widened:
+                    host = widened
+                else:
+                    allow_subdomains = False
+            allowed_domains = [host] if host else None
+        return cls(
+            allowed_domains=allowed_domains,
+            allow_subdomains=allow_subdomains,
+            include_paths=scope.get('include_paths'),
+            exclude_paths=scope.get('exclude_paths'),
+            deny_extensions=scope.get('deny_extensions'),
+            max_item_links=scope.get('max_item_links', DEFAULT_MAX_ITEM_LINKS),
+        )
+
+    def domain_allowed(self, host):
+        if self.allowed_domains is None:
+            return True
+        host = _bare_host(host)
+        if host in self.allowed_domains:
+            return True
+        if not self.subdomain_roots:
+            return False
+        # Check each parent domain: a.b.example.com -> b.example.com -> example.com
+        dot = host.find('.')
+        while dot != -1:
+            host = host[dot + 1:]
+            if host in self.subdomain_roots:
+                return True
+            dot = host.find('.')
+        return False
+
+    def allows(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in FOLLOW_SCHEMES:
+            return False
+        if not self.domain_allowed((parts.hostname or '').lower()):
+            return False
+        path = parts.path
+        ext = os.path.splitext(path)[1]
+        if ext and ext[1:].lower() in self.deny_extensions:
+            return False
+        if self.include is not None or self.exclude is not None:
+            target = path + ('?' + parts.query if parts.query else '')
+            if self.include is not None and not self.include.search(target):
+                return False
+            if self.exclude is not None and self.exclude.search(target):
+                return False
+        return True
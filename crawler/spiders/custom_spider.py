@@ -1,7 +1,12 @@
 import scrapy
 from scrapy.http import Request
+from scrapy.exceptions import IgnoreRequest
 import json
 import logging
+from urllib.parse import urldefrag
+from crawler.extraction import compile_rules, extract_text, join_limited, iter_text_nodes, LINK_ANCHORS
+from crawler.scope import CrawlScope
+from crawler.scheduling import LinkScorer
 
 class CustomSpider(scrapy.Spider):
     """Custom spider class that can be pickled and supports custom rules"""
@@ -14,6 +19,10 @@ class CustomSpider(scrapy.Spider):
             self.start_urls = [target_url]
         self.max_depth = int(max_depth)
         self.custom_rules = custom_rules or {}
+        # Compile selectors once; a malformed rule raises here, before any request is made
+        self.rules = compile_rules(self.custom_rules)
+        self.scope = CrawlScope.from_rules(self.custom_rules, target_url)
+        self.scorer = LinkScorer.from_rules(self.custom_rules)
         self.log(f"[Job {self.job_id}] Initializing CustomSpider (run_id={self.run_id})", level=logging.INFO)
     
     async def start(self):
@@ -30,21 +39,43 @@ class CustomSpider(scrapy.Spider):
     def parse(self, response):
         self.log(f"[Job {self.job_id}] Received response from: {response.url} (status: {response.status})", level=logging.INFO)
         item = self.extract_data(response)
+        links = self.page_links(response)
+        if 'links' in item:
+            item['links'] = list(links)[:self.scope.max_item_links]
         item['url'] = response.url
         item['job_id'] = self.job_id
         item['run_id'] = self.run_id
         yield item
         current_depth = response.meta.get('depth', 1)
         if current_depth < self.max_depth:
-            links = response.css('a::attr(href)').getall()
-            for link in links:
-                absolute_url = response.urljoin(link)
-                if not absolute_url or absolute_url.startswith('javascript:'):
+            for absolute_url, anchor in links.items():
+                # Out-of-scope links are dropped here, before a Request is built
+                if not self.scope.allows(absolute_url):
                     continue
-                yield Request(absolute_url, callback=self.parse, errback=self.handle_error, meta={'depth': current_depth + 1})
+                priority = 0
+                if self.scorer:
+                    anchor_text = join_limited(iter_text_nodes(anchor), 200) if self.scorer.uses_anchor_text else ''
+                    priority = self.scorer.priority(absolute_url, anchor_text, response.url, current_depth + 1)
+                yield Request(absolute_url, callback=self.parse, errback=self.handle_error, priority=priority, meta={'depth': current_depth + 1})
+
+    def page_links(self, response):
+        """Absolute http(s) link targets of the page mapped to their first anchor element,
+        without fragments, deduped in document order"""
+        links = {}
+        for anchor in LINK_ANCHORS(response.selector.root):
+            href = anchor.get('href').strip()
+            if not href or href.startswith('#'):
+                continue
+            absolute_url = urldefrag(response.urljoin(href))[0]
+            if absolute_url.startswith(('http://', 'https://')) and absolute_url not in links:
+                links[absolute_url] = anchor
+        return links
     
     def handle_error(self, failure):
         request = failure.request
+        if failure.check(IgnoreRequest):
+            # Deliberately skipped (e.g. unchanged page in incremental mode), not an error
+            return
         response = getattr(failure.value, 'response', None)
         status = response.status if response else None
         self.log(f"[Job {self.job_id}] Request failed {request.url} status={status}", level=logging.INFO)
@@ -64,27 +95,13 @@ class CustomSpider(scrapy.Spider):
     
     def extract_data(self, response):
         self.log(f"[Job {self.job_id}] Starting data extraction from: {response.url}", level=logging.INFO)
-        if self.custom_rules:
+        if self.rules:
             return self.extract_with_rules(response)
         else:
             title = response.css('title::text').get()
-            content = ' '.join(response.css('body ::text').getall()).strip()[:500]
-            links = response.css('a::attr(href)').getall()
-            return { 'title': title, 'content': content, 'links': links }
+            content = extract_text(response.selector.root)
+            # parse() fills in the deduped, capped links
+            return { 'title': title, 'content': content, 'links': [] }
     
     def extract_with_rules(self, response):
-        extracted_data = {}
-        if 'title_selector' in self.custom_rules:
-            extracted_data['title'] = response.css(self.custom_rules['title_selector']).get()
-        else:
-            extracted_data['title'] = response.css('title::text').get()
-        if 'content_selector' in self.custom_rules:
-            texts = response.css(self.custom_rules['content_selector']).getall()
-            extracted_data['content'] = ' '.join(texts).strip()[:1000]
-        else:
-            extracted_data['content'] = ' '.join(response.css('body ::text').getall()).strip()[:500]
-        if 'custom_fields' in self.custom_rules:
-            for field_name, selector in self.custom_rules['custom_fields'].items():
-                values = response.css(selector).getall()
-                extracted_data[field_name] = values[0] if len(values) == 1 else values
-        return extracted_data
\ No newline at end of file
+        return self.rules.extract(response)
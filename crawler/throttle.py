@@ -0,0 +1,172 @@
+import logging
+import time
+from email.utils import parsedate_to_datetime
+
+from scrapy.exceptions import NotConfigured
+
+# Responses that mean "slow down" rather than "this page is broken"
+BACKOFF_CODES = frozenset([429, 503])
+
+
+class DomainState:
+    """Smoothed health of one download slot (normally one domain)"""
+
+    def __init__(self, concurrency, delay):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.latency = None       # EWMA of download latency, seconds
+        self.baseline = None      # lowest smoothed latency seen, seconds
+        self.error_rate = 0.0     # EWMA of 5xx/timeouts/backoff responses
+        self.responses = 0
+        self.since_change = 0     # responses since the last adjustment
+        self.hold_until = 0.0     # no increases before this time (after a 429/503)
+
+
+class AdaptiveThrottleMiddleware:
+    """Per-domain AIMD controller for download concurrency and delay.
+
+    Every response updates an EWMA of latency and error rate for its download
+    slot. A 429/503 (honouring Retry-After), a spike in errors or latency far
+    above the domain's baseline halves the slot's concurrency and doubles its
+    delay; a healthy window raises concurrency by one and shortens the delay.
+    The slot object in Scrapy's downloader is changed in place, so new limits
+    apply to the next request. Current values are kept in adaptive/<domain>/*
+    stats.
+    """
+
+    def __init__(self, crawler, min_concurrency=1, max_concurrency=16, min_delay=0.0, max_delay=60.0,
+                 smoothing=0.3, error_threshold=0.2, latency_factor=3.0, stats=None):
+        self.crawler = crawler
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.smoothing = smoothing
+        self.error_threshold = error_threshold
+        self.latency_factor = latency_factor
+        self.stats = stats
+        self.domains = {}
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_THROTTLE_ENABLED', True):
+            raise NotConfigured
+        return cls(
+            crawler,
+            min_concurrency=settings.getint('ADAPTIVE_MIN_CONCURRENCY', 1),
+            max_concurrency=settings.getint('ADAPTIVE_MAX_CONCURRENCY', 16),
+            min_delay=settings.getfloat('ADAPTIVE_MIN_DELAY', 0.0),
+            max_delay=settings.getfloat('ADAPTIVE_MAX_DELAY', 60.0),
+            smoothing=settings.getfloat('ADAPTIVE_SMOOTHING', 0.3),
+            error_threshold=settings.getfloat('ADAPTIVE_ERROR_THRESHOLD', 0.2),
+            latency_factor=settings.getfloat('ADAPTIVE_LATENCY_FACTOR', 3.0),
+            stats=crawler.stats,
+        )
+
+    def _slot(self, request):
+        key = request.meta.get('download_slot')
+        engine = getattr(self.crawler, 'engine', None)
+        if key is None or engine is None:
+            return None, None
+        return key, engine.downloader.slots.get(key)
+
+    def _state(self, key, slot):
+        state = self.domains.get(key)
+        if state is None:
+            state = self.domains[key] = DomainState(slot.concurrency, slot.delay)
+        return state
+
+    def process_response(self, request, response, spider):
+        key, slot = self._slot(request)
+        if slot is None:
+            return response
+        state = self._state(key, slot)
+        latency = request.meta.get('download_latency')
+        failed = response.status >= 500 or response.status in BACKOFF_CODES
+        self._observe(state, latency, failed)
+
+        if response.status in BACKOFF_CODES:
+            retry_after = _retry_after(response.headers.get('Retry-After'))
+            self._decrease(state, min_delay=retry_after)
+            if retry_after:
+                state.hold_until = time.monotonic() + retry_after
+            self._inc_stat(key, 'backoffs')
+        elif failed and state.error_rate > self.error_threshold and state.since_change >= state.concurrency:
+            self._decrease(state)
+        elif (state.latency and state.baseline and state.since_change >= state.concurrency
+              and state.latency > self.latency_factor * state.baseline and state.latency > 1.0):
+            self._decrease(state, halve=False)
+        elif (state.error_rate <= self.error_threshold and state.since_change >= state.concurrency
+              and time.monotonic() >= state.hold_until):
+            # A full window of healthy responses at the current level
+            self._increase(state)
+        self._apply(key, slot, state)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        key, slot = self._slot(request)
+        if slot is None:
+            return None
+        state = self._state(key, slot)
+        self._observe(state, None, True)
+        if state.error_rate > self.error_threshold and state.since_change >= state.concurrency:
+            self._decrease(state)
+            self._apply(key, slot, state)
+        return None
+
+    def _observe(self, state, latency, failed):
+        a = self.smoothing
+        state.responses += 1
+        state.since_change += 1
+        state.error_rate = a * (1.0 if failed else 0.0) + (1 - a) * state.error_rate
+        if latency is not None and not failed:
+            state.latency = latency if state.latency is None else a * latency + (1 - a) * state.latency
+            if state.baseline is None or state.latency < state.baseline:
+                state.baseline = state.latency
+
+    def _decrease(self, state, min_delay=None, halve=True):
+        state.concurrency = max(self.min_concurrency, state.concurrency // 2 if halve else state.concurrency - 1)
+        delay = max(state.delay * 2, 0.25)
+        if min_delay:
+            delay = max(delay, min_delay)
+        state.delay = min(self.max_delay, delay)
+        state.since_change = 0
+
+    def _increase(self, state):
+        state.concurrency = min(self.max_concurrency, state.concurrency + 1)
+        delay = state.delay * 0.5
+        state.delay = max(self.min_delay, delay if delay >= 0.05 else 0.0)
+        state.since_change = 0
+
+    def _apply(self, key, slot, state):
+        if slot.concurrency != state.concurrency or slot.delay != state.delay:
+            self.logger.debug(f"[Throttle] {key}: concurrency {slot.concurrency}->{state.concurrency}, "
+                              f"delay {slot.delay:.2f}->{state.delay:.2f}s")
+            slot.concurrency = state.concurrency
+            slot.delay = state.delay
+        if self.stats is not None:
+            prefix = f'adaptive/{key}'
+            self.stats.set_value(f'{prefix}/concurrency', state.concurrency)
+            self.stats.set_value(f'{prefix}/delay', round(state.delay, 3))
+            self.stats.set_value(f'{prefix}/error_rate', round(state.error_rate, 3))
+            if state.latency is not None:
+                self.stats.set_value(f'{prefix}/latency_ms', int(state.latency * 1000))
+
+    def _inc_stat(self, key, name):
+        if self.stats is not None:
+            self.stats.inc_value(f'adaptive/{key}/{name}')
+
+
+def _retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    value = value.decode('latin-1').strip() if isinstance(value, bytes) else str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
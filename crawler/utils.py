@@ -1,6 +1,8 @@
 import random
 import time
 
+from scrapy.utils.misc import load_object
+
 def get_random_proxy(proxy_list):
     """Get a random proxy from the proxy list"""
     if proxy_list:
@@ -15,4 +17,13 @@ def rotate_user_agent(user_agent_list):
 
 def random_delay(min_delay=1, max_delay=5):
     """Generate a random delay"""
-    return random.uniform(min_delay, max_delay)
\ No newline at end of file
+    return random.uniform(min_delay, max_delay)
+
+def retry_exceptions(settings):
+    """Download exception classes Scrapy treats as transient network errors (RETRY_EXCEPTIONS)"""
+    names = settings.getlist('RETRY_EXCEPTIONS')
+    if not names:
+        # Scrapy < 2.10 keeps the list on the middleware class
+        from scrapy.downloadermiddlewares.retry import RetryMiddleware
+        return tuple(RetryMiddleware.EXCEPTIONS_TO_RETRY)
+    return tuple(load_object(name) if isinstance(name, str) else name for name in names)
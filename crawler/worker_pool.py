@@ -0,0 +1,472 @@
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+
+STARTING, IDLE, BUSY, GONE = 'starting', 'idle', 'busy', 'gone'
+
+
+class WorkerPoolUnavailable(RuntimeError):
+    """The pool gave up after workers kept dying during start-up"""
+
+
+class JobHandle:
+    """Stands in for the multiprocessing.Process of a job running on a pooled worker.
+
+    Offers what CrawlerEngine uses of a process (is_alive/terminate/join/pid)
+    plus the result_queue the worker's ('success'|'error', msg) tuple lands in.
+    """
+
+    def __init__(self, job_id, worker):
+        self.job_id = job_id
+        self.worker = worker
+        self.result_queue = queue.Queue()
+        self.finished = threading.Event()
+
+    @property
+    def pid(self):
+        return self.worker.process.pid
+
+    def is_alive(self):
+        return not self.finished.is_set()
+
+    def terminate(self):
+        # SIGTERM makes the worker close the spider gracefully and exit; the pool replaces it
+        self.worker.stopping = True
+        if self.worker.process.is_alive():
+            self.worker.process.terminate()
+
+    def kill(self):
+        # Last resort for a worker that ignores SIGTERM; the pool reports the job as stopped
+        self.worker.stopping = True
+        if self.worker.process.is_alive():
+            self.worker.process.kill()
+
+    def join(self, timeout=None):
+        # One deadline for both waits, so join(timeout) returns within timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.finished.wait(timeout)
+        self.worker.process.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+
+class _PooledWorker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.state = STARTING
+        self.handle = None
+        self.stopping = False
+        self.started_at = time.time()
+
+
+class WorkerPool:
+    """Pre-forked crawl workers with Flask, the database and Scrapy already loaded.
+
+    Each worker runs one Twisted reactor for its whole life and executes jobs
+    one after another with CrawlerRunner, so starting a job is a message over
+    a pipe instead of a fork, create_app() and reactor start. `size` idle
+    workers are kept warm; a worker retires after max_jobs jobs or once its
+    RSS exceeds max_rss_mb, and is replaced in the background. A worker that
+    dies before it is ready is replaced after a doubling delay; after
+    max_start_failures such deaths in a row the pool marks itself broken
+    and acquire() raises WorkerPoolUnavailable.
+    """
+
+    def __init__(self, size=2, max_jobs=20, max_rss_mb=1024, start_timeout=60.0, on_progress=None,
+                 max_start_failures=5, respawn_delay=1.0, respawn_delay_max=60.0):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.start_timeout = start_timeout
+        self.on_progress = on_progress
+        self.max_start_failures = max_start_failures
+        self.respawn_delay = respawn_delay
+        self.respawn_delay_max = respawn_delay_max
+        self.start_failures = 0
+        self.respawn_at = 0.0
+        self.broken = False
+        self.workers = []
+        self.lock = threading.Condition()
+        self.running = False
+        self.dispatcher = None
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+            for _ in range(self.size):
+                self._spawn()
+        self.dispatcher = threading.Thread(target=self._dispatch_loop, name='worker-pool', daemon=True)
+        self.dispatcher.start()
+        self.logger.info(f"[WorkerPool] Started with {self.size} warm workers "
+                         f"(max_jobs={self.max_jobs}, max_rss_mb={self.max_rss_mb})")
+
+    def _spawn(self):
+        parent_conn, child_conn = Pipe()
+        process = Process(target=_worker_main, args=(child_conn, self.max_jobs, self.max_rss_mb),
+                          name='crawl-worker', daemon=True)
+        process.start()
+        child_conn.close()
+        worker = _PooledWorker(process, parent_conn)
+        self.workers.append(worker)
+        self.logger.info(f"[WorkerPool] Spawned worker {process.pid}")
+        return worker
+
+    def acquire(self):
+        """Reserve an idle worker, waiting for one that is still warming up.
+
+        The worker stays reserved until it is passed to submit() or release().
+        """
+        deadline = time.time() + self.start_timeout
+        with self.lock:
+            while True:
+                if self.broken:
+                    raise WorkerPoolUnavailable('Crawl workers keep dying during start-up')
+                worker = next((w for w in self.workers if w.state == IDLE), None)
+                if worker is not None:
+                    break
+                if not any(w.state == STARTING for w in self.workers) and time.time() >= self.respawn_at:
+                    self._spawn()
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise RuntimeError('No crawl worker became ready in time')
+                self.lock.wait(remaining)
+            worker.state = BUSY
+            self._replenish()
+        return worker
+
+    def release(self, worker):
+        """Return a reserved worker that was not given a job"""
+        with self.lock:
+            if worker.state == BUSY and worker.handle is None:
+                worker.state = IDLE
+                self._trim()
+                self.lock.notify_all()
+
+    def submit(self, job_id, run_id, target_url, max_depth, custom_rules, settings, worker=None):
+        """Hand a job to a worker reserved with acquire(), or to the next idle one"""
+        if worker is None:
+            worker = self.acquire()
+        with self.lock:
+            if worker.state != BUSY or worker.handle is not None:
+                raise RuntimeError(f'Worker {worker.process.pid} is no longer reserved')
+            handle = JobHandle(job_id, worker)
+            worker.handle = handle
+            worker.conn.send(('job', {
+                'job_id': job_id, 'run_id': run_id, 'target_url': target_url,
+                'max_depth': max_depth, 'custom_rules': custom_rules, 'settings': settings,
+            }))
+        self.logger.info(f"[WorkerPool] Job {job_id} dispatched to worker {worker.process.pid}")
+        return handle
+
+    def _replenish(self):
+        if self.broken or time.time() < self.respawn_at:
+            # A delayed respawn after start-up failures is already scheduled
+            return
+        warm = sum(1 for w in self.workers if w.state in (STARTING, IDLE))
+        for _ in range(self.size - warm):
+            self._spawn()
+
+    def _dispatch_loop(self):
+        while self.running:
+            with self.lock:
+                conns = {w.conn: w for w in self.workers if w.state != GONE}
+            if not conns:
+                time.sleep(0.2)
+                continue
+            for conn in wait(list(conns), timeout=1.0):
+                worker = conns[conn]
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    self._worker_exited(worker)
+                    continue
+                self._handle_message(worker, message)
+
+    def _handle_message(self, worker, message):
+        kind = message[0]
+        with self.lock:
+            if kind == 'ready':
+                worker.state = IDLE
+                self.start_failures = 0
+                self.logger.info(f"[WorkerPool] Worker {worker.process.pid} ready "
+                                 f"in {time.time() - worker.started_at:.2f}s")
+            elif kind == 'progress':
+                _, job_id, snapshot = message
+                self._progress(job_id, snapshot)
+            elif kind == 'result':
+                _, job_id, result = message
+                handle, worker.handle = worker.handle, None
+                if handle is not None:
+                    handle.result_queue.put(result)
+                    handle.finished.set()
+                if result[0] == 'error':
+                    self._progress(job_id, {'state': 'failed', 'error': result[1], 'time': time.time()})
+            elif kind == 'idle':
+                worker.state = IDLE
+                self._trim()
+            elif kind == 'retiring':
+                self.logger.info(f"[WorkerPool] Worker {worker.process.pid} retiring ({message[1]})")
+                worker.state = GONE
+                self.workers.remove(worker)
+                if self.running:
+                    self._replenish()
+            self.lock.notify_all()
+
+    def _progress(self, job_id, snapshot):
+        if self.on_progress is not None:
+            self.on_progress(job_id, snapshot)
+
+    def _trim(self):
+        """Shut down idle workers beyond the warm pool size"""
+        idle = [w for w in self.workers if w.state == IDLE]
+        for worker in idle[self.size:]:
+            worker.state = GONE
+            self.workers.remove(worker)
+            try:
+                worker.conn.send(('shutdown',))
+            except OSError:
+                pass
+
+    def _worker_exited(self, worker):
+        with self.lock:
+            worker.process.join(1)
+            starting = worker.state == STARTING
+            handle = worker.handle
+            if handle is not None:
+                if not worker.stopping:
+                    self.logger.error(f"[WorkerPool] Worker {worker.process.pid} died running job {handle.job_id} "
+                                      f"(exit code {worker.process.exitcode})")
+                    error = f'Worker exited unexpectedly (exit code {worker.process.exitcode})'
+                    handle.result_queue.put(('error', error))
+                    self._progress(handle.job_id, {'state': 'failed', 'error': error, 'time': time.time()})
+                handle.finished.set()
+                worker.handle = None
+            worker.state = GONE
+            if worker in self.workers:
+                self.workers.remove(worker)
+            if starting:
+                self._start_failed(worker)
+            elif self.running:
+                self._replenish()
+            self.lock.notify_all()
+
+    def _start_failed(self, worker):
+        """Back off before replacing a worker that died while warming up, and give up eventually"""
+        if self.broken:
+            return
+        self.start_failures += 1
+        exitcode = worker.process.exitcode
+        if self.start_failures >= self.max_start_failures:
+            self.broken = True
+            self.logger.error(f"[WorkerPool] {self.start_failures} workers in a row died while starting "
+                              f"(last exit code {exitcode}); disabling the pool")
+            return
+        delay = min(self.respawn_delay_max, self.respawn_delay * 2 ** (self.start_failures - 1))
+        self.respawn_at = time.time() + delay
+        self.logger.warning(f"[WorkerPool] Worker {worker.process.pid} died while starting (exit code {exitcode}); "
+                            f"starting a replacement in {delay:g}s")
+        timer = threading.Timer(delay, self._respawn)
+        timer.daemon = True
+        timer.start()
+
+    def _respawn(self):
+        with self.lock:
+            self.respawn_at = 0.0
+            if self.running:
+                self._replenish()
+            self.lock.notify_all()
+
+    def stats(self):
+        with self.lock:
+            counts = {}
+            for worker in self.workers:
+                counts[worker.state] = counts.get(worker.state, 0) + 1
+            return counts
+
+    def shutdown(self, timeout=10.0):
+        """Ask every worker to finish its job and exit; terminate, then kill, the ones still running"""
+        with self.lock:
+            if not self.running:
+                return
+            self.running = False
+            workers = list(self.workers)
+        for worker in workers:
+            try:
+                worker.conn.send(('shutdown',))
+            except OSError:
+                pass
+        deadline = time.monotonic() + timeout
+        for worker in workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+        for worker in workers:
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join(2)
+            if worker.process.is_alive():
+                self.logger.warning(f"[WorkerPool] Killing worker {worker.process.pid}")
+                worker.process.kill()
+        self.logger.info(f"[WorkerPool] Shut down {len(workers)} workers")
+
+
+def _worker_main(conn, max_jobs, max_rss_mb):
+    """Entry point of a pooled worker process: warm up, then serve jobs until retired"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(asctime)s] %(levelname)s: %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    from scrapy.utils.project import get_project_settings
+    from scrapy.utils.reactor import install_reactor
+    settings = get_project_settings()
+    install_reactor(settings['TWISTED_REACTOR'])
+
+    from twisted.internet import reactor
+    from scrapy.crawler import CrawlerRunner
+
+    from app import create_app
+    flask_app = create_app()
+    flask_app.app_context().push()
+
+    # Import everything a crawl loads so the first job pays nothing for it
+    from crawler.spiders.custom_spider import CustomSpider
+    import crawler.pipelines, crawler.middlewares, crawler.frontier  # noqa: F401,E401
+
+    worker = _Worker(conn, reactor, flask_app, CrawlerRunner, CustomSpider, get_project_settings,
+                     max_jobs, max_rss_mb)
+    from crawler.progress import set_progress_sink
+    set_progress_sink(lambda job_id, snapshot: worker._send(('progress', job_id, snapshot)))
+    signal.signal(signal.SIGTERM, lambda signum, frame: reactor.callFromThread(worker.shutdown, 'terminated'))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    threading.Thread(target=worker.listen, name='worker-listen', daemon=True).start()
+    conn.send(('ready', os.getpid()))
+    reactor.run(installSignalHandlers=False)
+
+
+class _Worker:
+    """Job loop inside a pooled worker; everything but listen() runs in the reactor thread"""
+
+    def __init__(self, conn, reactor, flask_app, runner_cls, spider_cls, get_settings, max_jobs, max_rss_mb):
+        self.conn = conn
+        self.reactor = reactor
+        self.flask_app = flask_app
+        self.runner_cls = runner_cls
+        self.spider_cls = spider_cls
+        self.get_settings = get_settings
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.jobs_done = 0
+        self.runner = None
+        self.closing = False
+        self.logger = logging.getLogger(__name__)
+
+    def listen(self):
+        # Jobs are scheduled from this thread and run in a copy of its context, so
+        # the pipelines and middlewares find current_app through this push
+        self.flask_app.app_context().push()
+        parent = os.getppid()
+        while True:
+            try:
+                # Siblings forked later hold copies of the parent's pipe end, so EOF alone
+                # does not reveal a parent killed without shutdown(); watch the ppid too
+                while not self.conn.poll(1.0):
+                    if os.getppid() != parent:
+                        raise EOFError
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                self.reactor.callFromThread(self.shutdown, 'parent gone')
+                return
+            if message[0] == 'job':
+                self.reactor.callFromThread(self.run_job, message[1])
+            elif message[0] == 'shutdown':
+                self.reactor.callFromThread(self.shutdown, 'pool shutdown')
+                return
+
+    def run_job(self, job):
+        job_id, run_id = job['job_id'], job['run_id']
+        self.logger.info(f"[Worker {os.getpid()}] Starting job {job_id} (run {run_id})")
+        scrapy_settings = self.get_settings()
+        for key, value in (job['settings'] or {}).items():
+            scrapy_settings.set(key, value)
+        scrapy_settings.set('LOG_LEVEL', 'INFO')
+        self.runner = self.runner_cls(scrapy_settings)
+        try:
+            d = self.runner.crawl(self.spider_cls, job_id=job_id, run_id=run_id, target_url=job['target_url'],
+                                  max_depth=job['max_depth'], custom_rules=job['custom_rules'],
+                                  name=f'spider_{job_id}')
+        except Exception as e:
+            self._job_done(job_id, run_id, e)
+            return
+        d.addCallbacks(lambda _: self._job_done(job_id, run_id, None),
+                       lambda failure: self._job_done(job_id, run_id, failure.value))
+
+    def _job_done(self, job_id, run_id, error):
+        self.runner = None
+        self.jobs_done += 1
+        status = 'failed' if error else ('stopped' if self.closing else 'completed')
+        _finish_run(self.flask_app, run_id, status, self.logger)
+        result = ('error', str(error)) if error else ('success', f'Job {job_id} completed successfully')
+        self.logger.info(f"[Worker {os.getpid()}] Job {job_id} finished: {status}")
+        self._send(('result', job_id, result))
+        if self.closing:
+            self.reactor.stop()
+            return
+        reason = self._retire_reason()
+        if reason:
+            self._send(('retiring', reason))
+            self.closing = True
+            self.reactor.stop()
+        else:
+            self._send(('idle',))
+
+    def _retire_reason(self):
+        if self.max_jobs and self.jobs_done >= self.max_jobs:
+            return f'{self.jobs_done} jobs done'
+        if self.max_rss_mb:
+            import psutil
+            rss_mb = psutil.Process().memory_info().rss / 1024 / 1024
+            if rss_mb > self.max_rss_mb:
+                return f'RSS {rss_mb:.0f} MB over {self.max_rss_mb} MB'
+        return None
+
+    def shutdown(self, reason):
+        if self.closing:
+            return
+        self.closing = True
+        self.logger.info(f"[Worker {os.getpid()}] Shutting down ({reason})")
+        if self.runner is not None:
+            # Close the running spider gracefully; _job_done stops the reactor
+            self.runner.stop()
+        else:
+            self.reactor.stop()
+
+    def _send(self, message):
+        try:
+            self.conn.send(message)
+        except OSError:
+            pass
+
+
+def _finish_run(flask_app, run_id, status, logger):
+    if not run_id:
+        return
+    from datetime import datetime
+    from app import db
+    from models.job import CrawlRun
+    # Reactor callbacks do not see a context pushed in another thread, so open one per update
+    with flask_app.app_context():
+        try:
+            run = db.session.get(CrawlRun, run_id)
+            if run:
+                run.status = status
+                run.ended_at = datetime.utcnow()
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"[Worker] Failed to update run {run_id} status: {e}")
@@ -8,7 +8,7 @@ class CrawlJob(db.Model):
     target_url = db.Column(db.String(500), nullable=False)
     max_depth = db.Column(db.Integer, default=1)
     custom_rules = db.Column(db.Text)  # Store custom rules as JSON string
-    status = db.Column(db.String(20), default='saved')  # saved, running, completed, failed, stopped
+    status = db.Column(db.String(20), default='saved')  # saved, queued, running, completed, failed, stopped
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -44,7 +44,11 @@ class CrawlRun(db.Model):
 
     job = db.relationship('CrawlJob', backref=db.backref('runs', lazy=True))
 
-    def to_dict(self):
+    __table_args__ = (
+        db.Index('ix_crawl_run_job_started', 'job_id', 'started_at'),
+    )
+
+    def to_dict(self, include_timeline=False):
         data = {
             'id': self.id,
             'job_id': self.job_id,
@@ -56,6 +60,9 @@ class CrawlRun(db.Model):
         if self.stats_json:
             try:
                 data['stats'] = json.loads(self.stats_json)
+                # The timeline is the bulky part; only send it when asked for
+                if not include_timeline:
+                    data['stats'].pop('timeline', None)
             except:
                 data['stats'] = self.stats_json
         return data
@@ -72,6 +79,14 @@ class CrawlResult(db.Model):
     
     # Relationship
     job = db.relationship('CrawlJob', backref=db.backref('results', lazy=True))
+
+    # Every results/export/delete query filters on run or job and sorts by scraped_at
+    __table_args__ = (
+        db.Index('ix_crawl_result_run_scraped', 'run_id', 'scraped_at'),
+        db.Index('ix_crawl_result_job_scraped', 'job_id', 'scraped_at'),
+        db.Index('ix_crawl_result_scraped', 'scraped_at', 'id'),
+        db.Index('ix_crawl_result_url', 'url'),
+    )
     
     def __repr__(self):
         return f'<CrawlResult {self.url}>'
@@ -91,4 +106,48 @@ class CrawlResult(db.Model):
                 result['scraped_data'] = json.loads(self.scraped_data)
             except:
                 result['scraped_data'] = self.scraped_data
-        return result
\ No newline at end of file
+        return result
+
+class UrlValidator(db.Model):
+    """Cache validators of the last stored version of a URL, used by incremental recrawls"""
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('crawl_job.id'), nullable=False)
+    url = db.Column(db.String(500), nullable=False)
+    etag = db.Column(db.String(200))
+    last_modified = db.Column(db.String(100))
+    content_hash = db.Column(db.String(40))  # sha1 of the response body
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('job_id', 'url', name='uq_url_validator_job_url'),
+    )
+
+    def __repr__(self):
+        return f'<UrlValidator {self.url}>'
+
+class QueuedJob(db.Model):
+    """A start request waiting for a free crawl slot; the row is removed when the job starts"""
+    id = db.Column(db.Integer, primary_key=True)  # increasing id = FIFO order within a priority
+    job_id = db.Column(db.Integer, db.ForeignKey('crawl_job.id'), nullable=False)
+    priority = db.Column(db.Integer, nullable=False, default=0)  # higher starts first
+    site = db.Column(db.String(255), nullable=False, default='')  # target host, for per-site fairness
+    enqueued_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    job = db.relationship('CrawlJob', backref=db.backref('queue_entries', lazy=True, cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.UniqueConstraint('job_id', name='uq_queued_job_job'),
+        db.Index('ix_queued_job_priority', 'priority', 'site', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<QueuedJob {self.job_id}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_id': self.job_id,
+            'priority': self.priority,
+            'site': self.site,
+            'enqueued_at': self.enqueued_at.isoformat() if self.enqueued_at else None,
+        }
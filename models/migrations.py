@@ -0,0 +1,112 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+# Versioned schema migrations. Each migration runs once per database and is
+# recorded in schema_migrations; every step is written to be idempotent so a
+# second process racing through startup does no harm. Append new migrations
+# at the end with the next version number — never renumber or edit old ones.
+# A migration that does not apply to this database returns a short reason; it
+# is recorded as skipped so the migrations after it still run.
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def _column_names(db, table):
+    return [row[1] for row in db.session.execute(text(f"PRAGMA table_info({table})"))]
+
+
+@migration(1, 'create base tables')
+def _create_tables(db):
+    from models import job  # noqa: F401  ensure models are registered
+    db.create_all()
+
+
+@migration(2, 'add crawl_result.run_id')
+def _add_result_run_id(db):
+    if 'run_id' not in _column_names(db, 'crawl_result'):
+        db.session.execute(text("ALTER TABLE crawl_result ADD COLUMN run_id INTEGER"))
+
+
+@migration(3, 'index results and runs for filtering and ordering')
+def _add_result_indexes(db):
+    # Names match the Index() declarations in models/job.py so fresh databases agree
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS ix_crawl_result_run_scraped ON crawl_result (run_id, scraped_at)",
+        "CREATE INDEX IF NOT EXISTS ix_crawl_result_job_scraped ON crawl_result (job_id, scraped_at)",
+        "CREATE INDEX IF NOT EXISTS ix_crawl_result_scraped ON crawl_result (scraped_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_crawl_result_url ON crawl_result (url)",
+        "CREATE INDEX IF NOT EXISTS ix_crawl_run_job_started ON crawl_run (job_id, started_at)",
+    ):
+        db.session.execute(text(statement))
+
+
+@migration(4, 'full-text index over crawl_result')
+def _add_fts_index(db):
+    import logging
+    from models.search import ensure_fts_index
+    if not ensure_fts_index(db, logging.getLogger(__name__)):
+        return 'skipped: full-text index unavailable, search uses LIKE'
+
+
+@migration(5, 'url_validator table for incremental recrawls')
+def _add_url_validator(db):
+    from models.job import UrlValidator
+    UrlValidator.__table__.create(bind=db.session.connection(), checkfirst=True)
+
+
+@migration(6, 'queued_job table for the persistent job queue')
+def _add_queued_job(db):
+    from models.job import QueuedJob
+    QueuedJob.__table__.create(bind=db.session.connection(), checkfirst=True)
+
+
+def current_version(db):
+    db.session.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at DATETIME)"
+    ))
+    version = db.session.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar()
+    return version or 0
+
+
+def run_migrations(db, logger):
+    """Apply pending migrations in order; a no-op (one query) when the schema is current"""
+    version = current_version(db)
+    db.session.commit()
+    if version >= latest_version():
+        return version
+
+    applied = {row[0] for row in db.session.execute(text("SELECT version FROM schema_migrations"))}
+    for number, description, func in MIGRATIONS:
+        if number in applied:
+            continue
+        logger.info(f"Migrating: {number} {description}")
+        try:
+            skipped = func(db)
+            if skipped:
+                logger.warning(f"Migration {number} ({description}) {skipped}")
+                description = f"{description} ({skipped})"
+            db.session.execute(
+                text("INSERT OR IGNORE INTO schema_migrations (version, description, applied_at) "
+                     "VALUES (:version, :description, :applied_at)"),
+                {'version': number, 'description': description, 'applied_at': datetime.utcnow()}
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Migration {number} ({description}) failed: {e}")
+            raise
+        version = number
+    return version
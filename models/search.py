@@ -0,0 +1,129 @@
+from sqlalchemy import Integer, column, text
+
+# External-content FTS5 index over crawl_result(title, content). The trigram
+# tokenizer gives substring matching like the old ILIKE filter and also works
+# for CJK text, which unicode61 would treat as one long token.
+FTS_TABLE = 'crawl_result_fts'
+MIN_QUERY_LENGTH = 3  # trigram needs at least three characters to match
+
+_FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"title, content, content='crawl_result', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON crawl_result BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON crawl_result BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, content ON crawl_result BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+]
+
+# Throwaway table that tells whether this SQLite has FTS5 with the trigram tokenizer (3.34+)
+_FTS_PROBE = "CREATE VIRTUAL TABLE temp.crawl_result_fts_probe USING fts5(x, tokenize='trigram')"
+
+_fts_ready = None
+
+
+def fts_supported(db):
+    """Whether SQLite can build the index at all (FTS5 compiled in, trigram tokenizer present)"""
+    try:
+        with db.session.begin_nested():
+            db.session.execute(text(_FTS_PROBE))
+            db.session.execute(text("DROP TABLE temp.crawl_result_fts_probe"))
+    except Exception:
+        return False
+    return True
+
+
+def ensure_fts_index(db, logger):
+    """Create the FTS table and sync triggers, backfilling existing rows on first creation.
+
+    Returns False without changing anything when the database cannot have the
+    index (not SQLite, or SQLite without FTS5 trigram); search then uses LIKE.
+    Any other failure is raised, so the migration that calls it is retried.
+    """
+    global _fts_ready
+    if db.engine.dialect.name != 'sqlite':
+        _fts_ready = False
+        return False
+    if not fts_supported(db):
+        logger.warning('Full-text index unavailable (SQLite built without FTS5 trigram); search uses LIKE')
+        _fts_ready = False
+        return False
+    exists = db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+    ).first() is not None
+    try:
+        for statement in _FTS_DDL:
+            db.session.execute(text(statement))
+        if not exists:
+            logger.info('Migrating: building full-text index for crawl_result')
+            db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        db.session.commit()
+        _fts_ready = True
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Failed to build the full-text index: {e}")
+        _fts_ready = False
+        raise
+    return _fts_ready
+
+
+def fts_available(db):
+    """Whether the FTS index exists in the current database (checked once per process)"""
+    global _fts_ready
+    if _fts_ready is None:
+        try:
+            _fts_ready = db.session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+            ).first() is not None
+        except Exception:
+            _fts_ready = False
+    return _fts_ready
+
+
+def match_expression(q):
+    """Quote the user query as a single FTS5 phrase, i.e. a case-insensitive substring match"""
+    return '"' + q.replace('"', '""') + '"'
+
+
+def can_use_fts(db, q):
+    return len(q) >= MIN_QUERY_LENGTH and fts_available(db)
+
+
+def matching_ids(q):
+    """Selectable of crawl_result ids whose title or content contains q"""
+    return text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts_query").bindparams(
+        fts_query=match_expression(q)
+    ).columns(column('rowid', Integer))
+
+
+def search_results(db, q, job_id=None, run_id=None, limit=20, offset=0, snippet_tokens=16):
+    """Ranked matches (best first by bm25, title weighted higher) with highlighted snippets"""
+    filters = ''
+    params = {'fts_query': match_expression(q), 'limit': limit, 'offset': offset, 'tokens': snippet_tokens}
+    if job_id is not None:
+        filters += ' AND r.job_id = :job_id'
+        params['job_id'] = job_id
+    if run_id is not None:
+        filters += ' AND r.run_id = :run_id'
+        params['run_id'] = run_id
+    rows = db.session.execute(text(
+        f"SELECT r.id, r.job_id, r.run_id, r.url, r.title, r.scraped_at, "
+        f"snippet({FTS_TABLE}, -1, '<mark>', '</mark>', '…', :tokens) AS snippet, "
+        f"bm25({FTS_TABLE}, 5.0, 1.0) AS score "
+        f"FROM {FTS_TABLE} JOIN crawl_result r ON r.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH :fts_query{filters} "
+        f"ORDER BY score LIMIT :limit OFFSET :offset"
+    ), params).mappings().all()
+    items = []
+    for row in rows:
+        item = dict(row)
+        # Raw SQL returns SQLite's text timestamp; present it like CrawlResult.to_dict does
+        scraped_at = item.get('scraped_at')
+        if isinstance(scraped_at, str):
+            item['scraped_at'] = scraped_at.replace(' ', 'T', 1)
+        elif scraped_at is not None:
+            item['scraped_at'] = scraped_at.isoformat()
+        items.append(item)
+    return items
@@ -1,9 +1,19 @@
 from app import create_app
 import os
+import signal
+import sys
 
 # Get port from environment variable or default to 5000
 port = int(os.environ.get('PORT', 5000))
 
 if __name__ == '__main__':
     app = create_app()
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    # Pre-fork crawl workers and start the job queue in the process that serves requests,
+    # not in the reloader's watcher
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from web import process_manager
+        process_manager.engine.warm_up()
+        process_manager.start_scheduler(app)
+        # Exit normally on SIGTERM so atexit stops the ingestion service and workers cleanly
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    app.run(host='0.0.0.0', port=port, debug=True)
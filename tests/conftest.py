@@ -0,0 +1,36 @@
+import logging
+import os
+import sys
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+API_HEADERS = {'X-API-Key': 'default-key'}
+
+
+@pytest.fixture
+def web_app(tmp_path, monkeypatch):
+    """The web blueprint on a migrated throwaway database, inside an app context"""
+    from flask import Flask
+    from app import db
+    from models import search
+    from models.migrations import run_migrations
+    from web import bp
+
+    monkeypatch.delenv('API_KEY', raising=False)
+    monkeypatch.setattr(search, '_fts_ready', None)
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(app)
+    app.register_blueprint(bp)
+    with app.app_context():
+        run_migrations(db, logging.getLogger(__name__))
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(web_app):
+    return web_app.test_client()
@@ -0,0 +1,124 @@
+import pytest
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest
+from scrapy.http import Request, Response
+from scrapy.utils.test import get_crawler
+from twisted.internet.task import Clock
+
+from crawler import circuit as circuit_module
+from crawler import settings as project_settings
+from crawler.circuit import CLOSED, HALF_OPEN, OPEN, DomainRetryMiddleware
+from crawler.incremental import IncrementalMiddleware
+
+URL = 'https://example.com/page'
+
+
+class FakeEngine:
+    running = True
+
+    def __init__(self):
+        self.crawled = []
+
+    def crawl(self, request):
+        self.crawled.append(request)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_module, 'reactor', clock)
+    return clock
+
+
+@pytest.fixture
+def crawler():
+    crawler = get_crawler(settings_dict={
+        'CIRCUIT_FAILURE_THRESHOLD': 2,
+        'CIRCUIT_FAILURE_CODES': [403],
+        'CIRCUIT_OPEN_SECS': 10,
+        'CIRCUIT_PROBE_TIMEOUT': 60,
+    })
+    crawler.engine = FakeEngine()
+    return crawler
+
+
+def download(middlewares, request, response):
+    """Run request/response through middlewares the way Scrapy's downloader does"""
+    for middleware in middlewares:
+        middleware.process_request(request, None)
+    for middleware in reversed(middlewares):
+        response = middleware.process_response(request, response, None)
+    return response
+
+
+def open_circuit(breaker, spider=None):
+    for _ in range(2):
+        breaker.process_response(Request(URL), Response(URL, status=403), spider)
+    held = Request(URL + '?held')
+    with pytest.raises(IgnoreRequest):
+        breaker.process_request(held, spider)
+    return breaker.circuits['example.com']
+
+
+def test_probe_answered_with_304_closes_circuit(clock, crawler):
+    breaker = DomainRetryMiddleware(crawler)
+    incremental = IncrementalMiddleware(app=None, crawler=crawler)
+    incremental.validators = {URL + '?held': ('"v1"', None, 'abc')}
+    # Downloader middleware order as configured for real crawls
+    priorities = project_settings.DOWNLOADER_MIDDLEWARES
+    middlewares = sorted([breaker, incremental], key=lambda middleware: priorities[
+        f'{type(middleware).__module__}.{type(middleware).__name__}'])
+
+    circuit = open_circuit(breaker)
+    assert circuit.state == OPEN
+    clock.advance(10)
+    assert circuit.state == HALF_OPEN
+    probe = crawler.engine.crawled.pop()
+    assert probe.meta['circuit_probe'] == circuit.probe
+
+    with pytest.raises(IgnoreRequest):
+        download(middlewares, probe, Response(probe.url, status=304))
+
+    assert circuit.state == CLOSED
+    assert circuit.probe is None
+    assert not clock.getDelayedCalls()
+    breaker.spider_idle(None)
+
+
+def test_probe_dropped_by_later_middleware_sends_next_probe(clock, crawler):
+    breaker = DomainRetryMiddleware(crawler)
+    circuit = open_circuit(breaker)
+    with pytest.raises(IgnoreRequest):
+        breaker.process_request(Request(URL + '?second'), None)
+    clock.advance(10)
+    probe = crawler.engine.crawled.pop()
+    breaker.process_request(probe, None)
+
+    breaker.process_exception(probe, IgnoreRequest('filtered'), None)
+
+    second = crawler.engine.crawled.pop()
+    assert second.url == URL + '?second'
+    assert second.meta['circuit_probe'] == circuit.probe
+    assert circuit.state == HALF_OPEN
+
+
+def test_probe_without_outcome_times_out(clock, crawler):
+    breaker = DomainRetryMiddleware(crawler)
+    circuit = open_circuit(breaker)
+    clock.advance(10)
+    crawler.engine.crawled.pop()
+    assert circuit.probe is not None
+
+    clock.advance(60)
+
+    assert circuit.state == OPEN
+    assert circuit.probe is None
+    assert crawler.stats.get_value('circuit/probe_timeouts') == 1
+    # The parked request is gone with the lost probe, so nothing keeps the spider open
+    breaker.spider_idle(None)
+
+
+def test_parked_requests_keep_spider_open(clock, crawler):
+    breaker = DomainRetryMiddleware(crawler)
+    open_circuit(breaker)
+    with pytest.raises(DontCloseSpider):
+        breaker.spider_idle(None)
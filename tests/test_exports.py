@@ -0,0 +1,17 @@
+import json
+
+from web import _ndjson_value
+
+
+def test_pipeline_json_is_spliced_as_stored():
+    assert _ndjson_value('{"a":1}') == '{"a":1}'
+
+
+def test_invalid_json_is_exported_as_a_string():
+    line = '{"id": 1, "scraped_data": ' + _ndjson_value('broken {') + '}'
+    assert json.loads(line)['scraped_data'] == 'broken {'
+
+
+def test_multiline_json_stays_on_one_line():
+    value = _ndjson_value('{\n  "a": 1\n}')
+    assert '\n' not in value and json.loads(value) == {'a': 1}
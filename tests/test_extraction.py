@@ -0,0 +1,47 @@
+import pytest
+from scrapy.http import HtmlResponse
+
+from crawler.extraction import compile_rules
+
+BODY = b'''<html><head><title>Page</title></head><body>
+<h1 class="headline">Headline</h1><p>one</p><p>two</p><a href="/next">next</a>
+</body></html>'''
+
+
+def response():
+    return HtmlResponse('https://example.com/', body=BODY, encoding='utf-8')
+
+
+def test_matches_response_css():
+    rules = compile_rules({
+        'title_selector': 'h1.headline::text',
+        'custom_fields': {'paragraphs': 'p::text', 'next': 'a::attr(href)', 'missing': '.nothing'},
+    })
+    page = response()
+    data = rules.extract(page)
+    assert data['title'] == page.css('h1.headline::text').get()
+    assert data['paragraphs'] == page.css('p::text').getall()
+    assert data['next'] == page.css('a::attr(href)').get()
+    assert data['missing'] == []
+
+
+def test_rules_with_the_same_selector_are_evaluated_once(monkeypatch):
+    rules = compile_rules({
+        'title_selector': 'h1.headline::text',
+        'content_selector': 'p::text',
+        'custom_fields': {'headline': 'h1.headline::text', 'paragraphs': 'p::text'},
+    })
+    assert len(rules.selectors) == 2
+    calls = []
+    for selector in rules.selectors.values():
+        original = selector.evaluate
+        monkeypatch.setattr(selector, 'evaluate', lambda root, original=original: calls.append(1) or original(root))
+    data = rules.extract(response())
+    assert len(calls) == 2
+    assert data['headline'] == data['title'] == 'Headline'
+    assert data['content'] == 'one two'
+
+
+def test_broken_selector_fails_at_compile_time():
+    with pytest.raises(ValueError, match='custom_fields.price'):
+        compile_rules({'custom_fields': {'price': 'div[unclosed'}})
@@ -0,0 +1,39 @@
+from scrapy.http import Request
+
+from crawler.frontier import BloomDupeFilter, canonicalize_url
+
+
+def test_tracking_params_and_trailing_slash_are_ignored():
+    assert canonicalize_url('https://Example.com/news/?utm_source=x&b=2&a=1#top') == \
+        canonicalize_url('https://example.com/news?a=1&b=2')
+
+
+def test_content_params_are_kept():
+    assert canonicalize_url('https://example.com/list?from=20') != canonicalize_url('https://example.com/list?from=40')
+
+
+def test_site_specific_params_can_be_stripped():
+    dupefilter = BloomDupeFilter(capacity=1000, strip_params=frozenset(['from']))
+    assert not dupefilter.request_seen(Request('https://example.com/list?from=20'))
+    assert dupefilter.request_seen(Request('https://example.com/list?from=40'))
+
+
+def test_duplicate_is_filtered():
+    dupefilter = BloomDupeFilter(capacity=1000)
+    assert not dupefilter.request_seen(Request('https://example.com/news'))
+    assert dupefilter.request_seen(Request('https://example.com/news/'))
+
+
+def test_redirect_to_same_canonical_url_is_not_filtered():
+    dupefilter = BloomDupeFilter(capacity=1000)
+    assert not dupefilter.request_seen(Request('https://example.com/news'))
+    redirected = Request('https://example.com/news/', meta={'redirect_urls': ['https://example.com/news']})
+    assert not dupefilter.request_seen(redirected)
+
+
+def test_redirect_to_seen_url_is_filtered():
+    dupefilter = BloomDupeFilter(capacity=1000)
+    assert not dupefilter.request_seen(Request('https://example.com/'))
+    assert not dupefilter.request_seen(Request('https://example.com/old'))
+    redirected = Request('https://example.com/', meta={'redirect_urls': ['https://example.com/old']})
+    assert dupefilter.request_seen(redirected)
@@ -0,0 +1,26 @@
+import queue
+
+import pytest
+
+from crawler.ingest import _STOP, _Client, _RowQueue
+
+
+def test_row_queue_is_bounded_by_rows():
+    pending = _RowQueue(maxsize=10)
+    client = _Client()
+    pending.put((client, [{}] * 6))
+    pending.put((client, [{}] * 6))
+    assert pending.qsize() == 12
+    with pytest.raises(queue.Full):
+        pending.put((client, [{}]), block=False)
+    pending.get()
+    assert pending.qsize() == 6
+    pending.put((client, [{}]), block=False)
+
+
+def test_control_messages_count_as_one_row():
+    pending = _RowQueue(maxsize=10)
+    pending.put(_STOP)
+    assert pending.qsize() == 1
+    assert pending.get(timeout=1) is _STOP
+    assert pending.empty()
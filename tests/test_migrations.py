@@ -0,0 +1,50 @@
+import logging
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+from app import db
+from models import search
+from models.migrations import latest_version, run_migrations
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(search, '_fts_ready', None)
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(app)
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def applied_versions():
+    return {row[0] for row in db.session.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def test_failed_fts_index_is_not_recorded_and_is_retried(app, monkeypatch):
+    logger = logging.getLogger(__name__)
+    monkeypatch.setattr(search, '_FTS_DDL', ["CREATE VIRTUAL TABLE crawl_result_fts USING no_such_module(title)"])
+    with pytest.raises(Exception):
+        run_migrations(db, logger)
+    assert applied_versions() == {1, 2, 3}
+    assert not search.fts_available(db)
+
+    monkeypatch.undo()
+    monkeypatch.setattr(search, '_fts_ready', None)
+    assert run_migrations(db, logger) == latest_version()
+    assert {4, 5, 6} <= applied_versions()
+    assert search.fts_available(db)
+
+
+def test_missing_fts_support_is_skipped_and_later_migrations_still_run(app, monkeypatch):
+    monkeypatch.setattr(search, '_FTS_PROBE', "CREATE VIRTUAL TABLE temp.probe USING no_such_module(x)")
+    assert run_migrations(db, logging.getLogger(__name__)) == latest_version()
+    rows = dict(db.session.execute(text("SELECT version, description FROM schema_migrations")).all())
+    assert 'skipped' in rows[4]
+    tables = {row[0] for row in db.session.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+    assert {'url_validator', 'queued_job'} <= tables
+    assert 'crawl_result_fts' not in tables
+    assert not search.can_use_fts(db, 'news')
@@ -0,0 +1,46 @@
+from crawler.pipelines import DatabasePipeline
+
+
+def make_pipeline(queue_size):
+    pipeline = DatabasePipeline(queue_size=queue_size)
+    # Stand-ins for an open database and a running writer thread
+    pipeline.db = pipeline.CrawlResult = pipeline.writer = object()
+    return pipeline
+
+
+def item(n):
+    return {'job_id': 1, 'run_id': 1, 'url': f'https://example.com/{n}', 'title': str(n)}
+
+
+def test_full_queue_holds_items_back_without_threads():
+    pipeline = make_pipeline(queue_size=1)
+    assert pipeline.process_item(item(1), None) == item(1)
+
+    results = []
+    for n in (2, 3):
+        d = pipeline.process_item(item(n), None)
+        d.addCallback(results.append)
+    assert results == []
+    assert len(pipeline.waiting) == 2
+
+    # The writer takes a row, then admits the oldest held-back item
+    assert pipeline.queue.get_nowait()['url'].endswith('/1')
+    pipeline._admit_waiting()
+    assert results == [item(2)]
+    assert pipeline.queue.get_nowait()['url'].endswith('/2')
+    pipeline._admit_waiting()
+    assert results == [item(2), item(3)]
+    assert not pipeline.waiting
+
+
+def test_items_keep_their_order_while_others_wait():
+    pipeline = make_pipeline(queue_size=1)
+    pipeline.process_item(item(1), None)
+    pipeline.process_item(item(2), None)
+    pipeline.queue.get_nowait()
+    # Room in the queue, but item 2 is still waiting: item 3 must queue behind it
+    d = pipeline.process_item(item(3), None)
+    assert pipeline.queue.get_nowait()['url'].endswith('/2')
+    assert not d.called
+    pipeline._admit_waiting()
+    assert d.called
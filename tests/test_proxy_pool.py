@@ -0,0 +1,201 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import scrapy
+from scrapy.crawler import CrawlerProcess
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import Request
+from scrapy.utils.test import get_crawler
+
+from crawler import proxy_pool as proxy_pool_module
+from crawler.middlewares import ProxyMiddleware
+from crawler.proxy_pool import ProxyPool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FirstTwo:
+    """Deterministic stand-in for the pool's rng: compares the first two candidates"""
+
+    def sample(self, population, k):
+        return population[:k]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(proxy_pool_module.time, 'monotonic', clock)
+    return clock
+
+
+def test_new_domains_prefer_the_faster_healthier_proxy(clock):
+    pool = ProxyPool(['http://slow:1', 'http://fast:2'], rng=FirstTwo())
+    for _ in range(3):
+        pool.report_success('http://slow:1', latency=2.0)
+        pool.report_success('http://fast:2', latency=0.2)
+    assert pool.choose('a.example') == 'http://fast:2'
+    # A quarantined proxy is skipped whatever its score
+    pool.report_failure('http://fast:2')
+    assert pool.choose('b.example') == 'http://slow:1'
+    clock.now += 3600
+    assert pool.choose('c.example') == 'http://fast:2'
+
+
+def test_quarantine_doubles_per_failure_and_resets_on_success(clock):
+    pool = ProxyPool(['http://p:1'], quarantine_base=10, quarantine_max=35)
+    backoffs = []
+    for _ in range(4):
+        state = pool.report_failure('http://p:1')
+        backoffs.append(state.quarantined_until - clock.now)
+    assert backoffs == [10, 20, 35, 35]
+    pool.report_success('http://p:1')
+    assert pool.report_failure('http://p:1').quarantined_until - clock.now == 10
+
+
+def test_domain_sticks_to_its_proxy_until_it_fails(clock):
+    pool = ProxyPool(['http://a:1', 'http://b:2', 'http://c:3'], rng=FirstTwo())
+    first = pool.choose('example.com')
+    assert all(pool.choose('example.com') == first for _ in range(5))
+    pool.report_failure(first)
+    second = pool.choose('example.com')
+    assert second != first
+    assert pool.choose('example.com') == second
+
+
+def test_non_network_errors_do_not_count_against_the_proxy():
+    crawler = get_crawler(settings_dict={'PROXY_LIST': ['http://p:1']})
+    middleware = ProxyMiddleware.from_crawler(crawler)
+    request = Request('http://example.com/')
+    middleware.process_request(request, None)
+    assert middleware.process_exception(request, IgnoreRequest(), None) is None
+    assert middleware.process_exception(request, ValueError('parse error'), None) is None
+    assert middleware.pool.proxies['http://p:1'].failures == 0
+    retry = middleware.process_exception(request, ConnectionRefusedError(), None)
+    assert retry is not None and retry.meta['proxy_retry_times'] == 1
+    assert middleware.pool.proxies['http://p:1'].failures == 1
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = f'<html><title>{self.path}</title></html>'.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def forwarding_proxy(name, seen):
+    """HTTP proxy server that forwards absolute-URL GETs and records (name, host, path)"""
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+    class ProxyHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            seen.append((name, self.headers['Host'], self.path))
+            with opener.open(self.path, timeout=5) as upstream:
+                body = upstream.read()
+                self.send_response(upstream.status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ProxyHandler
+
+
+def serve(handler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class PagesSpider(scrapy.Spider):
+    name = 'pages'
+
+    def __init__(self, port, **kwargs):
+        super().__init__(**kwargs)
+        self.start_urls = [f'http://{host}:{port}/page{n}' for host in ('127.0.0.1', 'localhost') for n in range(3)]
+
+    def parse(self, response):
+        yield {'url': response.url}
+
+
+def run_crawl():
+    """Crawl two domains through a dead proxy and two forwarding proxies; returns (stats, seen, dead label).
+
+    Runs in its own process (see below) because a Twisted reactor cannot be
+    restarted, and other code collected by pytest may already have run one.
+    """
+    proxy_pool_module.random.Random = FirstTwo
+    seen = []
+    origin = serve(OriginHandler)
+    proxies = {'good1': serve(forwarding_proxy('good1', seen)), 'good2': serve(forwarding_proxy('good2', seen))}
+    dead = f'http://127.0.0.1:{unused_port()}'
+    urls = {name: f'http://127.0.0.1:{server.server_address[1]}' for name, server in proxies.items()}
+    process = CrawlerProcess({
+        'TWISTED_REACTOR': None,
+        'LOG_ENABLED': False,
+        'RETRY_ENABLED': False,
+        'CONCURRENT_REQUESTS': 1,
+        'PROXY_LIST': [dead, urls['good1'], urls['good2']],
+        'DOWNLOADER_MIDDLEWARES': {'crawler.middlewares.ProxyMiddleware': 610},
+        'TELNETCONSOLE_ENABLED': False,
+    })
+    crawler = process.create_crawler(PagesSpider)
+    try:
+        process.crawl(crawler, port=origin.server_address[1])
+        process.start()
+    finally:
+        origin.shutdown()
+        for server in proxies.values():
+            server.shutdown()
+    stats = {key: value for key, value in crawler.stats.get_stats().items()
+             if key.startswith('proxy_pool/') or key == 'item_scraped_count'}
+    return stats, seen, dead.split('//')[1]
+
+
+def test_crawl_fails_over_from_a_dead_proxy_and_sticks_per_domain():
+    result = subprocess.run([sys.executable, '-m', 'tests.test_proxy_pool'], cwd=ROOT,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    stats, seen, dead_label = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert stats['item_scraped_count'] == 6
+    # The first request went to the dead proxy, which is now quarantined
+    assert stats[f'proxy_pool/{dead_label}/failures'] == 1
+    assert stats[f'proxy_pool/{dead_label}/quarantined_for'] > 0
+    assert stats['proxy_pool/retries'] == 1
+    # Every page of a domain came through the same proxy
+    for host in ('127.0.0.1', 'localhost'):
+        assert len({name for name, seen_host, _ in seen if seen_host.startswith(host)}) == 1
+    assert len(seen) == 6
+
+
+if __name__ == '__main__':
+    print(json.dumps(run_crawl()))
@@ -0,0 +1,108 @@
+import io
+import json
+import time
+from datetime import datetime
+
+import pytest
+
+from app import db
+from models.job import CrawlJob, CrawlResult, CrawlRun
+from web import task_manager
+from tests.conftest import API_HEADERS
+
+
+@pytest.fixture
+def run_id(web_app):
+    job = CrawlJob(name='job', target_url='https://example.com/')
+    db.session.add(job)
+    db.session.flush()
+    run = CrawlRun(job_id=job.id, status='completed')
+    db.session.add(run)
+    db.session.flush()
+    scraped_at = datetime(2024, 1, 1, 12, 0, 0)
+    db.session.add_all(CrawlResult(job_id=job.id, run_id=run.id, url=f'https://example.com/{n}', title=f'Page {n}',
+                                   content='text', scraped_at=scraped_at)
+                       for n in range(25))
+    db.session.commit()
+    return run.id
+
+
+def wait_for_task(task_id):
+    deadline = time.monotonic() + 10
+    while task_manager.get(task_id).status in ('pending', 'running'):
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    return task_manager.get(task_id)
+
+
+def test_batch_delete_by_run_purges_in_the_background(client, run_id):
+    response = client.post('/api/results/batch_delete', json={'run_id': run_id}, headers=API_HEADERS)
+    assert response.status_code == 202
+    task = wait_for_task(response.get_json()['task']['id'])
+    assert task.status == 'completed'
+    assert task.result['deleted'] == 25 and task.result['runs_deleted'] == 1
+    db.session.expire_all()
+    assert CrawlResult.query.count() == 0
+    assert db.session.get(CrawlRun, run_id) is None
+
+
+def test_cursor_pages_through_equal_timestamps_without_gaps(client, run_id):
+    # Every row shares scraped_at, so only the id tie-breaker keeps pages apart
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {'run_id': run_id, 'page_size': 7, 'paginate': 'cursor', 'with_total': '1'}
+        if cursor:
+            params['cursor'] = cursor
+        response = client.get('/api/results', query_string=params, headers=API_HEADERS)
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body['total'] == 25
+        seen.extend(item['id'] for item in body['items'])
+        pages += 1
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    expected = [row.id for row in CrawlResult.query.order_by(CrawlResult.id.desc())]
+    assert pages == 4
+    assert seen == expected and len(set(seen)) == 25
+
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', 'W251bGwsIDFd'])
+def test_malformed_cursor_is_rejected(client, run_id, cursor):
+    response = client.get('/api/results', query_string={'cursor': cursor}, headers=API_HEADERS)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid cursor'
+
+
+def test_parquet_export_flattens_custom_fields(web_app, client, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    web_app.config['EXPORT_DIR'] = str(tmp_path / 'exports')
+    job = CrawlJob(name='shop', target_url='https://example.com/',
+                   custom_rules=json.dumps({'custom_fields': {'price': '.price::text', 'tags': '.tag::text'}}))
+    db.session.add(job)
+    db.session.flush()
+    pages = [
+        {'price': '9.99', 'tags': ['a', 'b'], 'links': ['https://example.com/1', 'https://example.com/2']},
+        {'price': None, 'tags': 'solo'},
+    ]
+    for n, scraped in enumerate(pages):
+        db.session.add(CrawlResult(job_id=job.id, url=f'https://example.com/p{n}', title=f'P{n}', content='c',
+                                   scraped_data=json.dumps(scraped), scraped_at=datetime(2024, 1, 1, 12, n)))
+    db.session.commit()
+
+    response = client.post('/api/results/export_jobs', json={'job_id': job.id}, headers=API_HEADERS)
+    assert response.status_code == 202
+    task = wait_for_task(response.get_json()['task']['id'])
+    assert task.status == 'completed', task.error
+    download = client.get(f"/api/results/export_jobs/{task.id}/download", headers=API_HEADERS)
+    assert download.status_code == 200
+
+    table = pq.read_table(io.BytesIO(download.data))
+    assert table.column_names == ['id', 'job_id', 'run_id', 'url', 'title', 'content', 'scraped_at',
+                                  'links', 'price', 'tags']
+    rows = table.to_pylist()
+    assert [row['url'] for row in rows] == ['https://example.com/p0', 'https://example.com/p1']
+    assert rows[0]['price'] == '9.99' and json.loads(rows[0]['tags']) == ['a', 'b']
+    assert rows[0]['links'] == ['https://example.com/1', 'https://example.com/2']
+    assert rows[1]['price'] is None and rows[1]['tags'] == 'solo' and rows[1]['links'] is None
+    assert rows[1]['scraped_at'] == datetime(2024, 1, 1, 12, 1)
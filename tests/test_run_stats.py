@@ -0,0 +1,43 @@
+import json
+
+import pytest
+from flask import Flask
+
+from app import db
+from crawler.run_stats import merge_run_stats
+from models.job import CrawlJob, CrawlRun
+
+
+@pytest.fixture
+def run_id(tmp_path):
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        job = CrawlJob(name='job', target_url='https://example.com/')
+        db.session.add(job)
+        db.session.flush()
+        run = CrawlRun(job_id=job.id, status='running')
+        db.session.add(run)
+        db.session.commit()
+        yield run.id
+        db.session.remove()
+
+
+def stored(run_id):
+    db.session.expire_all()
+    return json.loads(db.session.get(CrawlRun, run_id).stats_json)
+
+
+def test_sections_are_merged(run_id):
+    merge_run_stats(db, run_id, {'incremental': {'unchanged': 3}})
+    merge_run_stats(db, run_id, {'summary': {'items': 5}})
+    assert stored(run_id) == {'incremental': {'unchanged': 3}, 'summary': {'items': 5}}
+
+
+def test_none_values_are_dropped_instead_of_deleting_keys(run_id):
+    merge_run_stats(db, run_id, {'summary': {'items': 5, 'pages_per_min': 12.0}})
+    merge_run_stats(db, run_id, {'summary': {'pages_per_min': None, 'duration_secs': 0.0}, 'timeline': [[0, None]]})
+    assert stored(run_id) == {'summary': {'items': 5, 'pages_per_min': 12.0, 'duration_secs': 0.0},
+                              'timeline': [[0, None]]}
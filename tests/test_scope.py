@@ -0,0 +1,52 @@
+from crawler.scope import CrawlScope, registrable_domain
+
+
+def test_default_scope_is_the_target_host():
+    scope = CrawlScope.from_rules({}, 'https://www.gov.ph/')
+    assert scope.allows('https://www.gov.ph/news')
+    assert scope.allows('https://gov.ph/news')
+    assert not scope.allows('https://doh.gov.ph/')
+    assert not scope.allows('https://www.example.com/')
+
+
+def test_subdomains_widen_to_the_registrable_domain():
+    scope = CrawlScope.from_rules({'scope': {'allow_subdomains': True}}, 'https://www.news.example.co.uk/')
+    assert scope.allows('https://example.co.uk/')
+    assert scope.allows('https://shop.example.co.uk/')
+    assert not scope.allows('https://other.co.uk/')
+
+
+def test_subdomains_never_widen_to_a_public_suffix():
+    scope = CrawlScope.from_rules({'scope': {'allow_subdomains': True}}, 'https://www.gov.ph/')
+    assert scope.allows('https://www.gov.ph/')
+    assert scope.allows('https://sub.www.gov.ph/')
+    assert not scope.allows('https://doh.gov.ph/')
+
+    bare_suffix = CrawlScope.from_rules({'scope': {'allow_subdomains': True}}, 'https://gov.ph/')
+    assert bare_suffix.allows('https://gov.ph/')
+    assert not bare_suffix.allows('https://doh.gov.ph/')
+
+
+def test_listed_domains_cover_their_subdomains():
+    explicit = CrawlScope.from_rules({'scope': {'allowed_domains': ['gov.sg', 'www.gov.ph'], 'allow_subdomains': True}})
+    assert explicit.allows('https://gov.sg/')
+    assert explicit.allows('https://moh.gov.sg/')
+    assert explicit.allows('https://sub.www.gov.ph/')
+    assert not explicit.allows('https://doh.gov.ph/')
+
+    exact = CrawlScope.from_rules({'scope': {'allowed_domains': ['gov.sg']}})
+    assert not exact.allows('https://moh.gov.sg/')
+
+
+def test_registrable_domain():
+    assert registrable_domain('a.b.example.com') == 'example.com'
+    assert registrable_domain('gov.ph') is None
+    assert registrable_domain('127.0.0.1') is None
+
+
+def test_links_are_filtered():
+    scope = CrawlScope.from_rules({'scope': {'exclude_paths': ['/tag/']}}, 'https://example.com/')
+    assert not scope.allows('mailto:someone@example.com')
+    assert not scope.allows('https://example.com/photo.JPG')
+    assert not scope.allows('https://example.com/tag/python')
+    assert scope.allows('https://example.com/post/1')
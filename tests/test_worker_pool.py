@@ -0,0 +1,151 @@
+import threading
+import time
+
+import pytest
+from flask import Flask
+from scrapy.settings import Settings
+
+from crawler import engine as engine_module
+from crawler import worker_pool as worker_pool_module
+from crawler.engine import CrawlerEngine
+from crawler.worker_pool import BUSY, IDLE, JobHandle, WorkerPool, WorkerPoolUnavailable, _PooledWorker
+
+
+class StubbornProcess:
+    """Process double that ignores SIGTERM and only exits when killed"""
+
+    pid = 4242
+
+    def __init__(self):
+        self.exited = threading.Event()
+        self.signals = []
+
+    def is_alive(self):
+        return not self.exited.is_set()
+
+    def terminate(self):
+        self.signals.append('TERM')
+
+    def kill(self):
+        self.signals.append('KILL')
+        self.exited.set()
+
+    def join(self, timeout=None):
+        self.exited.wait(timeout)
+
+
+def test_stop_returns_at_once_and_kills_a_job_that_ignores_sigterm(monkeypatch):
+    monkeypatch.setattr(engine_module, 'get_project_settings', lambda: Settings({'JOB_STOP_TIMEOUT': 0.2}))
+    engine = CrawlerEngine()
+    # Bare app: the stopped job has no run to update, so no database is needed
+    engine.flask_app = Flask(__name__)
+    process = StubbornProcess()
+    engine.processes[7] = {'process': process, 'start_time': time.time(), 'result_queue': None, 'run_id': None}
+
+    started = time.monotonic()
+    engine.stop_crawl(7)
+    assert time.monotonic() - started < 0.1
+    assert process.signals == ['TERM']
+
+    assert process.exited.wait(5)
+    deadline = time.monotonic() + 5
+    while 7 in engine.processes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert process.signals == ['TERM', 'KILL']
+    assert 7 not in engine.processes
+
+
+def test_job_handle_join_honours_its_timeout():
+    handle = JobHandle(1, _PooledWorker(StubbornProcess(), conn=None))
+    started = time.monotonic()
+    handle.join(0.2)
+    assert time.monotonic() - started < 0.5
+    assert handle.is_alive()
+    handle.kill()
+    assert handle.worker.stopping and not handle.worker.process.is_alive()
+
+
+class FakeConn:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+def test_reserved_worker_is_not_handed_out_twice_and_can_be_released():
+    pool = WorkerPool(size=1, start_timeout=0.2)
+    first, second = (_PooledWorker(StubbornProcess(), FakeConn()) for _ in range(2))
+    for worker in (first, second):
+        worker.state = IDLE
+        pool.workers.append(worker)
+
+    spawned = []
+    pool._spawn = lambda: spawned.append(True)
+
+    assert pool.acquire() is first
+    assert first.state == BUSY and not spawned
+    # Reserving the last warm worker starts a replacement
+    assert pool.acquire() is second
+    assert spawned == [True]
+    pool.release(first)
+    pool.release(second)
+    # Both back, but only WORKER_POOL_SIZE idle workers are kept
+    assert first.state == IDLE and first in pool.workers
+    assert second.conn.sent == [('shutdown',)] and second not in pool.workers
+
+
+class ExitedProcess(StubbornProcess):
+    """A worker process that crashed during start-up"""
+
+    exitcode = 1
+
+    def __init__(self):
+        super().__init__()
+        self.exited.set()
+
+
+def test_workers_dying_on_start_up_back_off_then_disable_the_pool(monkeypatch):
+    pool = WorkerPool(size=1, start_timeout=0.2, max_start_failures=3, respawn_delay=30)
+    pool.running = True
+    spawned = []
+    pool._spawn = lambda: spawned.append(True)
+    timers = []
+    monkeypatch.setattr(worker_pool_module.threading, 'Timer', lambda delay, func: timers.append(delay) or FakeTimer())
+
+    for _ in range(2):
+        pool._worker_exited(_PooledWorker(ExitedProcess(), FakeConn()))
+    # No immediate respawn: replacements wait 30s, then 60s
+    assert spawned == [] and timers == [30, 60]
+
+    pool._worker_exited(_PooledWorker(ExitedProcess(), FakeConn()))
+    assert pool.broken and spawned == [] and len(timers) == 2
+    with pytest.raises(WorkerPoolUnavailable):
+        pool.acquire()
+
+
+class FakeTimer:
+    daemon = False
+
+    def start(self):
+        pass
+
+
+def test_failed_submit_closes_the_run(monkeypatch):
+    engine = CrawlerEngine()
+    engine.flask_app = Flask(__name__)
+    closed = []
+    monkeypatch.setattr(engine, '_set_run_status', lambda run_id, status: closed.append((run_id, status)))
+    monkeypatch.setattr(engine, '_get_ingest_service', lambda: None)
+
+    class GonePool:
+        broken = False
+
+        def submit(self, *args):
+            raise RuntimeError('Worker 4242 is no longer reserved')
+
+    engine.worker_pool = GonePool()
+    with pytest.raises(RuntimeError):
+        engine.start_crawl(3, 'https://example.com/', 1, worker=object())
+    assert closed[-1][1] == 'failed'
+    assert 3 not in engine.processes
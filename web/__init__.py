@@ -1,18 +1,29 @@
-from flask import Blueprint, render_template, request, redirect, url_for, jsonify, Response
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify, Response, send_file, current_app, stream_with_context
 from models.job import CrawlJob, CrawlResult, CrawlRun
 from crawler.process_manager import ProcessManager
+from crawler.job_queue import list_queue, queue_position, remove_job
 from config.config_manager import ConfigManager
 from config.sites_config import load_sites_config, get_sites_by_country, get_sites_by_category
 from web.auth import require_api_key, validate_json
+from web.tasks import TaskManager
+from web.exports import export_results_parquet
+from web.maintenance import delete_results_by_ids, enable_incremental_vacuum, purge_results
+from models.search import can_use_fts, matching_ids, search_results
+import base64
 import json
 import csv
-import io
+import os
+import queue
+import time
+from datetime import datetime
+from sqlalchemy import tuple_
 
 bp = Blueprint('web', __name__)
 
 # Initialize managers
 process_manager = ProcessManager()
 config_manager = ConfigManager()
+task_manager = TaskManager()
 
 @bp.route('/')
 def index():
@@ -63,29 +74,98 @@ def api_create_job():
     
     return jsonify({'success': True, 'job': job.to_dict()})
 
+def _request_priority():
+    data = request.get_json(silent=True) or {}
+    return int(data.get('priority', request.args.get('priority', 0)))
+
+def _submit_job(job, priority):
+    """Start job or queue it when every slot is busy; returns the QueuedJob entry or None"""
+    from app import db as app_db
+    process_manager.start_scheduler(current_app._get_current_object())
+    entry = process_manager.submit_job(app_db, job, priority)
+    job.status = 'running' if entry is None else 'queued'
+    app_db.session.commit()
+    return entry
+
 @bp.route('/api/jobs/<int:job_id>/start', methods=['POST'])
 @require_api_key
 def api_start_job(job_id):
     job = CrawlJob.query.get_or_404(job_id)
+    try:
+        priority = _request_priority()
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'priority must be an integer'}), 400
     
-    # Start the crawl job
+    # Start the crawl job, or queue it when all slots are busy
     try:
-        process_manager.start_job(job.id, job.target_url, job.max_depth, job.custom_rules)
-        job.status = 'running'
-        from app import db as app_db
-        app_db.session.commit()
-        return jsonify({'success': True, 'job': job.to_dict()})
+        entry = _submit_job(job, priority)
     except Exception as e:
-        job.status = 'failed'
         from app import db as app_db
+        app_db.session.rollback()
+        job.status = 'failed'
         app_db.session.commit()
         return jsonify({'success': False, 'error': str(e)}), 500
+    if entry is not None:
+        return jsonify({'success': True, 'queued': True, 'position': queue_position(entry),
+                        'job': job.to_dict()}), 202
+    return jsonify({'success': True, 'queued': False, 'job': job.to_dict()})
+
+@bp.route('/api/jobs/start_batch', methods=['POST'])
+@require_api_key
+@validate_json
+def api_start_jobs_batch():
+    """Start or queue many jobs at once, e.g. every preset site"""
+    data = request.get_json() or {}
+    try:
+        job_ids = [int(job_id) for job_id in data.get('job_ids') or []]
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'job_ids and priority must be integers'}), 400
+    if not job_ids:
+        return jsonify({'success': False, 'error': 'job_ids is required'}), 400
+    from app import db as app_db
+    started, queued, errors = [], [], {}
+    for job in CrawlJob.query.filter(CrawlJob.id.in_(job_ids)).all():
+        try:
+            entry = _submit_job(job, priority)
+        except Exception as e:
+            app_db.session.rollback()
+            errors[job.id] = str(e)
+            continue
+        (started if entry is None else queued).append(job.id)
+    return jsonify({'success': True, 'started': started, 'queued': queued, 'errors': errors}), 202
+
+@bp.route('/api/queue', methods=['GET'])
+@require_api_key
+def api_get_queue():
+    entries = list_queue()
+    return jsonify({'running': process_manager.running_count(), 'capacity': process_manager.job_limit(),
+                    'items': [entry.to_dict() for entry in entries]})
+
+@bp.route('/api/queue/<int:job_id>', methods=['DELETE'])
+@require_api_key
+def api_dequeue_job(job_id):
+    job = CrawlJob.query.get_or_404(job_id)
+    from app import db as app_db
+    if not remove_job(app_db, job_id):
+        return jsonify({'success': False, 'error': 'Job is not queued'}), 404
+    job.status = 'saved'
+    app_db.session.commit()
+    return jsonify({'success': True, 'job': job.to_dict()})
 
 @bp.route('/api/jobs/<int:job_id>/stop', methods=['POST'])
 @require_api_key
 def api_stop_job(job_id):
     job = CrawlJob.query.get_or_404(job_id)
     
+    if job.status == 'queued':
+        from app import db as app_db
+        remove_job(app_db, job_id)
+        job.status = 'stopped'
+        app_db.session.commit()
+        process_manager.engine.progress.publish(job_id, {'state': 'stopped', 'time': time.time()})
+        return jsonify({'success': True, 'job': job.to_dict()})
+    
     if job.status == 'running':
         try:
             process_manager.stop_job(job_id)
@@ -136,6 +216,44 @@ def api_update_job(job_id):
     app_db.session.commit()
     return jsonify({'success': True, 'job': job.to_dict()})
 
+def _sse_event(snapshot):
+    return f"event: progress\ndata: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+
+@bp.route('/api/progress', methods=['GET'])
+@require_api_key
+def api_get_progress():
+    """Latest progress snapshot of every recent job (or ?job_id=)"""
+    job_id = request.args.get('job_id', type=int)
+    return jsonify(process_manager.engine.progress.snapshot(job_id))
+
+@bp.route('/api/progress/stream', methods=['GET'])
+@require_api_key
+def api_progress_stream():
+    """Server-Sent Events stream of crawl progress; EventSource passes the key as ?api_key="""
+    job_id = request.args.get('job_id', type=int)
+    hub = process_manager.engine.progress
+    subscriber = hub.subscribe()
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            for snapshot in hub.snapshot(job_id):
+                yield _sse_event(snapshot)
+            while True:
+                try:
+                    snapshot = subscriber.get(timeout=15)
+                except queue.Empty:
+                    # Comment line keeps proxies and the browser from timing the stream out
+                    yield ': keepalive\n\n'
+                    continue
+                if job_id is None or snapshot.get('job_id') == job_id:
+                    yield _sse_event(snapshot)
+        finally:
+            hub.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @bp.route('/api/sites')
 @require_api_key
 def api_get_sites():
@@ -189,24 +307,20 @@ def api_get_runs():
         except Exception:
             pass
     runs = q.order_by(CrawlRun.started_at.desc()).all()
-    return jsonify([r.to_dict() for r in runs])
+    include_timeline = request.args.get('timeline') in ('1', 'true')
+    return jsonify([r.to_dict(include_timeline=include_timeline) for r in runs])
 
-@bp.route('/api/results', methods=['GET'])
+@bp.route('/api/runs/<int:run_id>', methods=['GET'])
 @require_api_key
-def api_get_results():
-    try:
-        page = int(request.args.get('page', 1))
-    except Exception:
-        page = 1
-    try:
-        page_size = int(request.args.get('page_size', 20))
-    except Exception:
-        page_size = 20
-    job_id = request.args.get('job_id')
-    run_id = request.args.get('run_id')
-    q = request.args.get('q', '').strip()
+def api_get_run(run_id):
+    run = CrawlRun.query.get_or_404(run_id)
+    return jsonify(run.to_dict(include_timeline=True))
 
-    query = CrawlResult.query
+def _filter_results(query, args):
+    """Apply the job_id / run_id / q filters shared by the results endpoints"""
+    job_id = args.get('job_id')
+    run_id = args.get('run_id')
+    q = args.get('q', '').strip()
     if job_id:
         try:
             query = query.filter(CrawlResult.job_id == int(job_id))
@@ -218,52 +332,229 @@ def api_get_results():
         except Exception:
             pass
     if q:
-        like_pattern = f"%{q}%"
-        query = query.filter((CrawlResult.title.ilike(like_pattern)) | (CrawlResult.content.ilike(like_pattern)))
+        from app import db as app_db
+        if can_use_fts(app_db, q):
+            query = query.filter(CrawlResult.id.in_(matching_ids(q)))
+        else:
+            like_pattern = f"%{q}%"
+            query = query.filter((CrawlResult.title.ilike(like_pattern)) | (CrawlResult.content.ilike(like_pattern)))
+    return query
+
+def _before_key(query, scraped_at, result_id):
+    """Rows that come after (scraped_at, id) in newest-first order.
+
+    A row-value comparison lets SQLite seek ix_crawl_result_scraped
+    (SEARCH ... scraped_at<?) instead of scanning it from the top.
+    """
+    return query.filter(tuple_(CrawlResult.scraped_at, CrawlResult.id) < (scraped_at, result_id))
+
+def _iter_result_batches(query, columns, batch_size=1000):
+    """Yield newest-first batches of column tuples, one short query per batch.
+
+    Each batch ends its read transaction so a long download never holds
+    SQLite's shared lock and blocks the result writers.
+    """
+    from app import db as app_db
+    query = query.with_entities(*columns).order_by(CrawlResult.scraped_at.desc(), CrawlResult.id.desc())
+    last = None
+    while True:
+        batch_query = query if last is None else _before_key(query, last.scraped_at, last.id)
+        rows = batch_query.limit(batch_size).all()
+        app_db.session.rollback()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last = rows[-1]
+
+def _encode_cursor(row):
+    raw = json.dumps([row.scraped_at.isoformat() if row.scraped_at else None, row.id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    scraped_at, result_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    if scraped_at is None:
+        # Rows without scraped_at sort last and cannot be seeked past
+        raise ValueError('cursor has no scraped_at')
+    return datetime.fromisoformat(scraped_at), int(result_id)
+
+class _CsvLine:
+    """File-like object that hands back what csv.writer writes"""
+    def write(self, value):
+        return value
+
+EXPORT_COLUMNS = ['id', 'job_id', 'run_id', 'url', 'title', 'content', 'scraped_at']
+
+def _stream_csv(query):
+    writer = csv.writer(_CsvLine())
+    yield writer.writerow(EXPORT_COLUMNS)
+    columns = [getattr(CrawlResult, name) for name in EXPORT_COLUMNS]
+    for rows in _iter_result_batches(query, columns):
+        yield ''.join(
+            writer.writerow([r.id, r.job_id, r.run_id, r.url, r.title or '', (r.content or '').replace('\n', ' ').replace('\r', ' '), r.scraped_at.isoformat() if r.scraped_at else ''])
+            for r in rows
+        )
+
+def _ndjson_value(raw):
+    """scraped_data as a single-line JSON value for an NDJSON record.
+
+    Rows written by the pipeline are compact JSON and are spliced in as
+    stored; anything else (legacy or hand-edited rows, pretty-printed JSON)
+    is re-encoded, and text that is not JSON at all is exported as a string.
+    """
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        return json.dumps(raw, ensure_ascii=False)
+    if '\n' in raw or '\r' in raw:
+        return json.dumps(value, ensure_ascii=False)
+    return raw
+
+def _stream_ndjson(query):
+    columns = [getattr(CrawlResult, name) for name in EXPORT_COLUMNS] + [CrawlResult.scraped_data]
+    for rows in _iter_result_batches(query, columns):
+        lines = []
+        for r in rows:
+            line = json.dumps({
+                'id': r.id,
+                'job_id': r.job_id,
+                'run_id': r.run_id,
+                'url': r.url,
+                'title': r.title,
+                'content': r.content,
+                'scraped_at': r.scraped_at.isoformat() if r.scraped_at else None,
+            }, ensure_ascii=False)
+            if r.scraped_data:
+                line = line[:-1] + ', "scraped_data": ' + _ndjson_value(r.scraped_data) + '}'
+            lines.append(line + '\n')
+        yield ''.join(lines)
+
+@bp.route('/api/results', methods=['GET'])
+@require_api_key
+def api_get_results():
+    try:
+        page = int(request.args.get('page', 1))
+    except Exception:
+        page = 1
+    try:
+        page_size = int(request.args.get('page_size', 20))
+    except Exception:
+        page_size = 20
+
+    query = _filter_results(CrawlResult.query, request.args)
+
+    # Cursor mode: keyset on (scraped_at, id) so every page costs the same however deep it is
+    cursor = request.args.get('cursor')
+    if cursor or request.args.get('paginate') == 'cursor':
+        page_size = max(1, min(page_size, 1000))
+        total = query.count() if request.args.get('with_total') in ('1', 'true') else None
+        if cursor:
+            try:
+                scraped_at, result_id = _decode_cursor(cursor)
+            except Exception:
+                return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+            query = _before_key(query, scraped_at, result_id)
+        rows = query.order_by(CrawlResult.scraped_at.desc(), CrawlResult.id.desc()).limit(page_size + 1).all()
+        items = rows[:page_size]
+        next_cursor = _encode_cursor(items[-1]) if len(rows) > page_size else None
+        return jsonify({'total': total, 'page_size': page_size, 'next_cursor': next_cursor, 'items': [item.to_dict() for item in items]})
 
     total = query.count()
     items = (query.order_by(CrawlResult.scraped_at.desc()).offset((page - 1) * page_size).limit(page_size).all())
     return jsonify({'total': total, 'page': page, 'page_size': page_size, 'items': [item.to_dict() for item in items]})
 
+@bp.route('/api/results/search', methods=['GET'])
+@require_api_key
+def api_search_results():
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'success': False, 'error': 'q is required'}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 200))
+        offset = max(0, int(request.args.get('offset', 0)))
+        job_id = int(request.args['job_id']) if request.args.get('job_id') else None
+        run_id = int(request.args['run_id']) if request.args.get('run_id') else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit, offset, job_id and run_id must be integers'}), 400
+
+    from app import db as app_db
+    if can_use_fts(app_db, q):
+        items = search_results(app_db, q, job_id=job_id, run_id=run_id, limit=limit, offset=offset)
+        return jsonify({'q': q, 'ranked': True, 'limit': limit, 'offset': offset, 'items': items})
+
+    # Queries shorter than a trigram (or a database without FTS5) fall back to an unranked LIKE scan
+    query = _filter_results(CrawlResult.query, request.args)
+    rows = query.order_by(CrawlResult.scraped_at.desc()).offset(offset).limit(limit).all()
+    items = [{'id': r.id, 'job_id': r.job_id, 'run_id': r.run_id, 'url': r.url, 'title': r.title,
+              'scraped_at': r.scraped_at.isoformat() if r.scraped_at else None, 'snippet': None, 'score': None}
+             for r in rows]
+    return jsonify({'q': q, 'ranked': False, 'limit': limit, 'offset': offset, 'items': items})
+
 @bp.route('/api/results/export', methods=['GET'])
 @require_api_key
 def api_export_results():
     fmt = request.args.get('format', 'json').lower()
-    job_id = request.args.get('job_id')
-    run_id = request.args.get('run_id')
-    q = request.args.get('q', '').strip()
+    query = _filter_results(CrawlResult.query, request.args)
 
-    query = CrawlResult.query
-    if job_id:
-        try:
-            query = query.filter(CrawlResult.job_id == int(job_id))
-        except Exception:
-            pass
-    if run_id:
-        try:
-            query = query.filter(CrawlResult.run_id == int(run_id))
-        except Exception:
-            pass
-    if q:
-        like_pattern = f"%{q}%"
-        query = query.filter(
-            (CrawlResult.title.ilike(like_pattern)) | (CrawlResult.content.ilike(like_pattern))
-        )
+    # csv and ndjson are streamed in batches so memory stays flat for any run size
+    if fmt == 'csv':
+        return Response(stream_with_context(_stream_csv(query)), mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename="results.csv"'})
+    if fmt == 'ndjson':
+        return Response(stream_with_context(_stream_ndjson(query)), mimetype='application/x-ndjson',
+                        headers={'Content-Disposition': 'attachment; filename="results.ndjson"'})
 
+    # default json
     items = query.order_by(CrawlResult.scraped_at.desc()).all()
+    return jsonify([it.to_dict() for it in items])
 
-    if fmt == 'csv':
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['id','job_id','run_id','url','title','content','scraped_at'])
-        for it in items:
-            d = it.to_dict()
-            writer.writerow([d.get('id'), d.get('job_id'), d.get('run_id'), d.get('url'), d.get('title') or '', (d.get('content') or '').replace('\n',' ').replace('\r',' '), d.get('scraped_at') or ''])
-        csv_data = output.getvalue()
-        return Response(csv_data, mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename="results.csv"'})
-    else:
-        # default json
-        return jsonify([it.to_dict() for it in items])
+@bp.route('/api/results/export_jobs', methods=['POST'])
+@require_api_key
+@validate_json
+def api_create_export_job():
+    data = request.get_json() or {}
+    fmt = (data.get('format') or 'parquet').lower()
+    if fmt != 'parquet':
+        return jsonify({'success': False, 'error': f'Unsupported export format: {fmt}'}), 400
+    try:
+        job_id = int(data['job_id']) if data.get('job_id') else None
+        run_id = int(data['run_id']) if data.get('run_id') else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'job_id and run_id must be integers'}), 400
+    if job_id is None and run_id is None:
+        return jsonify({'success': False, 'error': 'job_id or run_id is required'}), 400
+
+    export_dir = os.path.abspath(current_app.config.get('EXPORT_DIR', 'exports'))
+    task = task_manager.submit('export', export_results_parquet, export_dir, job_id=job_id, run_id=run_id,
+                               params={'format': fmt, 'job_id': job_id, 'run_id': run_id})
+    return jsonify({'success': True, 'task': task.to_dict()}), 202
+
+@bp.route('/api/results/export_jobs/<task_id>/download', methods=['GET'])
+@require_api_key
+def api_download_export(task_id):
+    task = task_manager.get(task_id)
+    if not task or task.kind != 'export':
+        return jsonify({'success': False, 'error': 'Export not found'}), 404
+    if task.status != 'completed':
+        return jsonify({'success': False, 'error': f'Export is {task.status}', 'task': task.to_dict()}), 409
+    return send_file(task.result['path'], mimetype='application/vnd.apache.parquet',
+                     as_attachment=True, download_name=task.result['file'])
+
+@bp.route('/api/tasks', methods=['GET'])
+@require_api_key
+def api_get_tasks():
+    kind = request.args.get('kind')
+    return jsonify([t.to_dict() for t in task_manager.list(kind)])
+
+@bp.route('/api/tasks/<task_id>', methods=['GET'])
+@require_api_key
+def api_get_task(task_id):
+    task = task_manager.get(task_id)
+    if not task:
+        return jsonify({'success': False, 'error': 'Task not found'}), 404
+    return jsonify(task.to_dict())
 
 @bp.route('/api/results/<int:result_id>', methods=['DELETE'])
 @require_api_key
@@ -282,28 +573,52 @@ def api_results_batch_delete():
     ids = data.get('ids') or []
     run_id = data.get('run_id')
     from app import db as app_db
-    deleted = 0
     if ids:
-        for rid in ids:
-            item = CrawlResult.query.get(rid)
-            if item:
-                app_db.session.delete(item)
-                deleted += 1
-        app_db.session.commit()
+        try:
+            ids = [int(rid) for rid in ids]
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'ids must be integers'}), 400
+        deleted = delete_results_by_ids(app_db, ids)
         return jsonify({'success': True, 'deleted': deleted})
     if run_id:
-        run_id_int = int(run_id)
-        q = CrawlResult.query.filter(CrawlResult.run_id == run_id_int)
-        count = q.count()
-        q.delete(synchronize_session=False)
-        # 同时删除批次记录
-        run = CrawlRun.query.get(run_id_int)
-        if run:
-            app_db.session.delete(run)
-        app_db.session.commit()
-        return jsonify({'success': True, 'deleted': count, 'run_deleted': True})
+        try:
+            run_id = int(run_id)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'run_id must be an integer'}), 400
+        # A whole run is purged in the background like /api/results/purge (results and the run record)
+        task = _submit_purge(run_id=run_id)
+        return jsonify({'success': True, 'task': task.to_dict()}), 202
     return jsonify({'success': False, 'error': 'No ids or run_id provided'}), 400
 
+def _submit_purge(run_id=None, job_id=None, vacuum=False, delete_runs=True):
+    return task_manager.submit('purge', purge_results, run_id=run_id, job_id=job_id if run_id is None else None,
+                               vacuum=vacuum, delete_runs=delete_runs,
+                               params={'run_id': run_id, 'job_id': job_id, 'vacuum': vacuum})
+
+@bp.route('/api/results/purge', methods=['POST'])
+@require_api_key
+@validate_json
+def api_results_purge():
+    """Delete a whole run or job in the background; poll /api/tasks/<id> for progress"""
+    data = request.get_json() or {}
+    try:
+        run_id = int(data['run_id']) if data.get('run_id') else None
+        job_id = int(data['job_id']) if data.get('job_id') else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'run_id and job_id must be integers'}), 400
+    if run_id is None and job_id is None:
+        return jsonify({'success': False, 'error': 'run_id or job_id is required'}), 400
+    vacuum = bool(data.get('vacuum', False))
+    task = _submit_purge(run_id, job_id, vacuum, bool(data.get('delete_runs', True)))
+    return jsonify({'success': True, 'task': task.to_dict()}), 202
+
+@bp.route('/api/maintenance/vacuum', methods=['POST'])
+@require_api_key
+def api_maintenance_vacuum():
+    """One-off full VACUUM that enables incremental space reclaim for later purges"""
+    task = task_manager.submit('vacuum', enable_incremental_vacuum)
+    return jsonify({'success': True, 'task': task.to_dict()}), 202
+
 @bp.route('/api/jobs/<int:job_id>', methods=['DELETE'])
 @require_api_key
 def api_delete_job(job_id):
@@ -0,0 +1,119 @@
+import json
+import os
+from datetime import datetime
+
+from models.job import CrawlJob, CrawlResult, CrawlRun
+
+# Item keys already stored in their own CrawlResult columns
+BASE_FIELDS = ('id', 'job_id', 'run_id', 'url', 'title', 'content', 'scraped_at')
+
+
+def get_custom_field_names(job_id):
+    """Custom field names configured on the job, in rule order"""
+    job = CrawlJob.query.get(job_id) if job_id else None
+    if not job or not job.custom_rules:
+        return []
+    try:
+        rules = json.loads(job.custom_rules)
+    except Exception:
+        return []
+    fields = (rules or {}).get('custom_fields') or {}
+    return [name for name in fields if name not in BASE_FIELDS and name != 'links']
+
+
+def _to_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def export_results_parquet(task, output_dir, job_id=None, run_id=None, chunk_size=5000):
+    """Write the matching CrawlResult rows to a Parquet file, one row group per chunk.
+
+    scraped_data is flattened: every custom field configured on the job gets
+    its own string column (lists are stored as JSON text) and the page links
+    become a list<string> column.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    if job_id is None and run_id is not None:
+        run = CrawlRun.query.get(run_id)
+        job_id = run.job_id if run else None
+    custom_fields = get_custom_field_names(job_id)
+
+    schema = pa.schema(
+        [
+            ('id', pa.int64()),
+            ('job_id', pa.int64()),
+            ('run_id', pa.int64()),
+            ('url', pa.string()),
+            ('title', pa.string()),
+            ('content', pa.string()),
+            ('scraped_at', pa.timestamp('us')),
+            ('links', pa.list_(pa.string())),
+        ]
+        + [(name, pa.string()) for name in custom_fields]
+    )
+
+    query = CrawlResult.query
+    if job_id is not None:
+        query = query.filter(CrawlResult.job_id == job_id)
+    if run_id is not None:
+        query = query.filter(CrawlResult.run_id == run_id)
+    total = query.count()
+    task.update(0, total, 'exporting')
+
+    os.makedirs(output_dir, exist_ok=True)
+    name = f"results_job{job_id or 'all'}_run{run_id or 'all'}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.parquet"
+    path = os.path.join(output_dir, name)
+    tmp_path = path + '.part'
+
+    columns = (CrawlResult.id, CrawlResult.job_id, CrawlResult.run_id, CrawlResult.url,
+               CrawlResult.title, CrawlResult.content, CrawlResult.scraped_at, CrawlResult.scraped_data)
+    done = 0
+    last_id = 0
+    writer = pq.ParquetWriter(tmp_path, schema, compression='zstd')
+    try:
+        while True:
+            # Keyset pagination on id keeps each chunk query cheap regardless of depth
+            rows = (query.with_entities(*columns)
+                    .filter(CrawlResult.id > last_id)
+                    .order_by(CrawlResult.id)
+                    .limit(chunk_size)
+                    .all())
+            if not rows:
+                break
+            data = {field: [] for field in schema.names}
+            for row in rows:
+                for field in BASE_FIELDS:
+                    data[field].append(getattr(row, field))
+                try:
+                    scraped = json.loads(row.scraped_data) if row.scraped_data else {}
+                except Exception:
+                    scraped = {}
+                links = scraped.get('links')
+                data['links'].append([str(link) for link in links] if isinstance(links, list) else None)
+                for field in custom_fields:
+                    data[field].append(_to_text(scraped.get(field)))
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            last_id = rows[-1].id
+            done += len(rows)
+            task.update(done)
+    except Exception:
+        writer.close()
+        os.remove(tmp_path)
+        raise
+    writer.close()
+    os.replace(tmp_path, path)
+
+    return {
+        'file': name,
+        'path': path,
+        'rows': done,
+        'bytes': os.path.getsize(path),
+        'columns': schema.names,
+    }
@@ -0,0 +1,111 @@
+import time
+
+from sqlalchemy import select, text
+
+from models.job import CrawlResult, CrawlRun
+
+# SQLite allows at most 999 bound parameters per statement on older builds
+ID_CHUNK_SIZE = 500
+
+
+def delete_results_by_ids(db, ids):
+    """Set-based delete of the given result ids; returns the number of rows removed"""
+    deleted = 0
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        chunk = ids[start:start + ID_CHUNK_SIZE]
+        deleted += CrawlResult.query.filter(CrawlResult.id.in_(chunk)).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def purge_results(task, run_id=None, job_id=None, chunk_size=5000, pause=0.05, vacuum=False, delete_runs=True):
+    """Delete a run's (or a whole job's) results in small transactions.
+
+    Each chunk commits on its own and the loop sleeps briefly between chunks,
+    so the SQLite write lock is released regularly and running crawls can
+    keep storing results while a large run is being purged.
+    """
+    from app import db
+
+    if run_id is not None:
+        condition = CrawlResult.run_id == run_id
+    elif job_id is not None:
+        condition = CrawlResult.job_id == job_id
+    else:
+        raise ValueError('run_id or job_id is required')
+
+    table = CrawlResult.__table__
+    total = CrawlResult.query.filter(condition).count()
+    db.session.rollback()
+    task.update(0, total, 'deleting results')
+
+    deleted = 0
+    while True:
+        chunk_ids = select(CrawlResult.id).where(condition).limit(chunk_size)
+        result = db.session.execute(table.delete().where(CrawlResult.id.in_(chunk_ids)))
+        db.session.commit()
+        if not result.rowcount:
+            break
+        deleted += result.rowcount
+        task.update(deleted)
+        if pause:
+            time.sleep(pause)
+
+    runs_deleted = 0
+    if delete_runs:
+        runs = CrawlRun.query.filter(CrawlRun.id == run_id if run_id is not None else CrawlRun.job_id == job_id)
+        runs_deleted = runs.delete(synchronize_session=False)
+        db.session.commit()
+
+    summary = {'deleted': deleted, 'runs_deleted': runs_deleted, 'vacuum': None}
+    if vacuum:
+        task.update(deleted, message='reclaiming space')
+        summary['vacuum'] = reclaim_space(db)
+    return summary
+
+
+def reclaim_space(db, pages_per_step=2000):
+    """Return free pages to the filesystem in small steps.
+
+    Only possible with auto_vacuum=INCREMENTAL. Other databases are left
+    alone: switching needs a full VACUUM under an exclusive lock, which is
+    what enable_incremental_vacuum does when it is asked for explicitly.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return {'mode': 'unsupported'}
+    db.session.remove()
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        free_before = conn.exec_driver_sql('PRAGMA freelist_count').scalar()
+        if conn.exec_driver_sql('PRAGMA auto_vacuum').scalar() != 2:
+            return {'mode': 'unavailable', 'pages_freed': 0, 'free_pages': free_before,
+                    'message': 'auto_vacuum is not INCREMENTAL; run POST /api/maintenance/vacuum once to enable it'}
+        remaining = free_before
+        while remaining:
+            # Each step is its own short write transaction
+            conn.exec_driver_sql(f'PRAGMA incremental_vacuum({int(pages_per_step)})').fetchall()
+            previous, remaining = remaining, conn.exec_driver_sql('PRAGMA freelist_count').scalar()
+            if remaining >= previous:
+                break
+    return {'mode': 'incremental', 'pages_freed': free_before - remaining}
+
+
+def enable_incremental_vacuum(task):
+    """Switch the database to auto_vacuum=INCREMENTAL with one full VACUUM.
+
+    The VACUUM rewrites the whole file and holds an exclusive lock until it
+    finishes, so result writers wait for it; run it when no crawl is busy.
+    """
+    from app import db
+
+    if db.engine.dialect.name != 'sqlite':
+        return {'mode': 'unsupported'}
+    db.session.remove()
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if conn.exec_driver_sql('PRAGMA auto_vacuum').scalar() == 2:
+            return {'mode': 'incremental', 'converted': False}
+        free_before = conn.exec_driver_sql('PRAGMA freelist_count').scalar()
+        task.update(0, message='running full VACUUM')
+        conn.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute(text('VACUUM'))
+        mode = 'incremental' if conn.exec_driver_sql('PRAGMA auto_vacuum').scalar() == 2 else 'none'
+    return {'mode': mode, 'converted': mode == 'incremental', 'pages_freed': free_before}
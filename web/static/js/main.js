@@ -178,7 +178,7 @@ function startCrawl() {
     .then(data => {
         console.log('Response data:', data);
         if (data.success) {
-            console.log('Starting crawl for job:', jobId);
+            console.log(data.queued ? 'Queued crawl for job:' : 'Starting crawl for job:', jobId);
             
             // Enable stop button and disable start button
             document.getElementById('start-crawl-btn').disabled = true;
@@ -235,6 +235,46 @@ function stopCrawl() {
     });
 }
 
+// One shared Server-Sent Events stream carries progress for every job; callbacks are keyed by job id
+const progressWatchers = {};
+let progressSource = null;
+
+function watchProgress(jobId, callback) {
+    const key = String(jobId);
+    (progressWatchers[key] = progressWatchers[key] || []).push(callback);
+    if (!progressSource) {
+        // EventSource cannot send headers, so the key goes in the query string
+        progressSource = new EventSource('/api/progress/stream?api_key=default-key');
+        progressSource.addEventListener('progress', event => {
+            const snapshot = JSON.parse(event.data);
+            (progressWatchers[String(snapshot.job_id)] || []).slice().forEach(cb => cb(snapshot));
+        });
+    }
+    return function unwatch() {
+        progressWatchers[key] = (progressWatchers[key] || []).filter(cb => cb !== callback);
+        if (!progressWatchers[key].length) delete progressWatchers[key];
+        if (progressSource && Object.keys(progressWatchers).length === 0) {
+            progressSource.close();
+            progressSource = null;
+        }
+    };
+}
+
+// Map a progress snapshot to the job status names used by /api/jobs
+function progressStatus(snapshot) {
+    if (snapshot.state === 'finished') {
+        return ['shutdown', 'cancelled'].includes(snapshot.finish_reason) ? 'stopped' : 'completed';
+    }
+    return snapshot.state === 'starting' ? 'running' : snapshot.state;
+}
+
+function formatBytes(bytes) {
+    if (!bytes) return '0 B';
+    const units = ['B', 'KB', 'MB', 'GB'];
+    const i = Math.min(units.length - 1, Math.floor(Math.log(bytes) / Math.log(1024)));
+    return `${(bytes / Math.pow(1024, i)).toFixed(i ? 1 : 0)} ${units[i]}`;
+}
+
 function updateCrawlStatus(jobId) {
     const statusDiv = document.getElementById('crawl-status');
     statusDiv.innerHTML = ''; // Clear previous status
@@ -244,43 +284,40 @@ function updateCrawlStatus(jobId) {
     statusDiv.innerHTML += `<div>[${startTime}] 开始爬取任务...</div>`;
     statusDiv.scrollTop = statusDiv.scrollHeight;
     
-    // Start polling for real status updates
-    const interval = setInterval(() => {
-        fetch(`/api/jobs/${jobId}`, {
-            headers: {
-                'X-API-Key': 'default-key'
+    // Follow pushed progress instead of polling the job
+    if (updateCrawlStatus.unwatch) updateCrawlStatus.unwatch();
+    let lastStatus = null;
+    const unwatch = updateCrawlStatus.unwatch = watchProgress(jobId, snapshot => {
+        const timestamp = new Date().toLocaleTimeString();
+        const status = progressStatus(snapshot);
+        
+        if (status === 'queued') {
+            if (lastStatus !== 'queued') {
+                statusDiv.innerHTML += `<div>[${timestamp}] 任务排队中，等待空闲槽位...</div>`;
             }
-        })
-        .then(response => response.json())
-        .then(job => {
-            // Update status display with real information
-            const timestamp = new Date().toLocaleTimeString();
-            
-            // Check job status and update display accordingly
-            if (job.status === 'running') {
+        } else if (status === 'running') {
+            if (snapshot.state === 'running') {
+                statusDiv.innerHTML += `<div>[${timestamp}] 已抓取 ${snapshot.pages} 页，入库 ${snapshot.items} 条，` +
+                    `${formatBytes(snapshot.bytes)}，错误 ${snapshot.errors}，${snapshot.requests_per_sec} 请求/秒，` +
+                    `待抓取 ${snapshot.queue ?? '-'}</div>`;
+            } else if (lastStatus !== 'running') {
                 statusDiv.innerHTML += `<div>[${timestamp}] 任务正在运行中...</div>`;
-            } else if (job.status === 'completed') {
-                statusDiv.innerHTML += `<div>[${timestamp}] 爬取完成</div>`;
-                clearInterval(interval);
-                // Re-enable start button and disable stop button
-                document.getElementById('start-crawl-btn').disabled = false;
-                document.getElementById('stop-crawl-btn').disabled = true;
-            } else if (job.status === 'failed') {
-                statusDiv.innerHTML += `<div>[${timestamp}] 爬取失败</div>`;
-                clearInterval(interval);
-                // Re-enable start button and disable stop button
-                document.getElementById('start-crawl-btn').disabled = false;
-                document.getElementById('stop-crawl-btn').disabled = true;
             }
-            
-            statusDiv.scrollTop = statusDiv.scrollHeight;
-        })
-        .catch(error => {
-            console.error('Error updating status:', error);
-            // Stop polling on error
-            clearInterval(interval);
-        });
-    }, 3000); // Poll every 3 seconds
+        } else {
+            if (status === 'completed') {
+                statusDiv.innerHTML += `<div>[${timestamp}] 爬取完成：共 ${snapshot.pages} 页，入库 ${snapshot.items} 条</div>`;
+            } else if (status === 'failed') {
+                statusDiv.innerHTML += `<div>[${timestamp}] 爬取失败${snapshot.error ? '：' + snapshot.error : ''}</div>`;
+            }
+            unwatch();
+            updateCrawlStatus.unwatch = null;
+            // Re-enable start button and disable stop button
+            document.getElementById('start-crawl-btn').disabled = false;
+            document.getElementById('stop-crawl-btn').disabled = true;
+        }
+        lastStatus = status;
+        statusDiv.scrollTop = statusDiv.scrollHeight;
+    });
 }
 
 function saveSettings(formId) {
@@ -572,6 +609,19 @@ function resetAndAddListenerById(id, event, handler) {
     return clone;
 }
 
+// 轮询后台任务直到结束
+function waitForTask(taskId, onDone) {
+    const timer = setInterval(() => {
+        fetch(`/api/tasks/${taskId}`, { headers: { 'X-API-Key': 'default-key' }})
+        .then(r=>r.json()).then(task=>{
+            if (task.status === 'completed' || task.status === 'failed' || !task.status) {
+                clearInterval(timer);
+                onDone(task);
+            }
+        }).catch(()=>{ clearInterval(timer); onDone({ status: 'failed' }); });
+    }, 1000);
+}
+
 function bindSelectionControls() {
     resetAndAddListenerById('select-all', 'change', () => {
         const selectAllCb = document.getElementById('select-all');
@@ -594,9 +644,17 @@ function bindSelectionControls() {
         const runId = runFilter ? runFilter.value : '';
         if (!runId) { alert('请先选择批次'); return; }
         if (!confirm('确定删除当前批次的所有结果吗？')) return;
-        fetch('/api/results/batch_delete', {
+        // 大批次在后台分块删除，轮询任务进度
+        fetch('/api/results/purge', {
             method: 'POST', headers: { 'Content-Type': 'application/json', 'X-API-Key': 'default-key' }, body: JSON.stringify({ run_id: parseInt(runId) })
-        }).then(r=>r.json()).then(res=>{ const selectAll = document.getElementById('select-all'); if (selectAll) selectAll.checked = false; loadRuns(); loadResults(); })
+        }).then(r=>r.json()).then(res=>{
+            if (!res.success) { alert('删除失败: ' + (res.error || '')); return; }
+            waitForTask(res.task.id, task => {
+                if (task.status === 'failed') alert('删除失败: ' + (task.error || ''));
+                const selectAll = document.getElementById('select-all'); if (selectAll) selectAll.checked = false;
+                loadRuns(); loadResults();
+            });
+        })
         .catch(()=>alert('删除失败'));
     });
 
@@ -743,31 +801,28 @@ function copyResult(obj) {
             b.className = `badge ${cls} ms-2`;
             b.textContent = text;
         }
-        const interval = setInterval(() => {
-            fetch(`/api/jobs/${jobId}`, { headers: { 'X-API-Key': 'default-key' }})
-            .then(r=>r.json())
-            .then(job=>{
-                if (job.status === 'running') setBadge('运行中', 'bg-info');
-                if (job.status === 'completed' || job.status === 'finished') {
-                    setBadge('已完成', 'bg-success');
-                    clearInterval(interval);
-                    // refresh results and jobs list
-                    loadResults();
-                    loadJobs();
-                }
-                if (job.status === 'failed') {
-                    setBadge('失败', 'bg-danger');
-                    clearInterval(interval);
-                    loadJobs();
-                }
-                if (job.status === 'stopped') {
-                    setBadge('已停止', 'bg-warning text-dark');
-                    clearInterval(interval);
-                    loadJobs();
-                }
-            })
-            .catch(()=>{ clearInterval(interval); });
-        }, 3000);
+        const unwatch = watchProgress(jobId, snapshot => {
+            const status = progressStatus(snapshot);
+            if (status === 'queued') setBadge('排队中', 'bg-secondary');
+            if (status === 'running') setBadge('运行中', 'bg-info');
+            if (status === 'completed') {
+                setBadge('已完成', 'bg-success');
+                unwatch();
+                // refresh results and jobs list
+                loadResults();
+                loadJobs();
+            }
+            if (status === 'failed') {
+                setBadge('失败', 'bg-danger');
+                unwatch();
+                loadJobs();
+            }
+            if (status === 'stopped') {
+                setBadge('已停止', 'bg-warning text-dark');
+                unwatch();
+                loadJobs();
+            }
+        });
         // call original to keep existing behavior
         try { originalUpdateCrawlStatus(jobId); } catch(e) {}
     }
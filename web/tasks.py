@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+
+class BackgroundTask:
+    """State of a long-running operation started from the API"""
+
+    def __init__(self, kind, params=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params or {}
+        self.status = 'pending'  # pending, running, completed, failed
+        self.done = 0
+        self.total = None
+        self.message = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def update(self, done, total=None, message=None):
+        """Report progress from inside the task"""
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+
+    def to_dict(self):
+        percent = None
+        if self.total:
+            percent = round(min(100.0, 100.0 * self.done / self.total), 1)
+        elif self.status == 'completed':
+            percent = 100.0
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'status': self.status,
+            'done': self.done,
+            'total': self.total,
+            'percent': percent,
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class TaskManager:
+    """Run functions in a small thread pool, each inside its own Flask app context"""
+
+    def __init__(self, max_workers=2, keep_finished=100):
+        self.tasks = {}
+        self.keep_finished = keep_finished
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='task')
+        self.logger = logging.getLogger(__name__)
+
+    def submit(self, kind, func, *args, params=None, **kwargs):
+        """Schedule func(task, *args, **kwargs); its return value becomes task.result"""
+        task = BackgroundTask(kind, params)
+        flask_app = current_app._get_current_object()
+        with self.lock:
+            self._prune()
+            self.tasks[task.id] = task
+        self.executor.submit(self._run, flask_app, task, func, args, kwargs)
+        self.logger.info(f"[Tasks] Queued {kind} task {task.id} {task.params}")
+        return task
+
+    def get(self, task_id):
+        return self.tasks.get(task_id)
+
+    def list(self, kind=None):
+        tasks = [t for t in self.tasks.values() if kind is None or t.kind == kind]
+        return sorted(tasks, key=lambda t: t.created_at, reverse=True)
+
+    def _run(self, flask_app, task, func, args, kwargs):
+        task.status = 'running'
+        task.started_at = time.time()
+        with flask_app.app_context():
+            try:
+                task.result = func(task, *args, **kwargs)
+                task.status = 'completed'
+                self.logger.info(f"[Tasks] {task.kind} task {task.id} completed")
+            except Exception as e:
+                task.status = 'failed'
+                task.error = str(e)
+                self.logger.error(f"[Tasks] {task.kind} task {task.id} failed: {e}")
+            finally:
+                task.finished_at = time.time()
+                from app import db
+                db.session.remove()
+
+    def _prune(self):
+        finished = [t for t in self.tasks.values() if t.finished_at is not None]
+        if len(finished) <= self.keep_finished:
+            return
+        finished.sort(key=lambda t: t.finished_at)
+        for task in finished[:len(finished) - self.keep_finished]:
+            del self.tasks[task.id]